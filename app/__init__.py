@@ -4,8 +4,6 @@ Application Factory Pattern
 """
 
 import os
-import logging
-from logging.handlers import RotatingFileHandler
 from flask import Flask, request, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -32,8 +30,11 @@ def create_app(config_name=None):
     # Load configuration from config dictionary
     app.config.from_object(config[config_name])
 
-    # Initialize extensions
+    # Initialize extensions; the engine profile (pool, timeouts, pragmas) comes from the DB_* settings
+    from app.utils import db_engine
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_engine.engine_options(app.config)
     db.init_app(app)
+    db_engine.init_app(app, db)
     migrate.init_app(app, db)
     login.init_app(app)
     mail.init_app(app)
@@ -44,6 +45,10 @@ def create_app(config_name=None):
     login.login_message = 'Please log in to access this page.'
     login.login_message_category = 'info'
 
+    # Compression and static fingerprints; registered first so compression runs after every other hook
+    from app.utils import http_cache
+    http_cache.init_app(app)
+
     # Register blueprints
     from app.main import bp as main_bp
     app.register_blueprint(main_bp)
@@ -57,19 +62,40 @@ def create_app(config_name=None):
     from app.api import bp as api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
 
-    # Configure logging
+    # Authenticated-user cache; invalidations reach the other workers through stamp files
+    from app.models import user_cache
+    user_cache.init_app(app, 'users')
+
+    # Rendered fragment cache backend
+    from app.utils.fragments import fragment_cache
+    fragment_cache.init_app(app)
+
+    # Register CLI commands
+    from app import cli
+    cli.register(app)
+
+    # Request latency, SQL and outbound call metrics at /metrics
+    if app.config.get('METRICS_ENABLED'):
+        from app.utils import metrics
+        metrics.init_app(app)
+
+    # Per-request SQL recording, N+1 warnings and query budgets (development and tests)
+    if app.config.get('QUERY_DEBUG'):
+        from app.utils import query_debug
+        query_debug.init_app(app)
+
+    # Load heavy libraries in the background once the first request is served
+    if app.config.get('WARMUP_IMPORTS'):
+        from app.utils import startup
+        startup.init_app(app)
+
+    # Configure logging: JSON records written off the request thread
     if not app.debug and not app.testing:
-        if not os.path.exists('logs'):
-            os.mkdir('logs')
-        file_handler = RotatingFileHandler('logs/mmsu_prior_art.log',
-                                         maxBytes=10240, backupCount=10)
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
-        app.logger.setLevel(logging.INFO)
+        from app.utils.structured_logging import configure_logging
+        configure_logging(app)
         app.logger.info('MMSU Prior Art Search Tool startup')
 
     return app
 
 from app import models
+from app.utils import rollups, search
@@ -29,3 +29,14 @@ class EmailBroadcastForm(FlaskForm):
     subject = StringField('Subject', validators=[DataRequired(), Length(max=200)])
     message = TextAreaField('Message', validators=[DataRequired(), Length(min=10, max=2000)])
     submit = SubmitField('Send Email')
+
+class BulkCreditGrantForm(FlaskForm):
+    """Form for granting credits to many users at once"""
+    amount = IntegerField('Credits per User', validators=[DataRequired(), NumberRange(min=1, max=1000)])
+    reason = StringField('Reason', validators=[DataRequired(), Length(min=5, max=200)])
+    submit = SubmitField('Grant Credits')
+
+class BulkRoleChangeForm(FlaskForm):
+    """Form for changing the role of many users at once"""
+    role = SelectField('Role', choices=[('Regular', 'Regular'), ('VIP', 'VIP'), ('Admin', 'Admin')])
+    submit = SubmitField('Change Role')
@@ -3,15 +3,23 @@ Admin Routes for MMSU Prior Art Search Tool
 """
 
 from datetime import datetime, timedelta
-from flask import render_template, flash, redirect, url_for, request, jsonify
+from flask import render_template, flash, redirect, url_for, request, jsonify, current_app
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 from app import db
 from app.admin import bp
-from app.models import User, TechnologySubmission, CreditHistory, AuditLog, EmailLog
-from app.admin.forms import UserApprovalForm, CreditAdjustmentForm, EmailBroadcastForm
+from app.models import User, TechnologySubmission, CreditHistory, AuditLog, EmailLog, EmailBroadcast, user_cache
+from app.admin.forms import (UserApprovalForm, CreditAdjustmentForm, EmailBroadcastForm,
+                             BulkCreditGrantForm, BulkRoleChangeForm)
 from app.utils.decorators import admin_required
+from app.utils.pagination import keyset_paginate, InvalidCursor
+from app.utils.search import search_submissions
 from app.utils.email import send_approval_notification, send_rejection_notification
-from app.utils.statistics import get_dashboard_stats
+from app.utils.broadcast import create_broadcast, broadcast_progress, broadcasts_progress
+from app.utils.bulk_operations import approve_users, grant_credits, change_role, BulkOperationError
+from app.utils.analysis_metrics import summarize_analysis_runs
+from app.utils.statistics import get_dashboard_stats, get_usage_trends, stats_cache
+from app.utils.fragments import fragment_cache
 
 @bp.route('/dashboard')
 @login_required
@@ -24,10 +32,13 @@ def dashboard():
     recent_registrations = User.query.filter_by(status='Pending').order_by(
         User.created_at.desc()).limit(5).all()
 
-    recent_submissions = TechnologySubmission.query.order_by(
+    # The template shows each row's author/user; load them in the same query
+    recent_submissions = TechnologySubmission.query.options(
+        joinedload(TechnologySubmission.author)).order_by(
         TechnologySubmission.submitted_at.desc()).limit(10).all()
 
-    recent_logs = AuditLog.query.order_by(AuditLog.created_at.desc()).limit(10).all()
+    recent_logs = AuditLog.query.options(joinedload(AuditLog.user)).order_by(
+        AuditLog.created_at.desc()).limit(10).all()
 
     return render_template('admin/dashboard.html',
                          title='Admin Dashboard',
@@ -41,7 +52,7 @@ def dashboard():
 @admin_required
 def users():
     """User management"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     status_filter = request.args.get('status', 'all')
     role_filter = request.args.get('role', 'all')
 
@@ -53,14 +64,33 @@ def users():
     if role_filter != 'all':
         query = query.filter_by(role=role_filter)
 
-    users = query.order_by(User.created_at.desc()).paginate(
-        page=page, per_page=25, error_out=False)
+    try:
+        users = keyset_paginate(query, (User.created_at, User.id), cursor=cursor,
+                                before=request.args.get('before'), per_page=25, count='estimate')
+    except InvalidCursor:
+        return redirect(url_for('admin.users', status=status_filter, role=role_filter))
 
     return render_template('admin/users.html',
                          title='User Management',
                          users=users,
                          status_filter=status_filter,
-                         role_filter=role_filter)
+                         role_filter=role_filter,
+                         credit_form=BulkCreditGrantForm(),
+                         role_form=BulkRoleChangeForm())
+
+@bp.route('/submissions/search')
+@login_required
+@admin_required
+def search():
+    """Search all submissions"""
+    query = request.args.get('q', '')
+    page = request.args.get('page', 1, type=int)
+    results = search_submissions(query, page=page, per_page=25)
+
+    return render_template('admin/search.html',
+                         title='Search Submissions',
+                         query=query,
+                         results=results)
 
 @bp.route('/approve_user/<int:id>')
 @login_required
@@ -94,3 +124,197 @@ def approve_user(id):
 
     flash(f'User {user.name} has been approved.', 'success')
     return redirect(url_for('admin.users'))
+
+def _bulk_target_ids():
+    """User ids selected on the user list, or every user matching the filters"""
+    user_ids = request.form.getlist('user_ids', type=int)
+    if user_ids:
+        return user_ids
+
+    filters = {key: request.form.get(key) for key in ('status', 'role', 'institution')
+               if request.form.get(key) not in (None, '', 'all')}
+    if not filters:
+        return []
+    return [row.id for row in db.session.query(User.id).filter_by(**filters)]
+
+@bp.route('/users/bulk_approve', methods=['POST'])
+@login_required
+@admin_required
+def bulk_approve_users():
+    """Approve many pending registrations in one request"""
+    approved = approve_users(_bulk_target_ids(), current_user,
+                             request.remote_addr, request.user_agent.string)
+
+    flash(f'{len(approved)} user(s) have been approved.', 'success' if approved else 'info')
+    return redirect(url_for('admin.users', status='Pending'))
+
+@bp.route('/users/bulk_credits', methods=['POST'])
+@login_required
+@admin_required
+def bulk_grant_credits():
+    """Grant credits to many users in one request"""
+    form = BulkCreditGrantForm()
+    if not form.validate_on_submit():
+        flash('Invalid credit grant. Amount must be 1-1000 and a reason is required.', 'error')
+        return redirect(url_for('admin.users'))
+
+    granted = grant_credits(_bulk_target_ids(), form.amount.data, form.reason.data,
+                            current_user, request.remote_addr, request.user_agent.string)
+
+    flash(f'Granted {form.amount.data} credits to {granted} user(s).', 'success' if granted else 'info')
+    return redirect(url_for('admin.users'))
+
+@bp.route('/users/bulk_role', methods=['POST'])
+@login_required
+@admin_required
+def bulk_change_role():
+    """Change the role of many users in one request"""
+    form = BulkRoleChangeForm()
+    if not form.validate_on_submit():
+        flash('Invalid role selected.', 'error')
+        return redirect(url_for('admin.users'))
+
+    try:
+        changed = change_role(_bulk_target_ids(), form.role.data, current_user,
+                              request.remote_addr, request.user_agent.string)
+    except BulkOperationError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin.users'))
+
+    flash(f'{changed} user(s) are now {form.role.data}.', 'success' if changed else 'info')
+    return redirect(url_for('admin.users'))
+
+@bp.route('/cache_stats')
+@login_required
+@admin_required
+def cache_stats():
+    """Hit rates of the in-process caches of this worker"""
+    return jsonify({
+        'user_cache': user_cache.stats(),
+        'stats_cache': stats_cache.stats(),
+        'fragment_cache': fragment_cache.stats()
+    })
+
+@bp.route('/usage_trends')
+@login_required
+@admin_required
+def usage_trends():
+    """Daily usage time series from the rollup table"""
+    days = min(max(request.args.get('days', 30, type=int), 1), 366)
+    institution = request.args.get('institution')
+
+    return jsonify({
+        'days': days,
+        'institution': institution,
+        'series': get_usage_trends(days, institution)
+    })
+
+@bp.route('/broadcast', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def broadcast():
+    """Send a broadcast email to a group of users"""
+    form = EmailBroadcastForm()
+    if form.validate_on_submit():
+        email_broadcast = create_broadcast(form.subject.data, form.message.data,
+                                           form.recipient_type.data, created_by=current_user.id)
+
+        # Log the action
+        log = AuditLog(
+            user_id=current_user.id,
+            action='email_broadcast',
+            resource_type='email_broadcast',
+            resource_id=email_broadcast.id,
+            ip_address=request.remote_addr,
+            user_agent=request.user_agent.string
+        )
+        log.set_details({'recipient_type': email_broadcast.recipient_type,
+                         'recipients': email_broadcast.total_recipients})
+        db.session.add(log)
+        db.session.commit()
+
+        flash(f'Broadcast queued for {email_broadcast.total_recipients} recipients.', 'success')
+        return redirect(url_for('admin.broadcast'))
+
+    broadcasts = EmailBroadcast.query.order_by(EmailBroadcast.created_at.desc()).limit(10).all()
+
+    return render_template('admin/broadcast.html',
+                         title='Broadcast Email',
+                         form=form,
+                         broadcasts=broadcasts_progress(broadcasts))
+
+@bp.route('/broadcast/<int:id>/progress')
+@login_required
+@admin_required
+def broadcast_status(id):
+    """Queueing and delivery progress of a broadcast"""
+    email_broadcast = EmailBroadcast.query.get_or_404(id)
+    return jsonify(broadcast_progress(email_broadcast))
+
+@bp.route('/perplexity_governor')
+@login_required
+@admin_required
+def perplexity_governor():
+    """Active and queued Perplexity calls across all workers"""
+    from app.utils.governor import PerplexityGovernor
+    return jsonify(PerplexityGovernor().status())
+
+@bp.route('/similarity')
+@login_required
+@admin_required
+def similarity():
+    """Clusters of overlapping submissions across research groups"""
+    from app.utils.neighbors import (cluster_submissions, cross_institution_pairs,
+                                     latest_similarity_run, update_in_progress)
+
+    threshold = request.args.get('threshold', current_app.config.get('SIMILARITY_CLUSTER_THRESHOLD', 0.35), type=float)
+    threshold = min(max(threshold, 0.05), 1.0)
+
+    return render_template('admin/similarity.html',
+                         title='Similarity Report',
+                         threshold=threshold,
+                         clusters=cluster_submissions(threshold),
+                         pairs=cross_institution_pairs(threshold),
+                         last_run=latest_similarity_run(),
+                         updating=update_in_progress())
+
+@bp.route('/similarity/update', methods=['POST'])
+@login_required
+@admin_required
+def update_similarity():
+    """Start an incremental (or full) update of the neighbor index"""
+    from app.utils.neighbors import start_background_update
+
+    full = request.form.get('full') == '1'
+    if start_background_update(full=full):
+        # Log the action
+        log = AuditLog(
+            user_id=current_user.id,
+            action='similarity_index_update',
+            resource_type='system',
+            ip_address=request.remote_addr,
+            user_agent=request.user_agent.string
+        )
+        log.set_details({'full': full})
+        db.session.add(log)
+        db.session.commit()
+
+        flash('Similarity index update started.', 'success')
+    else:
+        flash('A similarity index update is already running.', 'info')
+    return redirect(url_for('admin.similarity'))
+
+@bp.route('/analysis_metrics')
+@login_required
+@admin_required
+def analysis_metrics():
+    """Latency percentiles, token usage and cost of recent analyses"""
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
+    summary = summarize_analysis_runs(days)
+
+    if request.args.get('format') == 'json':
+        return jsonify(summary)
+
+    return render_template('admin/analysis_metrics.html',
+                         title='Analysis Metrics',
+                         summary=summary)
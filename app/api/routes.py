@@ -2,11 +2,21 @@
 API Routes for MMSU Prior Art Search Tool
 """
 
-from flask import jsonify, request, current_app
+from flask import jsonify, request, current_app, url_for
 from flask_login import login_required, current_user
 from app.api import bp
-from app.models import User, TechnologySubmission, CreditHistory
+from app import db
+from app.models import User, TechnologySubmission, CreditHistory, SubmissionBatch, AuditLog
 from app.utils.decorators import api_key_required
+from app.utils.pagination import keyset_paginate, InvalidCursor
+from app.utils.search import search_submissions
+from app.utils.batch_submission import (BatchError, parse_disclosures, validate_disclosures,
+                                        create_batch, batch_progress)
+from app.utils.analysis_queue import queue_analyses
+from app.utils.http_cache import revalidate_json
+
+# Polling clients get 304 Not Modified while a response is unchanged
+bp.after_request(revalidate_json)
 
 @bp.route('/status')
 def status():
@@ -35,12 +45,21 @@ def user_profile():
 @bp.route('/user/submissions')
 @login_required
 def user_submissions():
-    """Get user's submissions"""
-    submissions = current_user.submissions.order_by(
-        TechnologySubmission.submitted_at.desc()
-    ).all()
+    """Get user's submissions, newest first, one cursor page at a time"""
+    limit = min(max(request.args.get('limit', 25, type=int), 1), 100)
+    count = request.args.get('count')
 
-    return jsonify({
+    try:
+        page = keyset_paginate(
+            current_user.submissions,
+            (TechnologySubmission.submitted_at, TechnologySubmission.id),
+            cursor=request.args.get('cursor'),
+            per_page=limit,
+            count=count if count in ('exact', 'estimate') else None)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+
+    response = {
         'submissions': [
             {
                 'id': sub.id,
@@ -49,6 +68,92 @@ def user_submissions():
                 'submitted_at': sub.submitted_at.isoformat(),
                 'analyzed_at': sub.analyzed_at.isoformat() if sub.analyzed_at else None,
                 'serial_number': sub.serial_number
-            } for sub in submissions
+            } for sub in page.items
+        ],
+        'next_cursor': page.next_cursor,
+        'has_more': page.has_next
+    }
+    if page.total is not None:
+        response['total'] = page.total
+        response['total_is_estimate'] = page.total_is_estimate
+
+    return jsonify(response)
+
+@bp.route('/user/submissions/search')
+@login_required
+def user_submissions_search():
+    """Full-text search over the current user's submissions"""
+    page = max(request.args.get('page', 1, type=int), 1)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    results = search_submissions(request.args.get('q', ''), user_id=current_user.id,
+                                 page=page, per_page=limit)
+
+    return jsonify({
+        'query': results.query,
+        'page': results.page,
+        'has_more': results.has_next,
+        'results': [
+            {
+                'id': hit.submission.id,
+                'title': hit.submission.title,
+                'serial_number': hit.submission.serial_number,
+                'status': hit.submission.analysis_status,
+                'rank': hit.rank,
+                'title_highlight': str(hit.title_html),
+                'snippet': str(hit.snippet_html)
+            } for hit in results
         ]
     })
+
+@bp.route('/submissions/batch', methods=['POST'])
+@login_required
+def submit_batch():
+    """Ingest many disclosures at once and queue their analyses
+
+    Accepts a JSON array (or {"disclosures": [...]}), a CSV/NDJSON body, or a
+    CSV/NDJSON file upload. The batch is all-or-nothing: any invalid record
+    rejects the whole request with per-record errors.
+    """
+    if not current_user.disclaimer_accepted:
+        return jsonify({'error': 'The disclosure disclaimer must be accepted first.'}), 403
+
+    try:
+        records, source = parse_disclosures(request)
+        disclosures, errors = validate_disclosures(records)
+        if errors:
+            raise BatchError('Some disclosures are invalid.', errors=errors)
+        batch, submission_ids = create_batch(current_user, disclosures, source)
+    except BatchError as e:
+        response = {'error': str(e)}
+        if e.errors:
+            response['errors'] = e.errors
+        return jsonify(response), e.status_code
+
+    # Log the action
+    log = AuditLog(
+        user_id=current_user.id,
+        action='batch_submission_created',
+        resource_type='submission_batch',
+        resource_id=batch.id,
+        ip_address=request.remote_addr,
+        user_agent=request.user_agent.string
+    )
+    log.set_details({'source': source, 'count': len(submission_ids)})
+    db.session.add(log)
+    db.session.commit()
+
+    queue_analyses(submission_ids)
+
+    return jsonify({
+        'batch_id': batch.id,
+        'submitted': len(submission_ids),
+        'submission_ids': submission_ids,
+        'status_url': url_for('api.batch_status', id=batch.id)
+    }), 202
+
+@bp.route('/submissions/batch/<int:id>')
+@login_required
+def batch_status(id):
+    """Analysis progress of a submission batch"""
+    batch = SubmissionBatch.query.filter_by(id=id, user_id=current_user.id).first_or_404()
+    return jsonify(batch_progress(batch))
@@ -4,9 +4,9 @@ Authentication Routes for MMSU Prior Art Search Tool
 
 import random
 from datetime import datetime
+from urllib.parse import urlsplit
 from flask import render_template, redirect, url_for, flash, request, session
 from flask_login import login_user, logout_user, current_user
-from werkzeug.urls import url_parse
 from app import db
 from app.auth import bp
 from app.models import User, AuditLog
@@ -48,7 +48,7 @@ def login():
         db.session.commit()
 
         next_page = request.args.get('next')
-        if not next_page or url_parse(next_page).netloc != '':
+        if not next_page or urlsplit(next_page).netloc != '':
             next_page = url_for('main.dashboard')
         return redirect(next_page)
 
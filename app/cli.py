@@ -0,0 +1,164 @@
+"""
+CLI Commands for MMSU Prior Art Search Tool
+"""
+
+import time
+from datetime import datetime
+import click
+
+def register(app):
+    """Attach custom commands to the flask CLI"""
+
+    @app.cli.group()
+    def startup():
+        """Startup performance commands."""
+        pass
+
+    @startup.command('importtime')
+    @click.option('--budget-ms', type=int, default=None, help='Fail above this many ms (default IMPORT_TIME_BUDGET_MS).')
+    @click.option('--config', 'config_name', default=None, help='Configuration to create the app with.')
+    def check_import_time(budget_ms, config_name):
+        """Measure create_app() import time and check it against the budget."""
+        from app.utils.startup import measure_import_time
+
+        budget_ms = budget_ms or app.config.get('IMPORT_TIME_BUDGET_MS', 1500)
+        report = measure_import_time(config_name)
+        for module, ms in report['top']:
+            click.echo(f'{ms:9.1f} ms  {module}')
+        click.echo(f"Total: {report['total_ms']:.1f} ms (budget {budget_ms} ms)")
+
+        failed = False
+        if report['heavy_loaded']:
+            click.echo(f"Loaded eagerly, should be lazy: {', '.join(report['heavy_loaded'])}", err=True)
+            failed = True
+        if report['total_ms'] > budget_ms:
+            click.echo('Import time is over budget.', err=True)
+            failed = True
+        if failed:
+            raise SystemExit(1)
+
+    @app.cli.group()
+    def rollups():
+        """Daily usage rollup commands."""
+        pass
+
+    @rollups.command()
+    @click.option('--since', default=None, help='Only rebuild days on or after YYYY-MM-DD.')
+    def backfill(since):
+        """Rebuild daily usage rollups from the raw tables."""
+        from app.utils.rollups import backfill_daily_usage
+        since_date = datetime.strptime(since, '%Y-%m-%d').date() if since else None
+        written = backfill_daily_usage(since_date)
+        click.echo(f'Wrote {written} daily usage rows.')
+
+    @app.cli.group()
+    def search():
+        """Full-text search commands."""
+        pass
+
+    @search.command('init')
+    def search_init():
+        """Create the submission search index and index existing rows."""
+        from app.utils.search import init_search_index
+        init_search_index()
+        click.echo('Submission search index is ready.')
+
+    @app.cli.group()
+    def email():
+        """Email outbox commands."""
+        pass
+
+    @email.command('send-outbox')
+    @click.option('--loop', is_flag=True, help='Keep polling instead of exiting when the outbox is empty.')
+    def send_outbox(loop):
+        """Deliver queued emails from the outbox."""
+        from app.utils.outbox import drain_outbox
+        interval = app.config.get('EMAIL_OUTBOX_POLL_INTERVAL', 30)
+        while True:
+            sent = drain_outbox()
+            if sent:
+                click.echo(f'Processed {sent} queued emails.')
+            if not loop:
+                break
+            if not sent:
+                time.sleep(interval)
+
+    @email.command('resume-broadcasts')
+    def resume_broadcasts_command():
+        """Finish queueing broadcasts interrupted by a crash."""
+        from app.utils.broadcast import resume_broadcasts
+        click.echo(f'Queued {resume_broadcasts()} remaining broadcast emails.')
+
+    @app.cli.group()
+    def similarity():
+        """Cross-submission similarity commands."""
+        pass
+
+    @similarity.command('update')
+    @click.option('--full', is_flag=True, help='Recompute every submission instead of only new ones.')
+    def update_similarity(full):
+        """Update the submission neighbor index."""
+        from app.utils.neighbors import IndexUpdateInProgress, update_neighbor_index
+
+        started = time.perf_counter()
+        try:
+            run = update_neighbor_index(full=full)
+        except IndexUpdateInProgress as e:
+            click.echo(f'{e}.', err=True)
+            raise SystemExit(1)
+        click.echo(f'Indexed {run.new_submissions} new of {run.total_submissions} submissions '
+                   f'in {time.perf_counter() - started:.1f}s.')
+
+    @app.cli.group()
+    def analyses():
+        """Bulk analysis commands."""
+        pass
+
+    @analyses.command('run')
+    @click.option('--status', default='Pending', help="Analysis status to select, or 'any'.")
+    @click.option('--since', default=None, help='Submitted on or after YYYY-MM-DD.')
+    @click.option('--until', default=None, help='Submitted before YYYY-MM-DD.')
+    @click.option('--user-id', type=int, default=None, help='Only this user\'s submissions.')
+    @click.option('--ids', default=None, help='Comma-separated submission ids.')
+    @click.option('--concurrency', type=int, default=4, show_default=True, help='Calls in flight at once.')
+    @click.option('--rate', type=float, default=1.0, show_default=True, help='Maximum calls per second.')
+    @click.option('--checkpoint', default=None, help='Checkpoint file; rerun with the same file to resume.')
+    def run_analyses(status, since, until, user_id, ids, concurrency, rate, checkpoint):
+        """Analyze a filtered set of submissions concurrently."""
+        from app.utils.bulk_analysis import select_submissions, run_bulk_analysis
+
+        submission_ids = select_submissions(
+            status=None if status == 'any' else status,
+            since=datetime.strptime(since, '%Y-%m-%d') if since else None,
+            until=datetime.strptime(until, '%Y-%m-%d') if until else None,
+            user_id=user_id,
+            ids=[int(i) for i in ids.split(',')] if ids else None
+        )
+        click.echo(f'Selected {len(submission_ids)} submissions.')
+
+        def progress(submission_id, outcome, stats):
+            click.echo(f"[{stats['completed'] + stats['failed']}/{len(submission_ids)}] "
+                       f"submission {submission_id}: {outcome}")
+
+        stats = run_bulk_analysis(submission_ids, concurrency=concurrency, rate=rate,
+                                  checkpoint_path=checkpoint, progress=progress)
+        click.echo(f"Completed {stats['completed']}, failed {stats['failed']}, "
+                   f"skipped {stats['skipped']} (already in checkpoint), "
+                   f"{stats['busy']} being analyzed elsewhere.")
+
+    @analyses.command('rescore')
+    @click.option('--batch-size', type=int, default=500, show_default=True, help='Submissions scored per batch.')
+    @click.option('--all', 'rescore_all', is_flag=True, help='Also rescore results that are already scored.')
+    def rescore_analyses(batch_size, rescore_all):
+        """Backfill prior art similarity scores of completed analyses."""
+        from app.utils.similarity import rescore_submissions
+
+        started = time.perf_counter()
+
+        def progress(last_id, updated):
+            click.echo(f'Rescored {updated} submissions (up to id {last_id}).')
+
+        updated = rescore_submissions(batch_size=batch_size, rescore_all=rescore_all, progress=progress)
+        elapsed = time.perf_counter() - started
+        click.echo(f'Rescored {updated} submissions in {elapsed:.1f}s '
+                   f'({updated / elapsed if elapsed else 0:.0f}/s).')
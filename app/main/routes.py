@@ -13,9 +13,14 @@ from app import db
 from app.main import bp
 from app.models import User, TechnologySubmission, CreditHistory, DownloadHistory, AuditLog
 from app.main.forms import TechnologySubmissionForm, DisclaimerForm
-from app.utils.ai_analysis import PerplexityAnalyzer
+from app.utils.ai_analysis import plan_reanalysis
+from app.utils.analysis_queue import claim_submission, run_analysis
 from app.utils.pdf_generator import generate_pdf_report
 from app.utils.file_handler import allowed_file, extract_text_from_file
+from app.utils.pagination import keyset_paginate, InvalidCursor
+from app.utils.search import search_submissions
+from app.utils.fragments import fragment_cache, dashboard_fragment_key, results_fragment_key
+from app.utils.http_cache import not_modified, set_validators, page_etag, results_etag
 
 @bp.route('/')
 @bp.route('/index')
@@ -31,20 +36,28 @@ def dashboard():
     if not current_user.disclaimer_accepted:
         return redirect(url_for('main.disclaimer'))
 
-    # Get user's recent submissions
-    submissions = current_user.submissions.order_by(
-        TechnologySubmission.submitted_at.desc()
-    ).limit(10).all()
+    def render_body():
+        # Get user's recent submissions
+        submissions = current_user.submissions.order_by(
+            TechnologySubmission.submitted_at.desc()
+        ).limit(10).all()
 
-    # Get recent credit history
-    credit_history = current_user.credit_history.order_by(
-        CreditHistory.created_at.desc()
-    ).limit(10).all()
+        # Get recent credit history
+        credit_history = current_user.credit_history.order_by(
+            CreditHistory.created_at.desc()
+        ).limit(10).all()
+
+        return render_template('main/_dashboard_body.html',
+                               submissions=submissions,
+                               credit_history=credit_history)
+
+    # Cached per user; dropped when the user's submissions or credits change
+    dashboard_html = fragment_cache.fragment(dashboard_fragment_key(current_user.id),
+                                             fragment_cache.dashboard_ttl, render_body)
 
     return render_template('main/dashboard.html', 
                          title='Dashboard',
-                         submissions=submissions,
-                         credit_history=credit_history)
+                         dashboard_html=dashboard_html)
 
 @bp.route('/disclaimer', methods=['GET', 'POST'])
 @login_required
@@ -84,67 +97,118 @@ def submit_technology():
 
     form = TechnologySubmissionForm()
     if form.validate_on_submit():
-        # Handle file upload
-        uploaded_file = None
-        file_content = ""
-
-        if form.uploaded_file.data:
-            file = form.uploaded_file.data
-            if allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                # Add timestamp to filename to avoid conflicts
-                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                uploaded_file = filename
-
-                # Extract text from file
-                file_content = extract_text_from_file(filepath)
-            else:
-                flash('Invalid file type. Only PDF, DOC, and DOCX files are allowed.', 'error')
-                return render_template('main/submit.html', title='Submit Technology', form=form)
-
-        # Create submission
-        submission = TechnologySubmission(
-            title=form.title.data,
-            description=form.description.data,
-            claims=form.claims.data,
-            inventors=form.inventors.data,
-            institution=form.institution.data or current_user.institution,
-            uploaded_file=uploaded_file,
-            file_content=file_content,
-            user_id=current_user.id
-        )
-        submission.generate_serial_number()
+        submission = _create_submission(form)
+        if submission is None:
+            return render_template('main/submit.html', title='Submit Technology', form=form)
 
-        db.session.add(submission)
-        db.session.commit()
+        flash('Technology submitted successfully! Analysis is in progress.', 'success')
+        return redirect(url_for('main.analyze', id=submission.id))
+
+    return render_template('main/submit.html', title='Submit Technology', form=form)
+
+@bp.route('/resubmit/<int:id>', methods=['GET', 'POST'])
+@login_required
+def resubmit_technology(id):
+    """Submit a revised version of an earlier disclosure"""
+    if not current_user.disclaimer_accepted:
+        return redirect(url_for('main.disclaimer'))
+
+    # No credit check up front: an unchanged revision reuses the previous analysis for free
+    previous = TechnologySubmission.query.filter_by(id=id, user_id=current_user.id).first_or_404()
+
+    form = TechnologySubmissionForm(obj=previous if request.method == 'GET' else None)
+    if form.validate_on_submit():
+        submission = _create_submission(form, previous)
+        if submission is None:
+            return render_template('main/submit.html', title='Revise Technology', form=form, previous=previous)
+
+        flash('Revision submitted successfully! Analysis is in progress.', 'success')
+        return redirect(url_for('main.analyze', id=submission.id))
+
+    return render_template('main/submit.html', title='Revise Technology', form=form, previous=previous)
+
+def _create_submission(form, previous=None):
+    """Save a validated submission form and charge for its analysis
+
+    A revision without a new upload keeps the file of the submission it
+    revises; one that changes nothing the analysis depends on reuses the
+    previous analysis and is free. Returns None when the uploaded file is
+    rejected or the credits do not cover the analysis.
+    """
+    # Handle file upload
+    uploaded_file = previous.uploaded_file if previous else None
+    file_content = (previous.file_content or "") if previous else ""
+
+    if form.uploaded_file.data:
+        file = form.uploaded_file.data
+        if allowed_file(file.filename):
+            filename = secure_filename(file.filename)
+            # Timestamp plus a random suffix: same-second uploads of one filename must not collide
+            filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}_{filename}"
+            os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
+            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+            file.save(filepath)
+            uploaded_file = filename
+
+            # Extract text from file
+            file_content = extract_text_from_file(filepath)
+        else:
+            flash('Invalid file type. Only PDF, DOC, and DOCX files are allowed.', 'error')
+            return None
+
+    submission = TechnologySubmission(
+        title=form.title.data,
+        description=form.description.data,
+        claims=form.claims.data,
+        inventors=form.inventors.data,
+        institution=form.institution.data or current_user.institution,
+        uploaded_file=uploaded_file,
+        file_content=file_content,
+        user_id=current_user.id,
+        revision_of=previous
+    )
+
+    # Charge for the analysis, unless the revision will just reuse the previous one;
+    # the debit itself checks the stored balance
+    cost = 0 if plan_reanalysis(submission).mode == 'reused' else current_app.config.get('ANALYSIS_COST', 1)
+    with db.session.no_autoflush:
+        # The new submission is only on previous.revisions yet; it is added below
+        charged = not cost or current_user.deduct_credits(cost)
+    if not charged:
+        db.session.rollback()
+        if uploaded_file and uploaded_file != (previous.uploaded_file if previous else None):
+            os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], uploaded_file))
+        flash('Insufficient credits. Please contact administrator or upgrade to VIP.', 'error')
+        return None
 
-        # Deduct credits
-        current_user.deduct_credits(current_app.config.get('ANALYSIS_COST', 1))
+    # Create submission
+    submission.generate_serial_number()
+    db.session.add(submission)
+    db.session.flush()
 
+    if cost:
         # Record credit transaction
         credit_record = CreditHistory(
             user_id=current_user.id,
             submission_id=submission.id,
             transaction_type='analysis',
-            amount=-current_app.config.get('ANALYSIS_COST', 1),
+            amount=-cost,
             balance_after=current_user.credits,
             description=f'Analysis for: {submission.title[:50]}...'
         )
         db.session.add(credit_record)
-        db.session.commit()
-
-        # Log the action
-        log_audit_action('submission_created', 'submission', submission.id, {
-            'title': submission.title,
-            'has_file': uploaded_file is not None
-        })
+    db.session.commit()
 
-        flash('Technology submitted successfully! Analysis is in progress.', 'success')
-        return redirect(url_for('main.analyze', id=submission.id))
+    # Log the action
+    details = {
+        'title': submission.title,
+        'has_file': uploaded_file is not None
+    }
+    if previous:
+        details['revision_of'] = previous.id
+    log_audit_action('submission_created', 'submission', submission.id, details)
 
-    return render_template('main/submit.html', title='Submit Technology', form=form)
+    return submission
 
 @bp.route('/analyze/<int:id>')
 @login_required
@@ -155,22 +219,11 @@ def analyze(id):
     if submission.analysis_status == 'Completed':
         return redirect(url_for('main.results', id=id))
 
-    # Simulate AI analysis (in production, this would be async)
-    if submission.analysis_status == 'Pending':
-        submission.analysis_status = 'Processing'
-        db.session.commit()
-
-        # Perform AI analysis
-        analyzer = PerplexityAnalyzer()
-        results = analyzer.analyze_technology(submission)
-
-        submission.set_results(results)
-        submission.analysis_status = 'Completed'
-        submission.analyzed_at = datetime.utcnow()
-        db.session.commit()
-
-        # Log the action
-        log_audit_action('analysis_completed', 'submission', submission.id)
+    # Perform AI analysis unless a batch worker has already claimed it
+    if submission.analysis_status == 'Pending' and claim_submission(submission.id):
+        if run_analysis(submission):
+            # Log the action
+            log_audit_action('analysis_completed', 'submission', submission.id)
 
     return render_template('main/analyze.html', title='AI Analysis', submission=submission)
 
@@ -183,12 +236,22 @@ def results(id):
     if submission.analysis_status != 'Completed':
         return redirect(url_for('main.analyze', id=id))
 
-    results = submission.get_results()
+    etag = page_etag(submission, current_user)
+    cached = not_modified(etag, submission.analyzed_at)
+    if cached:
+        return cached
 
-    return render_template('main/results.html', 
-                         title='Analysis Results',
-                         submission=submission,
-                         results=results)
+    # Completed results do not change in place, so the rendered report is cached under their hash
+    report_html = fragment_cache.fragment(
+        results_fragment_key(submission), fragment_cache.results_ttl,
+        lambda: render_template('main/_results_report.html', submission=submission,
+                                results=submission.get_results()))
+
+    response = current_app.make_response(render_template('main/results.html',
+                                                         title='Analysis Results',
+                                                         submission=submission,
+                                                         report_html=report_html))
+    return set_validators(response, etag, submission.analyzed_at)
 
 @bp.route('/download_pdf/<int:id>')
 @login_required
@@ -200,21 +263,26 @@ def download_pdf(id):
         flash('Analysis not completed yet.', 'error')
         return redirect(url_for('main.results', id=id))
 
-    # Check credits for non-VIP users
-    if not current_user.is_vip() and not current_user.has_credits():
+    # The client already has this report: nothing to generate, charge or record
+    etag = results_etag(submission, 'pdf')
+    cached = not_modified(etag, submission.analyzed_at)
+    if cached:
+        return cached
+
+    # Deduct credits for PDF download; the debit itself checks the stored balance
+    cost = current_app.config.get('PDF_DOWNLOAD_COST', 1)
+    if not current_user.deduct_credits(cost):
+        db.session.rollback()
         flash('Insufficient credits for PDF download.', 'error')
         return redirect(url_for('main.results', id=id))
 
-    # Deduct credits for PDF download
     if not current_user.is_vip():
-        current_user.deduct_credits(current_app.config.get('PDF_DOWNLOAD_COST', 1))
-
         # Record credit transaction
         credit_record = CreditHistory(
             user_id=current_user.id,
             submission_id=submission.id,
             transaction_type='download',
-            amount=-current_app.config.get('PDF_DOWNLOAD_COST', 1),
+            amount=-cost,
             balance_after=current_user.credits,
             description=f'PDF download for: {submission.title[:50]}...'
         )
@@ -237,23 +305,42 @@ def download_pdf(id):
     # Log the action
     log_audit_action('pdf_downloaded', 'submission', submission.id)
 
-    return send_file(pdf_file, as_attachment=True, 
-                    download_name=f"MMSU_Prior_Art_Report_{submission.serial_number}.pdf")
+    response = send_file(pdf_file, as_attachment=True, conditional=False,
+                         download_name=f"MMSU_Prior_Art_Report_{submission.serial_number}.pdf")
+    return set_validators(response, etag, submission.analyzed_at)
 
 @bp.route('/history')
 @login_required
 def history():
     """View submission history"""
-    page = request.args.get('page', 1, type=int)
-    submissions = current_user.submissions.order_by(
-        TechnologySubmission.submitted_at.desc()
-    ).paginate(page=page, per_page=current_app.config.get('POSTS_PER_PAGE', 25), 
-              error_out=False)
+    try:
+        submissions = keyset_paginate(
+            current_user.submissions,
+            (TechnologySubmission.submitted_at, TechnologySubmission.id),
+            cursor=request.args.get('cursor'),
+            per_page=current_app.config.get('POSTS_PER_PAGE', 25),
+            count='exact' if request.args.get('count') else None)
+    except InvalidCursor:
+        return redirect(url_for('main.history'))
 
     return render_template('main/history.html', 
                          title='Submission History',
                          submissions=submissions)
 
+@bp.route('/search')
+@login_required
+def search():
+    """Search the current user's submissions"""
+    query = request.args.get('q', '')
+    page = request.args.get('page', 1, type=int)
+    results = search_submissions(query, user_id=current_user.id, page=page,
+                                 per_page=current_app.config.get('POSTS_PER_PAGE', 25))
+
+    return render_template('main/search.html',
+                         title='Search Submissions',
+                         query=query,
+                         results=results)
+
 def log_audit_action(action, resource_type, resource_id, details=None):
     """Helper function to log audit actions"""
     log = AuditLog(
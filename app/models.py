@@ -10,12 +10,26 @@ from time import time
 from flask import current_app, url_for
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import case, event, inspect, or_, update
+from sqlalchemy.orm import Session, make_transient_to_detached
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 from app import db, login
+from app.utils.cache import HostInvalidatedCache
+
+# Per-process cache of authenticated users, keyed by user id; invalidations
+# reach the other workers on the host through stamp files
+user_cache = HostInvalidatedCache(maxsize=2048)
+
+UNLIMITED_ROLES = ('Admin', 'VIP')
 
 class User(UserMixin, db.Model):
     """User model"""
+    __table_args__ = (
+        # Keyset pagination of the admin user list
+        db.Index('ix_user_created_at_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), index=True, unique=True)
     name = db.Column(db.String(100), nullable=False)
@@ -65,22 +79,37 @@ class User(UserMixin, db.Model):
         return User.query.get(id)
 
     def has_credits(self, amount=1):
-        """Check if user has enough credits"""
-        if self.role in ['Admin', 'VIP']:
+        """Check if user has enough credits (a hint for pages; deduct_credits decides)"""
+        if self.role in UNLIMITED_ROLES:
             return True
         return self.credits >= amount
 
     def deduct_credits(self, amount):
-        """Deduct credits from user account"""
-        if self.role not in ['Admin', 'VIP']:
-            self.credits -= amount
-            if self.credits < 0:
-                self.credits = 0
+        """Debit credits if the stored balance covers them; returns False if it does not
+
+        The check and the debit are one conditional UPDATE on the stored row,
+        so neither a cached balance nor a concurrent request in another
+        worker can spend the same credits twice. Admin and VIP users pass
+        without a debit.
+        """
+        unlimited = User.role.in_(UNLIMITED_ROLES)
+        result = db.session.execute(
+            update(User)
+            .where(User.id == self.id, or_(unlimited, User.credits >= amount))
+            .values(credits=case((unlimited, User.credits), else_=User.credits - amount)),
+            execution_options={'synchronize_session': False}
+        )
+        # Read the new balance (and role) back on next access
+        db.session.expire(self, ['credits', 'role'])
+        db.session.info.setdefault('changed_user_ids', set()).add(self.id)
+        user_cache.invalidate(self.id)
+        return result.rowcount == 1
 
     def add_credits(self, amount):
         """Add credits to user account"""
         if self.role not in ['Admin', 'VIP']:
-            self.credits += amount
+            self.credits = User.credits + amount
+            db.session.flush()
 
     def is_admin(self):
         return self.role == 'Admin'
@@ -90,6 +119,12 @@ class User(UserMixin, db.Model):
 
 class TechnologySubmission(db.Model):
     """Technology submission model"""
+    __table_args__ = (
+        # Keyset pagination of all submissions and of one user's history
+        db.Index('ix_technology_submission_submitted_at_id', 'submitted_at', 'id'),
+        db.Index('ix_technology_submission_user_submitted_at_id', 'user_id', 'submitted_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -110,9 +145,13 @@ class TechnologySubmission(db.Model):
 
     # Foreign keys
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    batch_id = db.Column(db.Integer, db.ForeignKey('submission_batch.id'), index=True)
+    revision_of_id = db.Column(db.Integer, db.ForeignKey('technology_submission.id'), index=True)
 
     # Relationships
     downloads = db.relationship('DownloadHistory', backref='submission', lazy='dynamic')
+    revision_of = db.relationship('TechnologySubmission', remote_side=[id],
+                                  backref=db.backref('revisions', lazy='dynamic'))
 
     def __repr__(self):
         return f'<Submission {self.title}>'
@@ -129,8 +168,85 @@ class TechnologySubmission(db.Model):
 
     def generate_serial_number(self):
         """Generate unique serial number for the submission"""
+        self.serial_number = TechnologySubmission.new_serial_number()
+
+    @staticmethod
+    def new_serial_number():
+        """Return a fresh serial number, e.g. for bulk-inserted rows"""
         import uuid
-        self.serial_number = f"MMSU-PA-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+        return f"MMSU-PA-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+
+class AnalysisRun(db.Model):
+    """Latency, token usage and cost of one analysis of a submission"""
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('technology_submission.id'), nullable=False, index=True)
+    source = db.Column(db.String(20), nullable=False)  # live, fallback, simulated, cached
+    mode = db.Column(db.String(20), default='full')  # full, incremental, reused
+    model = db.Column(db.String(100))
+    succeeded = db.Column(db.Boolean, default=True)
+    error_message = db.Column(db.Text)
+
+    # Timings in milliseconds
+    queued_ms = db.Column(db.Integer)  # waiting for a governor slot
+    upstream_ms = db.Column(db.Integer)  # Perplexity round trip(s)
+    total_ms = db.Column(db.Integer)  # whole analysis, including prompt building and parsing
+
+    # Usage reported by the API and derived cost
+    prompt_tokens = db.Column(db.Integer)
+    completion_tokens = db.Column(db.Integer)
+    retries = db.Column(db.Integer, default=0)
+    cost = db.Column(db.Float)  # USD, from the configured price table
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    # Relationships
+    submission = db.relationship('TechnologySubmission',
+                                 backref=db.backref('analysis_runs', lazy='dynamic'))
+
+    def __repr__(self):
+        return f'<AnalysisRun {self.submission_id} {self.source}>'
+
+class SubmissionBatch(db.Model):
+    """A group of submissions ingested together through the batch API"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    source = db.Column(db.String(20))  # json, csv, ndjson
+    total = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    submissions = db.relationship('TechnologySubmission', backref='batch', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<SubmissionBatch {self.id}: {self.total}>'
+
+class SubmissionNeighbor(db.Model):
+    """One of a submission's k most similar other submissions"""
+    __table_args__ = (
+        db.UniqueConstraint('submission_id', 'neighbor_id', name='uq_submission_neighbor_pair'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('technology_submission.id'), nullable=False, index=True)
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('technology_submission.id'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False, index=True)  # TF-IDF cosine similarity, 0..1
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SubmissionNeighbor {self.submission_id}~{self.neighbor_id}: {self.score:.2f}>'
+
+class SimilarityRun(db.Model):
+    """One (incremental or full) update of the submission neighbor index"""
+    id = db.Column(db.Integer, primary_key=True)
+    full_rebuild = db.Column(db.Boolean, default=False)
+    indexed_through_id = db.Column(db.Integer, nullable=False, default=0)  # watermark for the next run
+    new_submissions = db.Column(db.Integer, default=0)
+    total_submissions = db.Column(db.Integer, default=0)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<SimilarityRun {self.id} through {self.indexed_through_id}>'
 
 class CreditHistory(db.Model):
     """Credit transaction history"""
@@ -185,19 +301,130 @@ class AuditLog(db.Model):
         self.details = json.dumps(details)
 
 class EmailLog(db.Model):
-    """Email sending log"""
+    """Email outbox and sending log"""
+    __table_args__ = (
+        # Outbox polling: due Pending rows and expired Sending claims
+        db.Index('ix_email_log_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     recipient_email = db.Column(db.String(120), nullable=False)
     subject = db.Column(db.String(200), nullable=False)
     template_name = db.Column(db.String(50))
-    status = db.Column(db.String(20), default='Pending')  # Pending, Sent, Failed
+    status = db.Column(db.String(20), default='Pending')  # Pending, Sending, Sent, Failed
     error_message = db.Column(db.Text)
     sent_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Outbox fields: the rendered message and delivery bookkeeping
+    sender = db.Column(db.String(120))
+    html_body = db.Column(db.Text)
+    text_body = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_by = db.Column(db.String(64))
+    claimed_at = db.Column(db.DateTime)
+    priority = db.Column(db.Integer, nullable=False, default=0)  # 0 transactional, 1 bulk
+    broadcast_id = db.Column(db.Integer, db.ForeignKey('email_broadcast.id'), index=True)
+
     def __repr__(self):
         return f'<EmailLog {self.recipient_email}: {self.subject}>'
 
+class EmailBroadcast(db.Model):
+    """Admin broadcast email, fanned out into the outbox in resumable chunks"""
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    recipient_type = db.Column(db.String(20), nullable=False)  # all, active, vip, regular
+    status = db.Column(db.String(20), default='Queueing')  # Queueing, Queued
+    total_recipients = db.Column(db.Integer, default=0)
+    queued_count = db.Column(db.Integer, default=0)
+    last_user_id = db.Column(db.Integer, nullable=False, default=0)  # resume checkpoint
+    html_body = db.Column(db.Text)  # rendered once, with a name placeholder
+    text_body = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    queued_at = db.Column(db.DateTime)
+
+    # Relationships
+    emails = db.relationship('EmailLog', backref='broadcast', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<EmailBroadcast {self.subject}>'
+
+class ApiCallLease(db.Model):
+    """Waiting or active slot for an outbound Perplexity call, shared by all workers"""
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(32), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, index=True)
+    lane = db.Column(db.String(10), nullable=False)  # priority, regular
+    state = db.Column(db.String(10), nullable=False, default='waiting')  # waiting, active
+    enqueued_at = db.Column(db.DateTime, default=datetime.utcnow)
+    acquired_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<ApiCallLease {self.lane} {self.state} user={self.user_id}>'
+
+class DailyUsage(db.Model):
+    """Per-day, per-institution usage counters maintained incrementally on write"""
+    __table_args__ = (
+        db.UniqueConstraint('day', 'institution', name='uq_daily_usage_day_institution'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    institution = db.Column(db.String(200), nullable=False, default='')  # '' when unknown
+    submissions = db.Column(db.Integer, nullable=False, default=0)
+    analyses = db.Column(db.Integer, nullable=False, default=0)
+    downloads = db.Column(db.Integer, nullable=False, default=0)
+    credits_spent = db.Column(db.Integer, nullable=False, default=0)
+    new_users = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyUsage {self.day} {self.institution}>'
+
 @login.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    user_id = int(id)
+    # Read the stamp before loading, so an invalidation racing with the load is not lost
+    stamp = user_cache.stamp(user_id)
+    state = user_cache.get(user_id, stamp)
+    if state is not None:
+        # Re-attach a snapshot to this request's session without a SELECT
+        user = User(**state)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        user_cache.set(user_id, _user_snapshot(user), stamp,
+                       ttl=current_app.config.get('USER_CACHE_TTL', 30))
+    return user
+
+def _user_snapshot(user):
+    """Column values of a user, safe to share between requests"""
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+def invalidate_user_cache(*user_ids):
+    """Evict users whose role, status or credits changed outside the ORM"""
+    user_cache.invalidate(*user_ids)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = {obj.id for obj in list(session.dirty) + list(session.deleted)
+               if isinstance(obj, User)}
+    if changed:
+        user_cache.invalidate(*changed)
+        session.info.setdefault('changed_user_ids', set()).update(changed)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    # Evict again after commit so a concurrent miss cannot re-cache the old row
+    changed = session.info.pop('changed_user_ids', None)
+    if changed:
+        user_cache.invalidate(*changed)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_user_ids', None)
@@ -3,9 +3,14 @@ AI Analysis Utility using Perplexity API
 """
 
 import json
-import requests
+import time
+from contextlib import nullcontext
 from datetime import datetime
 from flask import current_app
+from app import db
+from app.utils.db_engine import PendingChangesError, end_read_transaction
+from app.utils.governor import GovernorTimeout, PerplexityGovernor
+from app.utils.metrics import observe_external
 
 class PerplexityAnalyzer:
     """Perplexity API integration for prior art analysis"""
@@ -13,6 +18,8 @@ class PerplexityAnalyzer:
     def __init__(self):
         self.api_key = current_app.config.get('PERPLEXITY_API_KEY')
         self.api_url = current_app.config.get('PERPLEXITY_API_URL')
+        self.timeout = current_app.config.get('PERPLEXITY_TIMEOUT', 120)
+        self.last_metrics = None
 
     def analyze_technology(self, submission):
         """Analyze technology submission for prior art"""
@@ -20,13 +27,74 @@ class PerplexityAnalyzer:
         # For demo purposes, we'll simulate the AI analysis
         # In production, this would call the actual Perplexity API
 
-        if self.api_key and self.api_url:
-            return self._call_perplexity_api(submission)
+        # Timing and usage of this call, read back by the caller for accounting
+        self.last_metrics = new_metrics()
+        started = time.perf_counter()
+
+        # A revision may reuse some or all of its predecessor's analysis
+        plan = plan_reanalysis(submission)
+        self.last_metrics['mode'] = plan.mode
+
+        if plan.mode == 'reused':
+            self.last_metrics['source'] = 'cached'
+            results = plan.merge(None)
+        elif self.api_key and self.api_url:
+            results = plan.merge(self._call_perplexity_api(submission, plan))
         else:
-            return self._simulate_analysis(submission)
+            results = plan.merge(self._simulate_analysis(submission))
 
-    def _call_perplexity_api(self, submission):
+        self.last_metrics['total_ms'] = elapsed_ms(started)
+        return results
+
+    def _call_perplexity_api(self, submission, plan=None):
         """Call actual Perplexity API"""
+        import requests
+
+        try:
+            metrics = self.last_metrics
+            headers, data = self.build_request(submission, plan)
+            slot = self.call_slot(submission)
+
+            # Everything the call needs has been read; don't hold the connection idle in
+            # transaction while queueing and waiting upstream (the submission reloads afterwards)
+            end_read_transaction(db.session)
+
+            with slot as lease:
+                if lease is not None:
+                    metrics['queued_ms'] = int(lease.wait_seconds * 1000)
+                sent = time.perf_counter()
+                with observe_external('perplexity'):
+                    response = requests.post(self.api_url, headers=headers, json=data, timeout=self.timeout)
+                metrics['upstream_ms'] = elapsed_ms(sent)
+            response.raise_for_status()
+
+            result = response.json()
+            metrics.update(usage_from_response(result))
+            analysis = self.parse_response(result)
+            metrics['source'] = 'live'
+            return analysis
+
+        except (GovernorTimeout, PendingChangesError):
+            # Nothing was asked upstream; the caller marks the analysis Failed
+            raise
+        except Exception as e:
+            current_app.logger.error(f"Perplexity API error: {str(e)}")
+            # Sample data stands in for the failed call; it is accounted as a failure
+            self.last_metrics['source'] = 'fallback'
+            self.last_metrics['error'] = str(e)[:500]
+            return self._simulate_analysis(submission)
+
+    def call_slot(self, submission):
+        """Context manager holding a global Perplexity call slot for this submission"""
+        if not current_app.config.get('PERPLEXITY_GOVERNOR_ENABLED', True):
+            return nullcontext()
+        return PerplexityGovernor().slot(user_id=submission.user_id,
+                                         priority=is_priority_submission(submission))
+
+    def build_request(self, submission, plan=None):
+        """Return (headers, payload) for a chat completion request"""
+        if plan is not None and plan.mode == 'incremental':
+            return self._build_incremental_request(submission, plan)
 
         # Prepare the system prompt
         system_prompt = """You are an expert Patent Analyst AI. Analyze the provided technology disclosure and perform a comprehensive prior art search. Return your findings as a single, valid JSON object with the following structure:
@@ -69,32 +137,69 @@ Institution: {submission.institution or 'Not provided'}
 Additional File Content: {submission.file_content or 'None'}
         """
 
-        try:
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
+        return self._request(system_prompt, user_query)
 
-            data = {
-                'model': 'llama-3-sonar-large-32k-online',
-                'messages': [
-                    {'role': 'system', 'content': system_prompt},
-                    {'role': 'user', 'content': user_query}
-                ]
-            }
+    def _build_incremental_request(self, submission, plan):
+        """Ask only for a fresh assessment against the prior art already found"""
 
-            response = requests.post(self.api_url, headers=headers, json=data, timeout=120)
-            response.raise_for_status()
+        system_prompt = """You are an expert Patent Analyst AI. A prior art search for this technology has already been completed and is listed below. The inventors have revised their claims. Re-assess patentability of the revised claims against that prior art only, without searching again. Return a single, valid JSON object with the following structure:
 
-            result = response.json()
-            content = result['choices'][0]['message']['content']
+{
+  "patentability_analysis": {
+    "novelty": "Assessment of novelty with explanation",
+    "inventive_step": "Evaluation of inventive step/non-obviousness",
+    "industrial_applicability": "Analysis of practical application potential"
+  },
+  "recommendations": {
+    "improvement_suggestions": "Specific recommendations for enhancing novelty/inventive step",
+    "patent_filing_advice": "Whether to contact Patent Agent/Attorney and next steps"
+  }
+}"""
 
-            # Parse the JSON response
-            return json.loads(content)
+        # Titles and summaries are enough context; similarities/differences stay as stored
+        prior_art = '\n'.join(
+            f"{number}. {item.get('title', '')}: {item.get('summary', '')}"
+            for number, item in enumerate(plan.previous_results['prior_art_report'], start=1)
+        )
 
-        except Exception as e:
-            current_app.logger.error(f"Perplexity API error: {str(e)}")
-            return self._simulate_analysis(submission)
+        user_query = f"""
+Technology Title: {submission.title}
+
+Description: {submission.description}
+
+Previous Claims: {plan.previous.claims or 'Not provided'}
+
+Revised Claims: {submission.claims or 'Not provided'}
+
+Prior Art Found:
+{prior_art}
+        """
+
+        return self._request(system_prompt, user_query)
+
+    def _request(self, system_prompt, user_query):
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+
+        data = {
+            'model': 'llama-3-sonar-large-32k-online',
+            'messages': [
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': user_query}
+            ]
+        }
+
+        return headers, data
+
+    @staticmethod
+    def parse_response(result):
+        """Extract the analysis JSON object from a chat completion response"""
+        content = result['choices'][0]['message']['content']
+
+        # Parse the JSON response
+        return json.loads(content)
 
     def _simulate_analysis(self, submission):
         """Simulate AI analysis with realistic sample data"""
@@ -175,3 +280,95 @@ Additional File Content: {submission.file_content or 'None'}
                 "patent_filing_advice": "Based on this preliminary analysis, your technology shows promising patentability potential. The combination of novelty, inventive step, and clear industrial applicability suggests that patent filing could be worthwhile. However, you should consult with a qualified Patent Agent or Patent Attorney for a comprehensive freedom-to-operate analysis and professional patentability opinion before proceeding with filing. Consider conducting a more detailed prior art search and preparing detailed technical specifications to support your patent application."
             }
         }
+
+# Fields that drive the prior art search itself, and fields that only affect
+# the patentability assessment. Anything else (inventors, institution) does
+# not change the analysis at all.
+SEARCH_FIELDS = ('title', 'description', 'file_content')
+ASSESSMENT_FIELDS = ('claims',)
+
+class ReanalysisPlan:
+    """How much of the predecessor's analysis a revised submission can reuse
+
+    mode is 'full' (analyze from scratch), 'incremental' (keep the prior art
+    report, re-assess patentability and recommendations) or 'reused' (keep
+    the whole analysis).
+    """
+
+    def __init__(self, mode, previous=None, previous_results=None, changed_fields=()):
+        self.mode = mode
+        self.previous = previous
+        self.previous_results = previous_results
+        self.changed_fields = list(changed_fields)
+
+    def merge(self, results):
+        """Combine freshly computed results with what is reused"""
+        if self.mode == 'full':
+            return results
+
+        merged = dict(self.previous_results)
+        if self.mode == 'incremental':
+            merged['patentability_analysis'] = results['patentability_analysis']
+            merged['recommendations'] = results['recommendations']
+        merged['revision'] = {
+            'previous_submission_id': self.previous.id,
+            'previous_serial_number': self.previous.serial_number,
+            'mode': self.mode,
+            'changed_fields': self.changed_fields
+        }
+        return merged
+
+def plan_reanalysis(submission):
+    """Diff a submission against the one it revises and pick a ReanalysisPlan"""
+    previous = submission.revision_of
+    if previous is None or not current_app.config.get('INCREMENTAL_REANALYSIS_ENABLED', True):
+        return ReanalysisPlan('full')
+
+    previous_results = previous.get_results() if previous.analysis_status == 'Completed' else None
+    if not previous_results or not previous_results.get('prior_art_report'):
+        return ReanalysisPlan('full')
+
+    changed = [field for field in SEARCH_FIELDS + ASSESSMENT_FIELDS
+               if _normalized(getattr(submission, field)) != _normalized(getattr(previous, field))]
+    if any(field in SEARCH_FIELDS for field in changed):
+        mode = 'full'
+    elif changed:
+        mode = 'incremental'
+    else:
+        mode = 'reused'
+    return ReanalysisPlan(mode, previous, previous_results, changed)
+
+def _normalized(value):
+    # Whitespace-only edits do not count as changes
+    return ' '.join((value or '').split())
+
+def is_priority_submission(submission):
+    """Admin and VIP submissions use the governor's priority lane"""
+    return submission.author is not None and submission.author.is_vip()
+
+def new_metrics():
+    """Empty per-call accounting record (see AnalysisRun)"""
+    return {
+        'source': 'simulated',
+        'mode': 'full',
+        'model': None,
+        'queued_ms': None,
+        'upstream_ms': None,
+        'total_ms': None,
+        'prompt_tokens': None,
+        'completion_tokens': None,
+        'retries': 0,
+        'error': None
+    }
+
+def usage_from_response(result):
+    """Model name and token counts from a chat completion response"""
+    usage = result.get('usage') or {}
+    return {
+        'model': result.get('model'),
+        'prompt_tokens': usage.get('prompt_tokens'),
+        'completion_tokens': usage.get('completion_tokens')
+    }
+
+def elapsed_ms(started):
+    return int((time.perf_counter() - started) * 1000)
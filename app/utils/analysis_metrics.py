@@ -0,0 +1,107 @@
+"""
+Analysis Accounting Utility
+
+Stores one AnalysisRun per analysis with its latency, token usage and cost,
+and summarizes them with percentiles for capacity planning.
+"""
+
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models import AnalysisRun
+
+PERCENTILES = (50, 90, 95, 99)
+
+def record_analysis_run(submission_id, metrics, succeeded=True):
+    """Add an AnalysisRun for the given metrics to the session (caller commits)
+
+    A live call that failed and was answered with sample data (source
+    'fallback') is recorded as not succeeded.
+    """
+    if metrics.get('source') == 'fallback':
+        succeeded = False
+    run = AnalysisRun(
+        submission_id=submission_id,
+        source=metrics.get('source') or 'simulated',
+        mode=metrics.get('mode') or 'full',
+        model=metrics.get('model'),
+        succeeded=succeeded,
+        error_message=metrics.get('error'),
+        queued_ms=metrics.get('queued_ms'),
+        upstream_ms=metrics.get('upstream_ms'),
+        total_ms=metrics.get('total_ms'),
+        prompt_tokens=metrics.get('prompt_tokens'),
+        completion_tokens=metrics.get('completion_tokens'),
+        retries=metrics.get('retries') or 0,
+        cost=estimate_cost(metrics)
+    )
+    db.session.add(run)
+    return run
+
+def estimate_cost(metrics):
+    """USD cost of a live call from the configured Perplexity price table"""
+    if metrics.get('source') != 'live':
+        return 0.0
+    config = current_app.config
+    attempts = 1 + (metrics.get('retries') or 0)
+    return round(
+        attempts * config.get('PERPLEXITY_PRICE_PER_REQUEST', 0.0)
+        + (metrics.get('prompt_tokens') or 0) / 1000 * config.get('PERPLEXITY_PRICE_PER_1K_PROMPT_TOKENS', 0.0)
+        + (metrics.get('completion_tokens') or 0) / 1000 * config.get('PERPLEXITY_PRICE_PER_1K_COMPLETION_TOKENS', 0.0),
+        6
+    )
+
+def percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return round(sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower), 1)
+
+def summarize_analysis_runs(days=30):
+    """Percentiles, token totals and cost of analyses over the last N days"""
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = db.session.query(
+        AnalysisRun.source, AnalysisRun.mode, AnalysisRun.succeeded, AnalysisRun.queued_ms, AnalysisRun.upstream_ms,
+        AnalysisRun.total_ms, AnalysisRun.prompt_tokens, AnalysisRun.completion_tokens,
+        AnalysisRun.retries, AnalysisRun.cost
+    ).filter(AnalysisRun.created_at >= since).all()
+
+    def distribution(values):
+        values = sorted(v for v in values if v is not None)
+        summary = {f'p{pct}': percentile(values, pct) for pct in PERCENTILES}
+        summary['max'] = values[-1] if values else None
+        summary['count'] = len(values)
+        return summary
+
+    by_source, by_mode = {}, {}
+    for row in rows:
+        by_source[row.source] = by_source.get(row.source, 0) + 1
+        by_mode[row.mode or 'full'] = by_mode.get(row.mode or 'full', 0) + 1
+
+    live = [row for row in rows if row.source == 'live']
+    return {
+        'days': days,
+        'analyses': len(rows),
+        'failed': sum(1 for row in rows if not row.succeeded),
+        'by_source': by_source,
+        'by_mode': by_mode,
+        'retries': sum(row.retries or 0 for row in rows),
+        'latency_ms': {
+            'queued': distribution(row.queued_ms for row in live),
+            'upstream': distribution(row.upstream_ms for row in live),
+            'total': distribution(row.total_ms for row in rows)
+        },
+        'tokens': {
+            'prompt': sum(row.prompt_tokens or 0 for row in rows),
+            'completion': sum(row.completion_tokens or 0 for row in rows),
+            'per_live_analysis': distribution(
+                (row.prompt_tokens or 0) + (row.completion_tokens or 0) for row in live)
+        },
+        'cost': {
+            'total': round(sum(row.cost or 0 for row in rows), 4),
+            'per_live_analysis': distribution(row.cost for row in live)
+        }
+    }
@@ -0,0 +1,98 @@
+"""
+Analysis Queue Utility
+
+Runs prior art analyses either inline (the analyze page) or on a small
+per-process thread pool (batch submissions). A submission is claimed with a
+conditional Pending -> Processing UPDATE, so it is analyzed exactly once no
+matter which path reaches it first.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import update
+from app import db
+from app.models import TechnologySubmission, AuditLog
+from app.utils.ai_analysis import PerplexityAnalyzer, new_metrics
+from app.utils.analysis_metrics import record_analysis_run
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def claim_submission(submission_id, from_status='Pending'):
+    """Move a submission from from_status to Processing; True if this caller won
+
+    The bulk runner re-runs Completed or Failed submissions by claiming them
+    from that status.
+    """
+    result = db.session.execute(
+        update(TechnologySubmission)
+        .where(TechnologySubmission.id == submission_id,
+               TechnologySubmission.analysis_status == from_status)
+        .values(analysis_status='Processing'),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+def run_analysis(submission):
+    """Analyze a claimed submission and store its results; True on success"""
+    analyzer = PerplexityAnalyzer()
+    try:
+        results = analyzer.analyze_technology(submission)
+    except Exception as e:
+        current_app.logger.error(f"Analysis of submission {submission.id} failed: {str(e)}")
+        db.session.rollback()
+        submission.analysis_status = 'Failed'
+        metrics = analyzer.last_metrics or new_metrics()
+        metrics['error'] = str(e)[:500]
+        record_analysis_run(submission.id, metrics, succeeded=False)
+        db.session.commit()
+        return False
+
+    # NumPy/SciPy are only needed once an analysis finishes
+    from app.utils.similarity import rank_prior_art
+    submission.set_results(rank_prior_art(submission, results))
+    submission.analysis_status = 'Completed'
+    submission.analyzed_at = datetime.utcnow()
+    record_analysis_run(submission.id, analyzer.last_metrics)
+    db.session.commit()
+    return True
+
+def queue_analyses(submission_ids):
+    """Analyze submissions in the background with bounded concurrency"""
+    app = current_app._get_current_object()
+    executor = _get_executor(app)
+    for submission_id in submission_ids:
+        executor.submit(_analyze_in_background, app, submission_id)
+
+def _get_executor(app):
+    global _executor, _executor_pid
+    with _executor_lock:
+        # Worker threads do not survive a fork, so each process builds its own pool
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get('BATCH_ANALYSIS_CONCURRENCY', 2),
+                thread_name_prefix='analysis')
+            _executor_pid = os.getpid()
+        return _executor
+
+def _analyze_in_background(app, submission_id):
+    with app.app_context():
+        try:
+            if not claim_submission(submission_id):
+                return
+            submission = db.session.get(TechnologySubmission, submission_id)
+            if run_analysis(submission):
+                db.session.add(AuditLog(
+                    user_id=submission.user_id,
+                    action='analysis_completed',
+                    resource_type='submission',
+                    resource_id=submission.id
+                ))
+                db.session.commit()
+        except Exception:
+            app.logger.exception(f'Background analysis of submission {submission_id} failed')
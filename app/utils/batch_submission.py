@@ -0,0 +1,170 @@
+"""
+Batch Submission Utility
+
+Parses disclosures posted as a JSON array, CSV or NDJSON, validates every
+record with the rules of TechnologySubmissionForm, and ingests a valid batch
+with one bulk INSERT and a single credit debit.
+"""
+
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, insert
+from werkzeug.datastructures import MultiDict
+from app import db
+from app.models import TechnologySubmission, SubmissionBatch, CreditHistory
+from app.main.forms import TechnologySubmissionForm
+from app.utils.rollups import new_increments, record_usage
+
+FIELDS = ('title', 'description', 'claims', 'inventors', 'institution')
+
+class BatchError(ValueError):
+    """Raised when a batch cannot be parsed or accepted"""
+
+    def __init__(self, message, status_code=400, errors=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.errors = errors or []
+
+def parse_disclosures(request):
+    """Return (records, source) from a JSON body, an uploaded file or a raw body"""
+    upload = request.files.get('file')
+    if upload is not None and upload.filename:
+        text = upload.read().decode('utf-8-sig')
+        name = upload.filename.lower()
+        if name.endswith('.csv'):
+            return _parse_csv(text), 'csv'
+        if name.endswith(('.ndjson', '.jsonl')):
+            return _parse_ndjson(text), 'ndjson'
+        raise BatchError('Unsupported file type. Upload a .csv, .ndjson or .jsonl file.')
+
+    mimetype = request.mimetype
+    if mimetype == 'application/json':
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload = payload.get('disclosures')
+        if not isinstance(payload, list):
+            raise BatchError('Expected a JSON array of disclosures.')
+        return payload, 'json'
+    if mimetype in ('application/x-ndjson', 'application/jsonl'):
+        return _parse_ndjson(request.get_data(as_text=True)), 'ndjson'
+    if mimetype == 'text/csv':
+        return _parse_csv(request.get_data(as_text=True)), 'csv'
+
+    raise BatchError('Send a JSON array, CSV or NDJSON body, or upload a file.', status_code=415)
+
+def _parse_csv(text):
+    return list(csv.DictReader(io.StringIO(text)))
+
+def _parse_ndjson(text):
+    records = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            raise BatchError(f'Line {line_number} is not valid JSON.')
+    return records
+
+def validate_disclosures(records):
+    """Validate each record like a submission form post
+
+    Returns (cleaned, errors) where errors is a list of
+    {'index': n, 'errors': {field: [messages]}}.
+    """
+    max_rows = current_app.config.get('BATCH_SUBMISSION_MAX_ROWS', 500)
+    if not records:
+        raise BatchError('The batch contains no disclosures.')
+    if len(records) > max_rows:
+        raise BatchError(f'A batch may contain at most {max_rows} disclosures.', status_code=413)
+
+    cleaned, errors = [], []
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors.append({'index': index, 'errors': {'record': ['Expected an object.']}})
+            continue
+
+        formdata = MultiDict({field: str(record.get(field) or '').strip() for field in FIELDS})
+        form = TechnologySubmissionForm(formdata=formdata, meta={'csrf': False})
+        if form.validate():
+            cleaned.append({field: form[field].data or None for field in FIELDS})
+        else:
+            errors.append({'index': index, 'errors': form.errors})
+
+    return cleaned, errors
+
+def create_batch(user, disclosures, source):
+    """Insert a validated batch and debit credits once
+
+    Returns (batch, submission_ids).
+    """
+    cost = current_app.config.get('ANALYSIS_COST', 1) * len(disclosures)
+    # Debit credits once for the whole batch; the conditional UPDATE checks the stored balance
+    if not user.deduct_credits(cost):
+        db.session.rollback()
+        raise BatchError(f'Insufficient credits: this batch needs {cost}.', status_code=402)
+
+    batch = SubmissionBatch(user_id=user.id, source=source, total=len(disclosures))
+    db.session.add(batch)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            'title': disclosure['title'],
+            'description': disclosure['description'],
+            'claims': disclosure['claims'],
+            'inventors': disclosure['inventors'],
+            'institution': disclosure['institution'] or user.institution,
+            'file_content': '',
+            'analysis_status': 'Pending',
+            'serial_number': TechnologySubmission.new_serial_number(),
+            'submitted_at': now,
+            'user_id': user.id,
+            'batch_id': batch.id
+        } for disclosure in disclosures
+    ]
+    submission_ids = db.session.execute(
+        insert(TechnologySubmission).returning(TechnologySubmission.id, sort_by_parameter_order=True),
+        rows
+    ).scalars().all()
+
+    # Bulk inserts bypass the rollup flush listener, so count them here
+    increments = new_increments()
+    increments[(now.date(), user.institution or '')]['submissions'] += len(submission_ids)
+    record_usage(db.session.connection(), increments)
+
+    db.session.add(CreditHistory(
+        user_id=user.id,
+        transaction_type='analysis',
+        amount=-cost,
+        balance_after=user.credits,
+        description=f'Batch analysis of {len(submission_ids)} submissions (batch #{batch.id})'
+    ))
+    db.session.commit()
+
+    return batch, submission_ids
+
+def batch_progress(batch):
+    """Analysis status counts for a batch"""
+    counts = defaultdict(int)
+    for status, n in db.session.query(TechnologySubmission.analysis_status, func.count()) \
+            .filter(TechnologySubmission.batch_id == batch.id) \
+            .group_by(TechnologySubmission.analysis_status):
+        counts[status] = n
+
+    finished = counts['Completed'] + counts['Failed']
+    return {
+        'batch_id': batch.id,
+        'total': batch.total,
+        'pending': counts['Pending'],
+        'processing': counts['Processing'],
+        'completed': counts['Completed'],
+        'failed': counts['Failed'],
+        'done': finished >= batch.total,
+        'created_at': batch.created_at.isoformat()
+    }
@@ -0,0 +1,154 @@
+"""
+Broadcast Email Utility
+
+A broadcast is rendered once, then fanned out into the email outbox as
+bulk-inserted EmailLog rows, one chunk of recipients per transaction. Each
+chunk advances a checkpoint on the broadcast, so an interrupted fan-out
+resumes where it stopped without duplicating recipients. Delivery,
+throttling and retries are handled by the outbox sender.
+"""
+
+from datetime import datetime
+from flask import current_app, render_template
+from markupsafe import escape
+from sqlalchemy import func, insert, update
+from app import db
+from app.models import User, EmailLog, EmailBroadcast
+from app.utils.outbox import notify_sender
+
+# Substituted per recipient after the single template render
+NAME_PLACEHOLDER = '%%RECIPIENT_NAME%%'
+
+RECIPIENT_FILTERS = {
+    'all': [],
+    'active': [User.status == 'Active'],
+    'vip': [User.role == 'VIP'],
+    'regular': [User.role == 'Regular'],
+}
+
+def create_broadcast(subject, message, recipient_type, created_by=None):
+    """Render a broadcast once, record it, and start queueing its recipients"""
+    criteria = RECIPIENT_FILTERS[recipient_type]
+
+    broadcast = EmailBroadcast(
+        subject=subject,
+        message=message,
+        recipient_type=recipient_type,
+        created_by=created_by,
+        total_recipients=db.session.query(func.count(User.id)).filter(*criteria).scalar(),
+        html_body=render_template('email/broadcast.html', subject=subject,
+                                  message=message, name=NAME_PLACEHOLDER),
+        text_body=render_template('email/broadcast.txt', subject=subject,
+                                  message=message, name=NAME_PLACEHOLDER)
+    )
+    db.session.add(broadcast)
+    db.session.commit()
+
+    queue_broadcast(broadcast)
+    return broadcast
+
+def queue_broadcast(broadcast):
+    """Insert outbox rows for the remaining recipients, one chunk per transaction
+
+    Returns the number of rows queued by this call. Safe to call concurrently
+    or repeatedly: a chunk is only kept if the checkpoint it started from is
+    still current when it commits.
+    """
+    chunk_size = current_app.config.get('EMAIL_BROADCAST_CHUNK_SIZE', 500)
+    criteria = RECIPIENT_FILTERS[broadcast.recipient_type]
+    broadcast_id = broadcast.id
+    subject = broadcast.subject
+    sender = current_app.config['MAIL_DEFAULT_SENDER']
+    html_template, text_template = broadcast.html_body, broadcast.text_body
+    last_user_id = broadcast.last_user_id
+    queued = 0
+
+    while True:
+        recipients = db.session.query(User.id, User.email, User.name) \
+            .filter(User.id > last_user_id, *criteria) \
+            .order_by(User.id) \
+            .limit(chunk_size) \
+            .all()
+
+        if not recipients:
+            db.session.execute(
+                update(EmailBroadcast)
+                .where(EmailBroadcast.id == broadcast_id, EmailBroadcast.status == 'Queueing')
+                .values(status='Queued', queued_at=datetime.utcnow())
+            )
+            db.session.commit()
+            break
+
+        now = datetime.utcnow()
+        db.session.execute(insert(EmailLog), [
+            {
+                'recipient_email': email,
+                'subject': subject,
+                'template_name': 'broadcast',
+                'status': 'Pending',
+                'sender': sender,
+                'html_body': html_template.replace(NAME_PLACEHOLDER, str(escape(name))),
+                'text_body': text_template.replace(NAME_PLACEHOLDER, name),
+                'priority': 1,
+                'broadcast_id': broadcast_id,
+                'next_attempt_at': now,
+                'created_at': now,
+                'attempts': 0
+            } for _, email, name in recipients
+        ])
+
+        # Advance the checkpoint only if nobody else has queued this chunk
+        result = db.session.execute(
+            update(EmailBroadcast)
+            .where(EmailBroadcast.id == broadcast_id,
+                   EmailBroadcast.last_user_id == last_user_id)
+            .values(last_user_id=recipients[-1].id,
+                    queued_count=EmailBroadcast.queued_count + len(recipients))
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            break
+        db.session.commit()
+
+        last_user_id = recipients[-1].id
+        queued += len(recipients)
+        notify_sender()
+
+    return queued
+
+def resume_broadcasts():
+    """Finish queueing broadcasts interrupted by a crash or restart"""
+    resumed = 0
+    for broadcast in EmailBroadcast.query.filter_by(status='Queueing').order_by(EmailBroadcast.id).all():
+        resumed += queue_broadcast(broadcast)
+    return resumed
+
+def broadcast_progress(broadcast, counts=None):
+    """Queueing and delivery counts for a broadcast"""
+    if counts is None:
+        counts = dict(db.session.query(EmailLog.status, func.count(EmailLog.id))
+                      .filter(EmailLog.broadcast_id == broadcast.id)
+                      .group_by(EmailLog.status)
+                      .all())
+    return {
+        'id': broadcast.id,
+        'subject': broadcast.subject,
+        'status': broadcast.status,
+        'total_recipients': broadcast.total_recipients,
+        'queued': broadcast.queued_count,
+        'pending': counts.get('Pending', 0) + counts.get('Sending', 0),
+        'sent': counts.get('Sent', 0),
+        'failed': counts.get('Failed', 0)
+    }
+
+def broadcasts_progress(broadcasts):
+    """broadcast_progress for several broadcasts with one grouped query"""
+    counts = {broadcast.id: {} for broadcast in broadcasts}
+    if counts:
+        rows = db.session.query(EmailLog.broadcast_id, EmailLog.status, func.count(EmailLog.id)) \
+            .filter(EmailLog.broadcast_id.in_(list(counts))) \
+            .group_by(EmailLog.broadcast_id, EmailLog.status) \
+            .all()
+        for broadcast_id, status, count in rows:
+            counts[broadcast_id][status] = count
+    return [broadcast_progress(broadcast, counts[broadcast.id]) for broadcast in broadcasts]
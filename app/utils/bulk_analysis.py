@@ -0,0 +1,330 @@
+"""
+Bulk Analysis Runner
+
+Re-runs or backfills analyses for many submissions concurrently. Perplexity
+calls go through an async HTTP client, capped by a fixed pool of worker
+tasks and paced by a token bucket that adapts to the API's rate-limit
+headers. Results are written as each call finishes, and a checkpoint file
+records finished submissions so an interrupted run can be resumed.
+
+Each submission is claimed (its status moved to Processing) before it is
+analyzed, like the analyze page and the batch thread pool do, so no
+submission is analyzed by two of them at once; one that another path is
+already analyzing is counted as busy and left alone.
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.models import TechnologySubmission
+from app.utils.ai_analysis import (PerplexityAnalyzer, is_priority_submission, plan_reanalysis,
+                                   new_metrics, usage_from_response, elapsed_ms)
+from app.utils.analysis_metrics import record_analysis_run
+from app.utils.analysis_queue import claim_submission
+from app.utils.db_engine import end_read_transaction
+from app.utils.similarity import rank_prior_art
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+class AsyncTokenBucket:
+    """Token bucket for pacing requests, adjustable from rate-limit headers"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate  # tokens per second
+        self.base_rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if self.paused_until > now:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for the given number of seconds"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    def observe(self, headers, status_code):
+        """Adapt to the server's view of our remaining request budget"""
+        retry_after = _seconds(headers.get('retry-after'))
+        if status_code == 429:
+            self.pause(retry_after if retry_after is not None else 5.0)
+            return
+
+        remaining = headers.get('x-ratelimit-remaining-requests') or headers.get('x-ratelimit-remaining')
+        reset = headers.get('x-ratelimit-reset-requests') or headers.get('x-ratelimit-reset')
+        if remaining is not None and reset is not None:
+            try:
+                remaining = int(float(remaining))
+            except ValueError:
+                return
+            reset_seconds = _seconds(reset)
+            if reset_seconds is None:
+                return
+            if remaining <= 0:
+                self.pause(reset_seconds)
+            elif reset_seconds > 0:
+                # Never go faster than what is left of the current window allows
+                self.rate = min(self.base_rate, remaining / reset_seconds)
+
+def _seconds(value):
+    """Parse '12', '1.5', '850ms' or '1m30s' style durations into seconds"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total, number = 0.0, ''
+    units = {'h': 3600, 'm': 60, 's': 1}
+    i = 0
+    while i < len(value):
+        char = value[i]
+        if char.isdigit() or char == '.':
+            number += char
+        elif value.startswith('ms', i):
+            total += float(number or 0) / 1000
+            number = ''
+            i += 1
+        elif char in units:
+            total += float(number or 0) * units[char]
+            number = ''
+        else:
+            return None
+        i += 1
+    return total
+
+class Checkpoint:
+    """JSON file listing finished submission ids, rewritten atomically"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.failed = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.done = set(state.get('done', []))
+            self.failed = {int(k): v for k, v in state.get('failed', {}).items()}
+
+    def mark_done(self, submission_id):
+        self.done.add(submission_id)
+        self.failed.pop(submission_id, None)
+
+    def mark_failed(self, submission_id, error):
+        self.failed[submission_id] = error
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'done': sorted(self.done), 'failed': self.failed,
+                       'saved_at': datetime.utcnow().isoformat()}, f)
+        os.replace(tmp_path, self.path)
+
+def select_submissions(status=None, since=None, until=None, user_id=None, ids=None):
+    """Ids of submissions matching the filters, oldest first"""
+    query = db.session.query(TechnologySubmission.id)
+    if ids:
+        query = query.filter(TechnologySubmission.id.in_(ids))
+    if status:
+        query = query.filter(TechnologySubmission.analysis_status == status)
+    if since:
+        query = query.filter(TechnologySubmission.submitted_at >= since)
+    if until:
+        query = query.filter(TechnologySubmission.submitted_at < until)
+    if user_id:
+        query = query.filter(TechnologySubmission.user_id == user_id)
+    return [row.id for row in query.order_by(TechnologySubmission.submitted_at, TechnologySubmission.id)]
+
+def run_bulk_analysis(submission_ids, concurrency=4, rate=1.0, checkpoint_path=None,
+                      max_retries=3, progress=None):
+    """Analyze submissions concurrently; returns {'completed', 'failed', 'skipped', 'busy'}
+
+    Must be called inside an application context. The event loop runs in
+    the calling thread, so database writes use the normal session.
+    """
+    checkpoint = Checkpoint(checkpoint_path)
+    todo = [sid for sid in submission_ids if sid not in checkpoint.done]
+    stats = {'completed': 0, 'failed': 0, 'skipped': len(submission_ids) - len(todo), 'busy': 0}
+    if not todo:
+        return stats
+
+    runner = _Runner(checkpoint, stats, concurrency, rate, max_retries, progress)
+    asyncio.run(runner.run(todo))
+    return stats
+
+class _Runner:
+
+    def __init__(self, checkpoint, stats, concurrency, rate, max_retries, progress):
+        self.checkpoint = checkpoint
+        self.stats = stats
+        self.concurrency = concurrency
+        self.bucket = AsyncTokenBucket(rate, capacity=concurrency)
+        self.max_retries = max_retries
+        self.progress = progress
+        self.claimed = {}  # submission id -> status it was claimed from
+        self.analyzer = PerplexityAnalyzer()
+        self.simulate = not (self.analyzer.api_key and self.analyzer.api_url)
+        self.timeout = self.analyzer.timeout
+        self.governor = None
+        if not self.simulate and current_app.config.get('PERPLEXITY_GOVERNOR_ENABLED', True):
+            from app.utils.governor import PerplexityGovernor
+            self.governor = PerplexityGovernor()
+
+    async def run(self, submission_ids):
+        import httpx
+
+        queue = asyncio.Queue()
+        for submission_id in submission_ids:
+            queue.put_nowait(submission_id)
+
+        limits = httpx.Limits(max_connections=self.concurrency,
+                              max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits) as client:
+            workers = [asyncio.create_task(self._worker(client, queue))
+                       for _ in range(min(self.concurrency, len(submission_ids)))]
+            await queue.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        self.checkpoint.save()
+
+    async def _worker(self, client, queue):
+        while True:
+            submission_id = await queue.get()
+            try:
+                await self._process(client, submission_id)
+            except Exception as e:
+                current_app.logger.error(f"Bulk analysis of submission {submission_id} failed: {str(e)}")
+                self._record_failure(submission_id, str(e))
+            finally:
+                queue.task_done()
+
+    async def _process(self, client, submission_id):
+        submission = db.session.get(TechnologySubmission, submission_id)
+        if submission is None:
+            return
+
+        previous_status = submission.analysis_status
+        if previous_status == 'Processing' or not claim_submission(submission_id, previous_status):
+            # Being analyzed by the analyze page, the batch pool or another runner
+            self.stats['busy'] += 1
+            self._after_item(submission_id, 'busy')
+            return
+        self.claimed[submission_id] = previous_status
+
+        metrics = new_metrics()
+        started = time.perf_counter()
+        try:
+            plan = plan_reanalysis(submission)
+            metrics['mode'] = plan.mode
+            if plan.mode == 'reused':
+                metrics['source'] = 'cached'
+                results = plan.merge(None)
+            elif self.simulate:
+                results = plan.merge(self.analyzer._simulate_analysis(submission))
+            else:
+                metrics['source'] = 'live'
+                headers, payload = self.analyzer.build_request(submission, plan)
+                user_id, priority = submission.user_id, is_priority_submission(submission)
+                # Writes are committed before every await; don't hold the read transaction
+                # idle while other tasks run and we wait
+                end_read_transaction(db.session)
+                lease = None
+                if self.governor is not None:
+                    # The governor blocks on the database, so wait for it off the event loop
+                    lease = await asyncio.to_thread(self.governor.acquire, user_id, priority)
+                    metrics['queued_ms'] = int(lease.wait_seconds * 1000)
+                try:
+                    results = plan.merge(await self._call(client, headers, payload, metrics))
+                finally:
+                    if lease is not None:
+                        await asyncio.to_thread(self.governor.release, lease)
+        except Exception as e:
+            current_app.logger.error(f"Bulk analysis of submission {submission_id} failed: {str(e)}")
+            metrics['error'] = str(e)[:500]
+            metrics['total_ms'] = elapsed_ms(started)
+            self._record_failure(submission_id, str(e), metrics)
+            return
+        metrics['total_ms'] = elapsed_ms(started)
+
+        # Write each result as soon as it arrives
+        submission.set_results(rank_prior_art(submission, results))
+        submission.analysis_status = 'Completed'
+        submission.analyzed_at = datetime.utcnow()
+        record_analysis_run(submission_id, metrics)
+        db.session.commit()
+        self.claimed.pop(submission_id, None)
+
+        self.checkpoint.mark_done(submission_id)
+        self.stats['completed'] += 1
+        self._after_item(submission_id, 'completed')
+
+    async def _call(self, client, headers, payload, metrics):
+        metrics['upstream_ms'] = 0
+        for attempt in range(self.max_retries + 1):
+            metrics['retries'] = attempt
+            await self.bucket.acquire()
+            sent = time.perf_counter()
+            try:
+                response = await client.post(self.analyzer.api_url, headers=headers, json=payload)
+            except Exception:
+                metrics['upstream_ms'] += elapsed_ms(sent)
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+                continue
+            metrics['upstream_ms'] += elapsed_ms(sent)
+
+            self.bucket.observe(response.headers, response.status_code)
+            if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                if response.status_code != 429:
+                    await asyncio.sleep(2 ** attempt)
+                continue
+
+            response.raise_for_status()
+            result = response.json()
+            metrics.update(usage_from_response(result))
+            return PerplexityAnalyzer.parse_response(result)
+
+    def _record_failure(self, submission_id, error, metrics=None):
+        db.session.rollback()
+        submission = db.session.get(TechnologySubmission, submission_id)
+        previous_status = self.claimed.pop(submission_id, None)
+        # Release our claim; a failed re-run keeps its earlier results
+        if submission is not None and previous_status is not None \
+                and submission.analysis_status == 'Processing':
+            submission.analysis_status = 'Completed' if previous_status == 'Completed' else 'Failed'
+        if submission is not None and metrics is not None:
+            record_analysis_run(submission_id, metrics, succeeded=False)
+        db.session.commit()
+        self.checkpoint.mark_failed(submission_id, error[:500])
+        self.stats['failed'] += 1
+        self._after_item(submission_id, 'failed')
+
+    def _after_item(self, submission_id, outcome):
+        finished = self.stats['completed'] + self.stats['failed']
+        if finished % 10 == 0:
+            self.checkpoint.save()
+        if self.progress:
+            self.progress(submission_id, outcome, self.stats)
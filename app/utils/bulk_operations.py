@@ -0,0 +1,130 @@
+"""
+Bulk Admin Operations
+
+Set-based versions of the per-user admin actions. Each operation issues one
+UPDATE for the affected users, bulk-inserts its CreditHistory/AuditLog rows
+and queues any notifications as a single outbox batch.
+"""
+
+import json
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert, update
+from app import db
+from app.models import User, CreditHistory, AuditLog, UNLIMITED_ROLES, invalidate_user_cache
+from app.utils.email import queue_templated_emails
+from app.utils.fragments import invalidate_user_fragments
+
+class BulkOperationError(ValueError):
+    """A bulk operation that was refused as a whole"""
+
+def approve_users(user_ids, actor, ip_address=None, user_agent=None):
+    """Activate every Pending user in user_ids; returns the approved users"""
+    users = User.query.filter(User.id.in_(user_ids), User.status == 'Pending').all()
+    if not users:
+        return []
+    ids = [user.id for user in users]
+
+    db.session.execute(
+        update(User)
+        .where(User.id.in_(ids), User.status == 'Pending')
+        .values(status='Active', updated_at=datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    )
+    _insert_audit_logs('user_approved', actor, ip_address, user_agent,
+                       [(user.id, {'approved_user_email': user.email}) for user in users])
+    db.session.commit()
+    invalidate_user_cache(*ids)
+    invalidate_user_fragments(*ids)
+
+    # The commit expired the users; reload them in one query instead of one each while rendering
+    users = User.query.filter(User.id.in_(ids)).all()
+
+    # Queue notifications in one outbox batch
+    queue_templated_emails(
+        'MMSU Prior Art Search - Account Approved', 'user_approved', users,
+        app_url=current_app.config.get('APP_URL', 'https://your-app.com')
+    )
+    return users
+
+def grant_credits(user_ids, amount, reason, actor, ip_address=None, user_agent=None):
+    """Add credits to every limited-credit user in user_ids; returns the count"""
+    criteria = [User.id.in_(user_ids), User.role.notin_(UNLIMITED_ROLES)]
+
+    db.session.execute(
+        update(User)
+        .where(*criteria)
+        .values(credits=User.credits + amount, updated_at=datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    )
+    balances = db.session.query(User.id, User.credits).filter(*criteria).all()
+    if not balances:
+        db.session.rollback()
+        return 0
+
+    now = datetime.utcnow()
+    db.session.execute(insert(CreditHistory), [
+        {
+            'user_id': user_id,
+            'transaction_type': 'grant',
+            'amount': amount,
+            'balance_after': credits,
+            'description': reason[:200],
+            'created_at': now
+        } for user_id, credits in balances
+    ])
+    _insert_audit_logs('credits_granted', actor, ip_address, user_agent,
+                       [(user_id, {'amount': amount, 'reason': reason, 'balance_after': credits})
+                        for user_id, credits in balances])
+    db.session.commit()
+    invalidate_user_cache(*[user_id for user_id, _ in balances])
+    invalidate_user_fragments(*[user_id for user_id, _ in balances])
+    return len(balances)
+
+def change_role(user_ids, role, actor, ip_address=None, user_agent=None):
+    """Set role on every user in user_ids except the actor; returns the count changed
+
+    Raises BulkOperationError instead of leaving no active Admin.
+    """
+    changed = db.session.query(User.id, User.role) \
+        .filter(User.id.in_(user_ids), User.id != actor.id, User.role != role).all()
+    if not changed:
+        return 0
+    ids = [user_id for user_id, _ in changed]
+
+    if role != 'Admin':
+        # Lock the admin rows so two concurrent demotions cannot both pass this check
+        admins = {user_id for user_id, in db.session.query(User.id)
+                  .filter(User.role == 'Admin', User.status == 'Active').with_for_update()}
+        if admins and not admins - set(ids):
+            db.session.rollback()
+            raise BulkOperationError('This change would leave no active Admin.')
+
+    db.session.execute(
+        update(User)
+        .where(User.id.in_(ids))
+        .values(role=role, updated_at=datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    )
+    _insert_audit_logs('role_changed', actor, ip_address, user_agent,
+                       [(user_id, {'from': old_role, 'to': role}) for user_id, old_role in changed])
+    db.session.commit()
+    invalidate_user_cache(*ids)
+    invalidate_user_fragments(*ids)
+    return len(ids)
+
+def _insert_audit_logs(action, actor, ip_address, user_agent, entries):
+    """Bulk-insert one AuditLog row per (user_id, details) entry"""
+    now = datetime.utcnow()
+    db.session.execute(insert(AuditLog), [
+        {
+            'user_id': actor.id,
+            'action': action,
+            'resource_type': 'user',
+            'resource_id': user_id,
+            'details': json.dumps(details),
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'created_at': now
+        } for user_id, details in entries
+    ])
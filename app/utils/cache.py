@@ -0,0 +1,211 @@
+"""
+In-Process Caching Utility
+"""
+
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from time import monotonic, time_ns
+from flask import current_app, has_app_context
+
+class TTLCache:
+    """Thread-safe, size-bounded cache whose entries expire after a TTL"""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        """Return a live entry for key, or default on a miss"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Store value under key for ttl seconds (a ttl of 0 disables caching)"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *keys):
+        """Drop the given keys from the cache"""
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        """Return hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+class HostInvalidatedCache:
+    """TTLCache whose invalidations reach every process on the host
+
+    Each key has a stamp file in a shared directory; invalidating a key
+    touches it, and an entry cached under an older stamp counts as a miss.
+    Read stamp() before loading a value and pass it to set(), so an
+    invalidation that races with the load is not lost. Processes on other
+    hosts only see a change once their entry's TTL runs out.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, directory=None):
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'mmsu-cache-stamps')
+        self.stale = 0
+
+    def init_app(self, app, name):
+        """Use the app's CACHE_STAMP_DIR for this cache's stamps"""
+        base = app.config.get('CACHE_STAMP_DIR') or os.path.join(tempfile.gettempdir(), 'mmsu-cache-stamps')
+        self.directory = os.path.join(base, name)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, str(key))
+
+    def stamp(self, key):
+        """Current stamp of key; 0 until it is first invalidated"""
+        try:
+            return os.stat(self._path(key)).st_mtime_ns
+        except OSError:
+            return 0
+
+    def get(self, key, stamp, default=None):
+        """Return the entry for key if it was cached under stamp"""
+        entry = self.local.get(key)
+        if entry is None:
+            return default
+        if entry[0] != stamp:
+            self.stale += 1
+            return default
+        return entry[1]
+
+    def set(self, key, value, stamp, ttl=None):
+        self.local.set(key, (stamp, value), ttl=ttl)
+
+    def invalidate(self, *keys):
+        """Drop keys here and, through their stamps, in every other process"""
+        self.local.invalidate(*keys)
+        os.makedirs(self.directory, exist_ok=True)
+        now = time_ns()
+        for key in keys:
+            path = self._path(key)
+            with open(path, 'a'):
+                pass
+            os.utime(path, ns=(now, now))
+
+    def stats(self):
+        stats = self.local.stats()
+        stats['hits'] -= self.stale
+        stats['misses'] += self.stale
+        stats['stale'] = self.stale
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+class StaleWhileRevalidateCache:
+    """Cache that keeps serving an expired value while one thread reloads it"""
+
+    def __init__(self):
+        self._data = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key, loader, ttl, stale_ttl=0):
+        """Return the value for key, calling loader() to (re)compute it
+
+        Fresh entries (younger than ttl) are returned as-is. Entries within the
+        following stale_ttl seconds are returned immediately while loader runs
+        in a background thread. Anything older is recomputed synchronously.
+        """
+        now = monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, loaded_at = entry
+                age = now - loaded_at
+                if age < ttl:
+                    self.hits += 1
+                    return value
+                if age < ttl + stale_ttl:
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        app = current_app._get_current_object() if has_app_context() else None
+                        threading.Thread(target=self._refresh, args=(key, loader, app),
+                                         daemon=True).start()
+                    return value
+            self.misses += 1
+
+        value = loader()
+        with self._lock:
+            self._data[key] = (value, monotonic())
+        return value
+
+    def _refresh(self, key, loader, app=None):
+        try:
+            value = loader()
+            with self._lock:
+                self._data[key] = (value, monotonic())
+        except Exception:
+            # Keep serving the stale value; the next synchronous miss will retry
+            if app is not None:
+                with app.app_context():
+                    current_app.logger.exception(f'Background refresh of cache entry {key!r} failed')
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def invalidate(self, *keys):
+        """Drop the given keys from the cache"""
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def stats(self):
+        """Return hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'size': len(self._data),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,184 @@
+"""
+Database Engine Profiles
+
+Builds SQLALCHEMY_ENGINE_OPTIONS from the DB_* settings of the active
+configuration, so each environment gets its own pool sizing and timeouts
+instead of SQLAlchemy's defaults:
+
+- PostgreSQL: a pool of DB_POOL_SIZE (+ DB_MAX_OVERFLOW) connections,
+  recycled after DB_POOL_RECYCLE seconds and pinged before use, so a
+  connection the server or Render's proxy closed while idle is replaced
+  instead of failing the request. Every statement is cancelled after
+  DB_STATEMENT_TIMEOUT_MS, and a session left idle inside a transaction is
+  closed after DB_IDLE_IN_TRANSACTION_TIMEOUT_MS (0 disables either).
+  Analyses end their read transaction with end_read_transaction() before
+  queueing for and waiting on Perplexity, which takes far longer than that
+  timeout.
+- PgBouncer in transaction pooling mode (DB_PGBOUNCER): PgBouncer rejects
+  startup options and hands each transaction to a different server
+  connection, so the timeouts are set with SET LOCAL at the start of every
+  transaction and the app keeps no pool of its own (NullPool).
+- SQLite files: WAL journal, synchronous=NORMAL and a busy timeout, so the
+  dev server's threads and background analyses do not lock each other
+  out. In-memory test databases keep Flask-SQLAlchemy's StaticPool.
+
+With METRICS_ENABLED, time spent waiting for a pooled connection is
+exported as the db_pool_checkout_wait_seconds histogram (see
+app.utils.metrics, which is only imported then).
+
+Long maintenance statements (migrations, big index builds) can be run with
+DB_STATEMENT_TIMEOUT_MS=0.
+"""
+
+import time
+import weakref
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool, QueuePool
+
+# Engines whose timeouts are applied per transaction (PgBouncer mode)
+_set_local_engines = weakref.WeakKeyDictionary()
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited"""
+
+    def _do_get(self):
+        from app.utils.metrics import observe_pool_checkout
+
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            observe_pool_checkout(time.perf_counter() - started, timed_out)
+
+class PendingChangesError(RuntimeError):
+    """Raised by end_read_transaction() when the transaction has writes"""
+
+def end_read_transaction(session):
+    """Roll back a transaction that has only read, before a long wait outside the database
+
+    The connection goes back to the pool instead of idling in transaction;
+    loaded objects are expired and reload on next access. A transaction with
+    changes, flushed or not, is refused: its owner must commit or discard it.
+    """
+    if session.new or session.dirty or session.deleted or session.info.get('flushed_writes'):
+        raise PendingChangesError('Uncommitted changes in a transaction that was expected to only read')
+    session.rollback()
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database, explicit settings winning"""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    backend = url.get_backend_name()
+    pool_class = TimedQueuePool if config.get('METRICS_ENABLED') else QueuePool
+    options = {}
+
+    if backend in ('postgresql', 'postgres'):
+        connect_args = {
+            'connect_timeout': config.get('DB_CONNECT_TIMEOUT', 10),
+            'application_name': config.get('DB_APPLICATION_NAME', 'mmsu-prior-art'),
+            # TCP keepalives notice a dead server or proxy while a connection sits idle
+            'keepalives': 1,
+            'keepalives_idle': 60,
+            'keepalives_interval': 10,
+            'keepalives_count': 3,
+        }
+        if config.get('DB_PGBOUNCER'):
+            options['poolclass'] = NullPool
+        else:
+            timeouts = _timeout_settings(config)
+            if timeouts:
+                connect_args['options'] = ' '.join(f'-c {name}={value}' for name, value in timeouts)
+            options.update(
+                poolclass=pool_class,
+                pool_size=config.get('DB_POOL_SIZE', 5),
+                max_overflow=config.get('DB_MAX_OVERFLOW', 5),
+                pool_timeout=config.get('DB_POOL_TIMEOUT', 10),
+                pool_recycle=config.get('DB_POOL_RECYCLE', 1800),
+                pool_pre_ping=config.get('DB_POOL_PRE_PING', True),
+                pool_use_lifo=True,  # surplus connections stay idle long enough to be recycled
+            )
+        options['connect_args'] = connect_args
+
+    elif backend == 'sqlite' and url.database not in (None, '', ':memory:'):
+        options.update(
+            poolclass=pool_class,
+            pool_size=config.get('DB_POOL_SIZE', 5),
+            max_overflow=config.get('DB_MAX_OVERFLOW', 5),
+            pool_timeout=config.get('DB_POOL_TIMEOUT', 10),
+        )
+
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+def init_app(app, db):
+    """Attach per-connection settings to the app's engines (after db.init_app)"""
+    with app.app_context():
+        for engine in db.engines.values():
+            backend = engine.dialect.name
+            if backend == 'sqlite':
+                event.listen(engine, 'connect', _sqlite_pragmas(app.config))
+            elif backend == 'postgresql' and app.config.get('DB_PGBOUNCER'):
+                timeouts = _timeout_settings(app.config)
+                if timeouts:
+                    _set_local_engines[engine] = timeouts
+            if app.config.get('METRICS_ENABLED'):
+                _track_pool_usage(engine.pool)
+
+def _timeout_settings(config):
+    settings = []
+    if config.get('DB_STATEMENT_TIMEOUT_MS'):
+        settings.append(('statement_timeout', int(config['DB_STATEMENT_TIMEOUT_MS'])))
+    if config.get('DB_IDLE_IN_TRANSACTION_TIMEOUT_MS'):
+        settings.append(('idle_in_transaction_session_timeout',
+                         int(config['DB_IDLE_IN_TRANSACTION_TIMEOUT_MS'])))
+    return settings
+
+def _sqlite_pragmas(config):
+    pragmas = [f"busy_timeout = {int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+               'temp_store = MEMORY',
+               f"cache_size = -{int(config.get('SQLITE_CACHE_KB', 16384))}"]
+    if config.get('SQLITE_WAL', True):
+        # WAL lets readers run alongside the writer; NORMAL is durable in WAL mode except on power loss
+        pragmas += ['journal_mode = WAL', 'synchronous = NORMAL']
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(f'PRAGMA {pragma}')
+        finally:
+            cursor.close()
+    return set_pragmas
+
+def _track_pool_usage(pool):
+    from app.utils.metrics import DB_POOL_IN_USE
+
+    def checked_out(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_IN_USE.inc()
+
+    def checked_in(dbapi_connection, connection_record):
+        DB_POOL_IN_USE.dec()
+
+    event.listen(pool, 'checkout', checked_out)
+    event.listen(pool, 'checkin', checked_in)
+
+@event.listens_for(Session, 'after_begin')
+def _set_local_timeouts(session, transaction, connection):
+    timeouts = _set_local_engines.get(connection.engine)
+    if timeouts:
+        for name, value in timeouts:
+            connection.exec_driver_sql(f'SET LOCAL {name} = {value}')
+
+@event.listens_for(Session, 'after_flush')
+def _note_flushed_writes(session, flush_context):
+    session.info['flushed_writes'] = True
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _forget_flushed_writes(session):
+    session.info.pop('flushed_writes', None)
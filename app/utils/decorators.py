@@ -2,6 +2,7 @@
 Custom Decorators for MMSU Prior Art Search Tool
 """
 
+import hmac
 from functools import wraps
 from flask import abort, request, current_app
 from flask_login import current_user
@@ -46,3 +47,22 @@ def api_key_required(f):
         return f(*args, **kwargs)
 
     return decorated_function
+
+def metrics_access_required(f):
+    """Decorator to require admin role or the METRICS_TOKEN bearer token"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = current_app.config.get('METRICS_TOKEN')
+        authorization = request.headers.get('Authorization', '')
+        if token and hmac.compare_digest(authorization, f'Bearer {token}'):
+            return f(*args, **kwargs)
+
+        if not current_user.is_authenticated:
+            abort(401)
+
+        if not current_user.is_admin():
+            abort(403)
+
+        return f(*args, **kwargs)
+
+    return decorated_function
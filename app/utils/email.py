@@ -4,43 +4,88 @@ Email Utility for MMSU Prior Art Search Tool
 
 from datetime import datetime
 from flask import current_app, render_template, url_for
-from flask_mail import Message
-from app import mail, db
+from app import db
 from app.models import EmailLog
+from app.utils.outbox import notify_sender
 
 def send_email(subject, recipients, template, **kwargs):
-    """Send email with template"""
+    """Queue a templated email for every recipient in the outbox
+
+    The message is rendered once and stored as one Pending EmailLog row per
+    recipient; delivery happens in the background outbox sender. The rows
+    are committed together with the caller's pending changes; if queueing
+    fails, those changes are left in the session for the caller.
+    """
     try:
         # Render email templates
         html_body = render_template(f'email/{template}.html', **kwargs)
         text_body = render_template(f'email/{template}.txt', **kwargs)
 
-        # Create message
-        msg = Message(
-            subject=subject,
-            recipients=recipients,
-            html=html_body,
-            body=text_body,
-            sender=current_app.config['MAIL_DEFAULT_SENDER']
-        )
+        enqueue_email(subject, recipients, template, html_body, text_body)
+        return True
 
-        # Send email
-        mail.send(msg)
+    except Exception as e:
+        current_app.logger.error(f"Email queueing failed: {str(e)}")
+        _recover_session()
+        return False
 
-        # Log successful send
-        for recipient in recipients:
-            log_email_sent(recipient, subject, template, 'Sent')
+def enqueue_email(subject, recipients, template, html_body, text_body, sender=None):
+    """Insert Pending outbox rows for pre-rendered bodies and wake the sender"""
+    now = datetime.utcnow()
+    # A savepoint, so a failed insert does not discard the caller's uncommitted work
+    with db.session.begin_nested():
+        db.session.add_all([
+            EmailLog(
+                recipient_email=recipient,
+                subject=subject,
+                template_name=template,
+                status='Pending',
+                sender=sender or current_app.config['MAIL_DEFAULT_SENDER'],
+                html_body=html_body,
+                text_body=text_body,
+                next_attempt_at=now
+            ) for recipient in recipients
+        ])
+    db.session.commit()
+    notify_sender()
 
+def queue_templated_emails(subject, template, users, **kwargs):
+    """Render a per-user template for each user and queue them in one commit"""
+    try:
+        sender = current_app.config['MAIL_DEFAULT_SENDER']
+        now = datetime.utcnow()
+        logs = [
+            EmailLog(
+                recipient_email=user.email,
+                subject=subject,
+                template_name=template,
+                status='Pending',
+                sender=sender,
+                html_body=render_template(f'email/{template}.html', user=user, **kwargs),
+                text_body=render_template(f'email/{template}.txt', user=user, **kwargs),
+                next_attempt_at=now
+            ) for user in users
+        ]
+        with db.session.begin_nested():
+            db.session.add_all(logs)
+        db.session.commit()
+        notify_sender()
         return True
 
     except Exception as e:
-        current_app.logger.error(f"Email sending failed: {str(e)}")
+        current_app.logger.error(f"Email queueing failed: {str(e)}")
+        _recover_session()
+        return False
 
-        # Log failed send
-        for recipient in recipients:
-            log_email_failed(recipient, subject, template, str(e))
+def _recover_session():
+    """Make the session usable again after a failed enqueue
 
-        return False
+    A failure inside the savepoint has already been rolled back to it. Only
+    a failed commit leaves the session inactive, and then the caller's
+    changes are lost either way.
+    """
+    if not db.session.is_active:
+        db.session.rollback()
 
 def send_registration_notification(user):
     """Send registration notification to admin"""
@@ -75,27 +120,3 @@ def send_rejection_notification(user):
         template='user_rejected',
         user=user
     )
-
-def log_email_sent(recipient, subject, template, status):
-    """Log email sending attempt"""
-    log = EmailLog(
-        recipient_email=recipient,
-        subject=subject,
-        template_name=template,
-        status=status,
-        sent_at=datetime.utcnow()
-    )
-    db.session.add(log)
-    db.session.commit()
-
-def log_email_failed(recipient, subject, template, error_message):
-    """Log failed email sending"""
-    log = EmailLog(
-        recipient_email=recipient,
-        subject=subject,
-        template_name=template,
-        status='Failed',
-        error_message=error_message
-    )
-    db.session.add(log)
-    db.session.commit()
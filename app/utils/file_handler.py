@@ -3,12 +3,8 @@ File Upload and Processing Utility
 """
 
 import os
-import magic
 from werkzeug.utils import secure_filename
 from flask import current_app
-import docx
-import PyPDF2
-from docx import Document
 
 ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx'}
 
@@ -19,6 +15,8 @@ def allowed_file(filename):
 def validate_file_type(file_path):
     """Validate file type using python-magic"""
     try:
+        import magic
+
         mime = magic.Magic(mime=True)
         file_mime = mime.from_file(file_path)
 
@@ -52,6 +50,8 @@ def extract_text_from_pdf(file_path):
     """Extract text from PDF file"""
     text = ""
     try:
+        import PyPDF2
+
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
 
@@ -68,6 +68,8 @@ def extract_text_from_word(file_path):
     """Extract text from Word document"""
     text = ""
     try:
+        from docx import Document
+
         doc = Document(file_path)
 
         for paragraph in doc.paragraphs:
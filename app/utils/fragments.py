@@ -0,0 +1,234 @@
+"""
+Rendered Fragment Caching Utility
+
+Caches rendered HTML fragments: the report body of a results page, keyed
+by submission id and a hash of its stored results (so a rescored or
+re-analyzed submission gets a new key), and each user's dashboard body for
+a short TTL. Both keys include the build version, so fragments rendered by
+the previous templates are never served after a deploy.
+
+FRAGMENT_CACHE_BACKEND selects an in-process LRU ('lru'), a directory
+shared by all workers ('filesystem') or no caching ('none'). Dashboards are
+invalidated explicitly when a user's submissions or credits change through
+the ORM, and by invalidate_user_fragments() for bulk updates that bypass it.
+With the LRU backend other worker processes would only see an invalidation
+when their copy expires, showing stale credits for up to the dashboard TTL,
+so gunicorn.conf.py selects the filesystem backend whenever it runs more
+than one worker.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import User, TechnologySubmission, CreditHistory
+from app.utils.cache import TTLCache
+from app.utils.http_cache import build_version
+
+class LRUFragmentBackend:
+    """Fragments in this process, least recently used evicted first"""
+
+    def __init__(self, maxsize=512):
+        self.cache = TTLCache(maxsize=maxsize)
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, value, ttl=ttl)
+
+    def delete(self, *keys):
+        self.cache.invalidate(*keys)
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        return {'backend': 'lru', **self.cache.stats()}
+
+class FileSystemFragmentBackend:
+    """Fragments as files in a directory, shared by every worker on the host"""
+
+    def __init__(self, directory, max_entries=5000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.fragment')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if entry['key'] != key or entry['expires_at'] < time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['value']
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        # Write then rename, so readers in other processes never see half a file
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'expires_at': time.time() + ttl, 'value': str(value)}, f)
+        os.replace(temporary, self._path(key))
+        self.writes += 1
+        if self.writes % 100 == 0:
+            self.prune()
+
+    def delete(self, *keys):
+        for key in keys:
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.fragment'):
+                self._unlink(name)
+
+    def prune(self):
+        """Remove expired fragments, then the oldest ones beyond max_entries"""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.fragment'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, encoding='utf-8') as f:
+                    expires_at = json.load(f)['expires_at']
+                modified = os.path.getmtime(path)
+            except (OSError, ValueError, KeyError):
+                continue
+            if expires_at < now:
+                self._unlink(name)
+            else:
+                entries.append((modified, name))
+        for _, name in sorted(entries)[:max(0, len(entries) - self.max_entries)]:
+            self._unlink(name)
+
+    def _unlink(self, name):
+        try:
+            os.unlink(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': 'filesystem',
+            'directory': self.directory,
+            'size': sum(1 for name in os.listdir(self.directory) if name.endswith('.fragment')),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+class NullFragmentBackend:
+    """Caching disabled"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {'backend': 'none'}
+
+class FragmentCache:
+    """Front for the configured backend"""
+
+    def __init__(self):
+        self.backend = LRUFragmentBackend()
+        self.results_ttl = 86400
+        self.dashboard_ttl = 30
+
+    def init_app(self, app):
+        """Pick the backend and TTLs from the app config"""
+        config = app.config
+        backend = config.get('FRAGMENT_CACHE_BACKEND', 'lru')
+        if backend == 'filesystem':
+            self.backend = FileSystemFragmentBackend(
+                config.get('FRAGMENT_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'mmsu-fragments'),
+                max_entries=config.get('FRAGMENT_CACHE_MAXSIZE', 512) * 10)
+        elif backend == 'none':
+            self.backend = NullFragmentBackend()
+        else:
+            self.backend = LRUFragmentBackend(config.get('FRAGMENT_CACHE_MAXSIZE', 512))
+        self.results_ttl = config.get('RESULTS_FRAGMENT_TTL', 86400)
+        self.dashboard_ttl = config.get('DASHBOARD_FRAGMENT_TTL', 30)
+
+    def fragment(self, key, ttl, render):
+        """Cached HTML for key, calling render() on a miss"""
+        html = self.backend.get(key)
+        if html is None:
+            html = str(render())
+            self.backend.set(key, html, ttl)
+        return Markup(html)
+
+    def invalidate(self, *keys):
+        self.backend.delete(*keys)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return self.backend.stats()
+
+fragment_cache = FragmentCache()
+
+def results_fragment_key(submission):
+    """Key of a submission's report body; changes whenever its results or the deploy do"""
+    digest = hashlib.sha1((submission.analysis_results or '').encode()).hexdigest()[:16]
+    return f'results:{build_version()}:{submission.id}:{digest}'
+
+def dashboard_fragment_key(user_id):
+    return f'dashboard:{build_version()}:{user_id}'
+
+def invalidate_user_fragments(*user_ids):
+    """Drop the dashboards of users whose submissions or credits changed"""
+    fragment_cache.invalidate(*[dashboard_fragment_key(user_id) for user_id in user_ids])
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_owners(session, flush_context):
+    owners = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (TechnologySubmission, CreditHistory)):
+            owners.add(obj.user_id)
+        elif isinstance(obj, User):
+            owners.add(obj.id)
+    owners.discard(None)
+    if owners:
+        session.info.setdefault('changed_fragment_owners', set()).update(owners)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_owners(session):
+    owners = session.info.pop('changed_fragment_owners', None)
+    if owners:
+        invalidate_user_fragments(*owners)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_owners(session):
+    session.info.pop('changed_fragment_owners', None)
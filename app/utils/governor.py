@@ -0,0 +1,230 @@
+"""
+Perplexity Call Governor
+
+Caps the number of in-flight Perplexity calls across every worker process.
+Callers register a waiting lease in the database and poll until the
+scheduler grants it. Each grant decision is serialized with a PostgreSQL
+advisory lock, or with a local file lock on SQLite and other single-host
+setups.
+
+Scheduling rules:
+- at most PERPLEXITY_MAX_CONCURRENCY calls are active in total;
+- PERPLEXITY_PRIORITY_RESERVED of those slots are kept for the priority
+  lane (Admin and VIP users);
+- a regular user holds at most PERPLEXITY_PER_USER_CONCURRENCY slots, and
+  waiters are served fewest-active-slots-first, then first-come, so one
+  heavy user cannot starve the others.
+
+A lease that is never released (its worker crashed) expires after
+PERPLEXITY_LEASE_TTL. While a call is in flight, a heartbeat thread keeps
+pushing its lease's expiry back, so a slow call is never mistaken for a
+crashed one and its slot handed out twice.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, insert, select, update, text
+from app import db
+from app.models import ApiCallLease
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+ADVISORY_LOCK_KEY = 0x4D4D5355  # 'MMSU'
+
+_local_lock = threading.Lock()
+
+class GovernorTimeout(RuntimeError):
+    """Raised when no Perplexity call slot became free in time"""
+
+class Lease:
+    """A granted call slot"""
+
+    def __init__(self, token, lane, enqueued_at, acquired_at):
+        self.token = token
+        self.lane = lane
+        self.enqueued_at = enqueued_at
+        self.acquired_at = acquired_at
+        self.stop_heartbeat = None
+
+    @property
+    def wait_seconds(self):
+        return (self.acquired_at - self.enqueued_at).total_seconds()
+
+class PerplexityGovernor:
+    """Cross-process semaphore with priority lanes and per-user fair share"""
+
+    def __init__(self, app=None):
+        app = app or current_app._get_current_object()
+        config = app.config
+        self.engine = db.engine
+        self.logger = app.logger
+        self.max_concurrency = config.get('PERPLEXITY_MAX_CONCURRENCY', 4)
+        self.reserved = min(config.get('PERPLEXITY_PRIORITY_RESERVED', 1), self.max_concurrency - 1)
+        self.per_user = config.get('PERPLEXITY_PER_USER_CONCURRENCY', 1)
+        self.queue_timeout = config.get('PERPLEXITY_QUEUE_TIMEOUT', 300)
+        self.lease_ttl = timedelta(seconds=config.get('PERPLEXITY_LEASE_TTL', 180))
+        self.lock_file = config.get('PERPLEXITY_GOVERNOR_LOCK_FILE') or \
+            os.path.join(tempfile.gettempdir(), 'mmsu_perplexity_governor.lock')
+
+    @contextmanager
+    def slot(self, user_id=None, priority=False):
+        """Hold a call slot for the duration of the with-block"""
+        lease = self.acquire(user_id, priority)
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+    def acquire(self, user_id=None, priority=False):
+        """Block until a slot is granted; raises GovernorTimeout"""
+        token = uuid.uuid4().hex
+        lane = 'priority' if priority else 'regular'
+        table = ApiCallLease.__table__
+        enqueued_at = datetime.utcnow()
+
+        with self.engine.begin() as conn:
+            conn.execute(insert(table).values(
+                token=token, user_id=user_id, lane=lane, state='waiting',
+                enqueued_at=enqueued_at, expires_at=enqueued_at + self.lease_ttl))
+
+        deadline = time.monotonic() + self.queue_timeout
+        delay = 0.05
+        while True:
+            acquired_at = self._try_grant(token)
+            if acquired_at is not None:
+                lease = Lease(token, lane, enqueued_at, acquired_at)
+                self._keep_alive(lease)
+                return lease
+            if time.monotonic() >= deadline:
+                self._delete(token)
+                raise GovernorTimeout(f'No Perplexity call slot within {self.queue_timeout}s')
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def release(self, lease):
+        """Give a slot back"""
+        if lease.stop_heartbeat is not None:
+            lease.stop_heartbeat.set()
+        self._delete(lease.token)
+
+    def extend(self, token):
+        """Push back the expiry of an active lease; False once it is gone"""
+        table = ApiCallLease.__table__
+        with self.engine.begin() as conn:
+            result = conn.execute(update(table)
+                                  .where(table.c.token == token, table.c.state == 'active')
+                                  .values(expires_at=datetime.utcnow() + self.lease_ttl))
+        return result.rowcount == 1
+
+    def status(self):
+        """Active and waiting lease counts per lane"""
+        table = ApiCallLease.__table__
+        now = datetime.utcnow()
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(table.c.lane, table.c.state)
+                                .where(table.c.expires_at > now)).all()
+        counts = {f'{lane}_{state}': 0 for lane in ('priority', 'regular')
+                  for state in ('active', 'waiting')}
+        for lane, state in rows:
+            counts[f'{lane}_{state}'] += 1
+        counts['max_concurrency'] = self.max_concurrency
+        counts['priority_reserved'] = self.reserved
+        return counts
+
+    def _delete(self, token):
+        with self.engine.begin() as conn:
+            conn.execute(delete(ApiCallLease.__table__).where(ApiCallLease.__table__.c.token == token))
+
+    def _try_grant(self, token):
+        table = ApiCallLease.__table__
+        with self._critical_section() as conn:
+            now = datetime.utcnow()
+            # Leases of crashed workers simply expire
+            conn.execute(delete(table).where(table.c.expires_at < now))
+
+            leases = conn.execute(select(
+                table.c.token, table.c.user_id, table.c.lane, table.c.state, table.c.enqueued_at
+            )).all()
+            if not any(lease.token == token for lease in leases):
+                return None
+
+            active = [lease for lease in leases if lease.state == 'active']
+            if len(active) >= self.max_concurrency:
+                self._heartbeat(conn, token, now)
+                return None
+
+            regular_active = sum(1 for lease in active if lease.lane == 'regular')
+            per_user_active = {}
+            for lease in active:
+                per_user_active[lease.user_id] = per_user_active.get(lease.user_id, 0) + 1
+
+            def eligible(lease):
+                if lease.lane == 'priority':
+                    return True
+                if regular_active >= self.max_concurrency - self.reserved:
+                    return False
+                return per_user_active.get(lease.user_id, 0) < self.per_user
+
+            waiting = sorted(
+                (lease for lease in leases if lease.state == 'waiting' and eligible(lease)),
+                key=lambda lease: (lease.lane != 'priority',
+                                   per_user_active.get(lease.user_id, 0),
+                                   lease.enqueued_at)
+            )
+            if not waiting or waiting[0].token != token:
+                self._heartbeat(conn, token, now)
+                return None
+
+            conn.execute(update(table).where(table.c.token == token).values(
+                state='active', acquired_at=now, expires_at=now + self.lease_ttl))
+            return now
+
+    def _heartbeat(self, conn, token, now):
+        # Keep a live waiter from being purged as expired
+        table = ApiCallLease.__table__
+        conn.execute(update(table).where(table.c.token == token)
+                     .values(expires_at=now + self.lease_ttl))
+
+    def _keep_alive(self, lease):
+        # Heartbeat a held lease until release(), well within each TTL
+        stop = threading.Event()
+        interval = self.lease_ttl.total_seconds() / 3
+
+        def beat():
+            while not stop.wait(interval):
+                try:
+                    if not self.extend(lease.token):
+                        return
+                except Exception:
+                    self.logger.exception(f'Could not extend Perplexity call lease {lease.token}')
+
+        lease.stop_heartbeat = stop
+        threading.Thread(target=beat, name='governor-heartbeat', daemon=True).start()
+
+    @contextmanager
+    def _critical_section(self):
+        """Transaction in which only one process at a time makes grant decisions"""
+        if self.engine.dialect.name == 'postgresql':
+            with self.engine.begin() as conn:
+                conn.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': ADVISORY_LOCK_KEY})
+                yield conn
+            return
+
+        with _local_lock, open(self.lock_file, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with self.engine.begin() as conn:
+                    yield conn
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
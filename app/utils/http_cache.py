@@ -0,0 +1,160 @@
+"""
+HTTP Caching Utility
+
+Validators and conditional GETs for responses that rarely change: a
+completed submission's results page and PDF get a strong ETag derived from
+the hash of its stored results and a Last-Modified of its analyzed_at, and
+GET responses of the JSON API get an ETag of their body. A request whose
+If-None-Match or If-Modified-Since still matches is answered with 304 Not
+Modified, before any rendering, PDF generation or credit charge.
+
+Text responses above COMPRESS_MIN_SIZE are compressed with brotli (when
+the Brotli package is installed) or gzip, whichever the client accepts, and
+files under /static requested by their fingerprinted URL (url_for('static')
+adds ?v=<content hash>) are served with far-future, immutable caching.
+"""
+
+import gzip
+import hashlib
+import os
+from datetime import timezone
+from flask import current_app, request, session
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+# Compressed representations carry their coding in the ETag, so a client may send any of these back
+_ETAG_SUFFIXES = ('', '-br', '-gzip')
+
+_static_versions = {}
+
+def init_app(app):
+    """Register the compression and static fingerprint hooks"""
+    if app.config.get('COMPRESS_ENABLED', True):
+        app.after_request(compress_response)
+    if app.config.get('STATIC_FINGERPRINTS', True):
+        app.url_defaults(_fingerprint_static_url)
+        app.after_request(_cache_fingerprinted_static)
+
+def build_version():
+    """Identifies the deployed templates, so a deploy changes every page ETag"""
+    return current_app.config.get('HTTP_CACHE_VERSION') or 'dev'
+
+def make_etag(*parts):
+    return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+def results_etag(submission, representation):
+    """Strong ETag of a submission's results; changes whenever its results do"""
+    digest = hashlib.sha1((submission.analysis_results or '').encode()).hexdigest()
+    return make_etag(representation, submission.id, digest, build_version())
+
+def page_etag(submission, user):
+    """ETag of a results page, which also shows the user's name and credits in the navbar"""
+    return results_etag(submission, 'html') + '.' + make_etag(
+        user.id, user.name, user.role, user.credits)[:12]
+
+def is_fresh(etag, last_modified=None):
+    """Whether the client's cached copy, per If-None-Match or If-Modified-Since, is current"""
+    if request.if_none_match:
+        return any(request.if_none_match.contains_weak(etag + suffix) for suffix in _ETAG_SUFFIXES)
+    if last_modified is not None and request.if_modified_since is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+def not_modified(etag, last_modified=None):
+    """304 response for a conditional GET that still matches, otherwise None"""
+    # A pending flash message must reach the user in a freshly rendered page
+    if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+        return None
+    if not is_fresh(etag, last_modified):
+        return None
+    return set_validators(current_app.response_class(status=304), etag, last_modified)
+
+def set_validators(response, etag, last_modified=None):
+    """Attach the ETag and Last-Modified; private, and revalidated on every use"""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def revalidate_json(response):
+    """after_request hook: ETag GET JSON responses by their body and answer repeats with 304"""
+    if (request.method not in ('GET', 'HEAD') or response.status_code != 200
+            or not response.is_json or response.direct_passthrough):
+        return response
+    etag = hashlib.sha1(response.get_data()).hexdigest()[:32]
+    return not_modified(etag) or set_validators(response, etag)
+
+def _preferred_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def compress_response(response):
+    """after_request hook: brotli or gzip text responses above COMPRESS_MIN_SIZE"""
+    config = current_app.config
+    if (response.mimetype not in config.get('COMPRESS_MIMETYPES', ())
+            or response.direct_passthrough or response.is_streamed
+            or not 200 <= response.status_code < 300 or response.status_code == 204
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if response.content_length is None or response.content_length < config.get('COMPRESS_MIN_SIZE', 1024):
+        return response
+    encoding = _preferred_encoding()
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if encoding == 'br':
+        compressed = brotli.compress(data, quality=config.get('COMPRESS_BROTLI_QUALITY', 5))
+    else:
+        # mtime=0 keeps the output identical for identical input
+        compressed = gzip.compress(data, compresslevel=config.get('COMPRESS_GZIP_LEVEL', 6), mtime=0)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+
+    etag, weak = response.get_etag()
+    if etag:
+        # A strong ETag names exact bytes, so the compressed body needs its own
+        response.set_etag(f'{etag}-{encoding}', weak=weak)
+    return response
+
+def static_version(filename):
+    """Short content hash of a file under the static folder, recomputed when it changes"""
+    path = os.path.join(current_app.static_folder, filename)
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _static_versions.get(path)
+    if cached is None or cached[0] != modified:
+        with open(path, 'rb') as f:
+            cached = (modified, hashlib.sha1(f.read()).hexdigest()[:12])
+        _static_versions[path] = cached
+    return cached[1]
+
+def _fingerprint_static_url(endpoint, values):
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        version = static_version(values['filename'])
+        if version:
+            values['v'] = version
+
+def _cache_fingerprinted_static(response):
+    if request.endpoint == 'static' and request.args.get('v') and response.status_code in (200, 304):
+        # The URL changes with the content, so this URL's content never does
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config.get('STATIC_MAX_AGE', 31536000)
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
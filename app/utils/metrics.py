@@ -0,0 +1,132 @@
+"""
+Request Metrics Utility
+
+Per-endpoint latency histograms, SQL query counts and time (from SQLAlchemy
+cursor events), waits for a pooled database connection and the duration of
+outbound calls to Perplexity, SMTP and WeasyPrint, exposed in Prometheus
+text format at /metrics.
+
+Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+(set by gunicorn.conf.py) and /metrics aggregates all of them. With
+SERVER_TIMING enabled (the default in debug mode) each response also
+carries a Server-Timing header with the same breakdown.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from flask import g, request, has_app_context, current_app, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST,
+                               generate_latest, REGISTRY)
+from app.utils.decorators import metrics_access_required
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint',
+    ['method', 'endpoint', 'status'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL statements executed per request',
+    ['endpoint'], buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250))
+DB_QUERY_SECONDS = Counter(
+    'db_query_seconds', 'Time spent in SQL statements during requests', ['endpoint'])
+EXTERNAL_LATENCY = Histogram(
+    'external_call_duration_seconds', 'Outbound call latency by service',
+    ['service', 'outcome'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+DB_POOL_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds', 'Time to get a pooled database connection, including opening one',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+DB_POOL_TIMEOUTS = Counter(
+    'db_pool_checkout_timeouts', 'Checkouts that gave up after DB_POOL_TIMEOUT')
+DB_POOL_IN_USE = Gauge(
+    'db_pool_connections_in_use', 'Database connections currently checked out',
+    multiprocess_mode='livesum')
+
+def init_app(app):
+    """Register request hooks and the /metrics endpoint"""
+    app.before_request(_start_request)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+@metrics_access_required
+def metrics_view():
+    """Prometheus scrape endpoint (admin session or METRICS_TOKEN bearer)"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+def _start_request():
+    g.metrics = {'started': time.perf_counter(), 'queries': 0, 'query_seconds': 0.0, 'pool_wait': 0.0,
+                 'external': {}}
+
+def _record_request(response):
+    state = g.pop('metrics', None)
+    if state is None:
+        return response
+
+    elapsed = time.perf_counter() - state['started']
+    endpoint = request.endpoint or 'unmatched'  # unmatched keeps 404 paths out of the labels
+    REQUEST_LATENCY.labels(request.method, endpoint, str(response.status_code)).observe(elapsed)
+    REQUEST_QUERIES.labels(endpoint).observe(state['queries'])
+    DB_QUERY_SECONDS.labels(endpoint).inc(state['query_seconds'])
+
+    if current_app.config.get('SERVER_TIMING'):
+        timings = [f"db;dur={state['query_seconds'] * 1000:.1f};desc=\"{state['queries']} queries\"",
+                   f"dbpool;dur={state['pool_wait'] * 1000:.1f}"]
+        timings += [f'{service};dur={seconds * 1000:.1f}' for service, seconds in state['external'].items()]
+        timings.append(f'app;dur={elapsed * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+@contextmanager
+def observe_external(service):
+    """Time an outbound call, e.g. with observe_external('perplexity'): ..."""
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        EXTERNAL_LATENCY.labels(service, outcome).observe(elapsed)
+        state = _request_state()
+        if state is not None:
+            state['external'][service] = state['external'].get(service, 0.0) + elapsed
+
+def observe_pool_checkout(seconds, timed_out=False):
+    """Record the wait for a pooled connection (called by the engine's pool)"""
+    DB_POOL_WAIT.observe(seconds)
+    if timed_out:
+        DB_POOL_TIMEOUTS.inc()
+    state = _request_state()
+    if state is not None:
+        state['pool_wait'] += seconds
+
+def _request_state():
+    return g.get('metrics') if has_app_context() else None
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    state = _request_state()
+    if state is not None:
+        state['queries'] += 1
+        state['query_seconds'] += time.perf_counter() - started
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    # after_cursor_execute does not run for a failed statement
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
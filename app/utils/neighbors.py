@@ -0,0 +1,404 @@
+"""
+Submission Neighbors Utility
+
+Finds, for every submission, the k most similar other submissions and
+groups overlapping submissions into clusters for the admin report.
+
+Submissions are rows of one sparse TF-IDF matrix. Similarities are computed
+a block of rows at a time (block x all sparse product, densified only for
+the block), so memory stays O(block_size * n) instead of O(n^2). Only the
+top k neighbors of each submission are stored.
+
+Updates are incremental: a run only computes rows for submissions newer
+than the previous run's watermark and offers them as neighbors to the
+already indexed ones. Scores of older pairs are kept as stored, so they
+drift slightly as the vocabulary grows; a full rebuild recomputes everything.
+The term counts of indexed submissions are kept in a file between runs, so
+an incremental run only reads and tokenizes the new submissions.
+
+Only one update runs at a time across all workers: it holds a PostgreSQL
+advisory lock, or a local file lock on SQLite and other single-host setups,
+as the Perplexity governor does.
+"""
+
+import os
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from flask import current_app
+from sqlalchemy import delete, insert, func, text
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import TechnologySubmission, SubmissionNeighbor, SimilarityRun, User
+from app.utils.cache import TTLCache
+from app.utils.similarity import tokenize, submission_text
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+ADVISORY_LOCK_KEY = 0x4D4D534E  # 'MMSN'
+
+_update_lock = threading.Lock()
+_index_lock = threading.Lock()
+
+# Cluster structure per (index run, threshold); the stored pairs only change with a run
+_cluster_cache = TTLCache(maxsize=32, ttl=3600)
+
+class IndexUpdateInProgress(RuntimeError):
+    """Raised when another worker is already updating the neighbor index"""
+
+def build_term_matrix(reuse_from=None, save_as=None):
+    """Return (ids, matrix): submission ids ascending and their L2-normalized TF-IDF rows
+
+    Term counts of the submissions indexed by reuse_from (a SimilarityRun)
+    are read from the term count file instead of the database; save_as
+    stores this matrix's counts for the run after it.
+    """
+    cached = _load_term_counts(reuse_from) if reuse_from is not None else None
+    if cached is None:
+        ids, vocabulary, counts = np.zeros(0, dtype=np.int64), {}, sparse.csr_matrix((0, 0), dtype=np.float32)
+    else:
+        ids, vocabulary, counts = cached
+    read_through = int(ids[-1]) if len(ids) else 0
+
+    if len(ids):
+        # Drop submissions deleted since the counts were stored
+        present = {submission_id for submission_id, in db.session.query(TechnologySubmission.id)
+                   .filter(TechnologySubmission.id <= read_through)}
+        keep = np.fromiter((int(submission_id) in present for submission_id in ids), dtype=bool, count=len(ids))
+        if not keep.all():
+            ids, counts = ids[keep], counts[keep]
+
+    new_ids, indptr, indices, values = [], [0], [], []
+    query = db.session.query(
+        TechnologySubmission.id, TechnologySubmission.title,
+        TechnologySubmission.description, TechnologySubmission.claims
+    ).filter(TechnologySubmission.id > read_through).order_by(TechnologySubmission.id).yield_per(1000)
+    for row in query:
+        term_counts = Counter(vocabulary.setdefault(token, len(vocabulary))
+                              for token in tokenize(submission_text(row)))
+        new_ids.append(row.id)
+        indices.extend(term_counts.keys())
+        values.extend(term_counts.values())
+        indptr.append(len(indices))
+
+    width = max(len(vocabulary), 1)
+    counts.resize((counts.shape[0], width))
+    counts = sparse.vstack([counts, sparse.csr_matrix(
+        (np.asarray(values, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+        shape=(len(new_ids), width))], format='csr', dtype=np.float32)
+    ids = np.concatenate([ids, np.asarray(new_ids, dtype=np.int64)])
+
+    if save_as is not None:
+        _save_term_counts(save_as, ids, vocabulary, counts)
+
+    matrix = counts.copy()
+    if not len(ids):
+        return ids, matrix
+
+    # Sublinear TF times smoothed IDF, then L2-normalize every row
+    document_frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1 + len(ids)) / (1 + document_frequency)) + 1
+    matrix.data = (1 + np.log(matrix.data)) * idf[matrix.indices].astype(np.float32)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    matrix = (sparse.diags((1 / norms).astype(np.float32)) @ matrix).tocsr()
+    return np.asarray(ids), matrix
+
+def latest_similarity_run():
+    """Most recent finished SimilarityRun, or None"""
+    return SimilarityRun.query.filter(SimilarityRun.finished_at.isnot(None)) \
+        .order_by(SimilarityRun.id.desc()).first()
+
+def update_neighbor_index(full=False, k=None, block_size=None):
+    """Index submissions added since the last run (or all of them); returns the SimilarityRun
+
+    Raises IndexUpdateInProgress while another worker is updating the index.
+    """
+    with _index_lease():
+        return _update_neighbor_index(full, k, block_size)
+
+def _update_neighbor_index(full, k, block_size):
+    config = current_app.config
+    k = k or config.get('SIMILARITY_NEIGHBORS', 10)
+    block_size = block_size or config.get('SIMILARITY_BLOCK_SIZE', 256)
+    min_score = config.get('SIMILARITY_MIN_SCORE', 0.05)
+
+    last = None if full else latest_similarity_run()
+    watermark = last.indexed_through_id if last else 0
+    run = SimilarityRun(full_rebuild=watermark == 0)
+    db.session.add(run)
+    db.session.commit()
+
+    ids, matrix = build_term_matrix(reuse_from=last, save_as=run)
+    n = len(ids)
+    first_new = int(np.searchsorted(ids, watermark, side='right'))
+    row_of = {int(submission_id): row for row, submission_id in enumerate(ids)}
+
+    if watermark == 0:
+        db.session.execute(delete(SubmissionNeighbor))
+        neighbors = {}
+    else:
+        neighbors = _load_neighbors(row_of)
+
+    # Score a candidate must beat to enter an already indexed submission's list
+    threshold = np.full(n, min_score, dtype=np.float32)
+    for row, listed in neighbors.items():
+        if len(listed) >= k:
+            threshold[row] = listed[-1][0]
+
+    changed = set()
+    transposed = matrix.T.tocsr()
+    for start in range(first_new, n, block_size):
+        stop = min(start + block_size, n)
+        scores = (matrix[start:stop] @ transposed).toarray()
+        local = np.arange(stop - start)
+        scores[local, local + start] = 0  # a submission is not its own neighbor
+
+        # Top k of every new submission, against all submissions
+        for i, top in enumerate(_top_k(scores, k)):
+            neighbors[start + i] = sorted(
+                ((float(scores[i, j]), int(j)) for j in top if scores[i, j] > min_score), reverse=True)
+            changed.add(start + i)
+
+        # New submissions may displace neighbors of already indexed ones
+        indexed = scores[:, :first_new]
+        if indexed.size:
+            for j in np.nonzero(indexed.max(axis=0) > threshold[:first_new])[0].tolist():
+                column = indexed[:, j]
+                candidates = [(float(column[i]), start + int(i)) for i in np.nonzero(column > threshold[j])[0]]
+                merged = sorted(neighbors.get(j, []) + candidates, reverse=True)[:k]
+                neighbors[j] = merged
+                if len(merged) >= k:
+                    threshold[j] = merged[-1][0]
+                changed.add(j)
+
+    _save_neighbors(ids, neighbors, changed)
+
+    run.indexed_through_id = int(ids[-1]) if n else watermark
+    run.new_submissions = n - first_new
+    run.total_submissions = n
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
+    return run
+
+def _top_k(scores, k):
+    if scores.shape[1] <= k:
+        return np.argsort(-scores, axis=1)
+    return np.argpartition(-scores, k, axis=1)[:, :k]
+
+@contextmanager
+def _index_lease():
+    """Hold the right to write the neighbor index; only one worker at a time gets it"""
+    if db.engine.dialect.name == 'postgresql':
+        # A session-level lock, released explicitly or when the connection dies with its worker
+        with db.engine.connect() as conn:
+            acquired = conn.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': ADVISORY_LOCK_KEY}).scalar()
+            conn.commit()
+            if not acquired:
+                raise IndexUpdateInProgress('A similarity index update is already running')
+            try:
+                yield
+            finally:
+                conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': ADVISORY_LOCK_KEY})
+                conn.commit()
+        return
+
+    lock_path = current_app.config.get('SIMILARITY_LOCK_FILE') or \
+        os.path.join(tempfile.gettempdir(), 'mmsu_similarity_index.lock')
+    if not _index_lock.acquire(blocking=False):
+        raise IndexUpdateInProgress('A similarity index update is already running')
+    try:
+        with open(lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise IndexUpdateInProgress('A similarity index update is already running')
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    finally:
+        _index_lock.release()
+
+def _run_key(run):
+    # Run ids restart with a new database; the start time tells those runs apart
+    return f'{run.id}:{run.started_at.isoformat()}'
+
+def _term_counts_path():
+    return current_app.config.get('SIMILARITY_TERM_COUNTS_FILE') or \
+        os.path.join(tempfile.gettempdir(), 'mmsu_similarity_terms.npz')
+
+def _load_term_counts(run):
+    """(ids, vocabulary, counts) stored by run, or None if the file belongs to another run"""
+    try:
+        with np.load(_term_counts_path(), allow_pickle=False) as stored:
+            if str(stored['run_key']) != _run_key(run):
+                return None
+            tokens = stored['vocabulary'].tolist()
+            counts = sparse.csr_matrix((stored['data'], stored['indices'], stored['indptr']),
+                                       shape=tuple(stored['shape']))
+            return stored['ids'], {token: column for column, token in enumerate(tokens)}, counts
+    except (OSError, KeyError, ValueError):
+        return None
+
+def _save_term_counts(run, ids, vocabulary, counts):
+    path = _term_counts_path()
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path) or None, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, run_key=np.asarray(_run_key(run)), ids=ids,
+                     vocabulary=np.asarray(list(vocabulary), dtype=str),
+                     data=counts.data, indices=counts.indices, indptr=counts.indptr,
+                     shape=np.asarray(counts.shape))
+        os.replace(temporary, path)
+    except OSError:
+        current_app.logger.exception('Could not store similarity term counts')
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+def _load_neighbors(row_of):
+    neighbors = {}
+    query = db.session.query(SubmissionNeighbor.submission_id, SubmissionNeighbor.neighbor_id,
+                             SubmissionNeighbor.score).yield_per(5000)
+    for submission_id, neighbor_id, score in query:
+        if submission_id in row_of and neighbor_id in row_of:
+            neighbors.setdefault(row_of[submission_id], []).append((score, row_of[neighbor_id]))
+    for listed in neighbors.values():
+        listed.sort(reverse=True)
+    return neighbors
+
+def _save_neighbors(ids, neighbors, changed, chunk_size=500):
+    """Replace the stored neighbor lists of the changed submissions"""
+    now = datetime.utcnow()
+    changed = sorted(changed)
+    for offset in range(0, len(changed), chunk_size):
+        chunk = changed[offset:offset + chunk_size]
+        db.session.execute(delete(SubmissionNeighbor).where(
+            SubmissionNeighbor.submission_id.in_([int(ids[row]) for row in chunk])))
+        rows = [
+            {'submission_id': int(ids[row]), 'neighbor_id': int(ids[neighbor]),
+             'score': round(score, 4), 'computed_at': now}
+            for row in chunk for score, neighbor in neighbors.get(row, [])
+        ]
+        if rows:
+            db.session.execute(insert(SubmissionNeighbor), rows)
+        db.session.commit()
+
+def start_background_update(full=False):
+    """Run update_neighbor_index on a daemon thread; False if one is already running"""
+    if not _update_lock.acquire(blocking=False):
+        return False
+    app = current_app._get_current_object()
+
+    def work():
+        try:
+            with app.app_context():
+                update_neighbor_index(full=full)
+        except IndexUpdateInProgress:
+            app.logger.info('Similarity index update skipped: another worker is running one')
+        except Exception:
+            app.logger.exception('Similarity index update failed')
+        finally:
+            _update_lock.release()
+
+    threading.Thread(target=work, name='similarity-index', daemon=True).start()
+    return True
+
+def update_in_progress():
+    """True while a background update holds the lock in this process"""
+    return _update_lock.locked()
+
+def cluster_submissions(min_score, max_clusters=50):
+    """Clusters of submissions linked by neighbor scores >= min_score, largest first"""
+    run = latest_similarity_run()
+    key = (_run_key(run), min_score, max_clusters) if run is not None else None
+    clusters = _cluster_cache.get(key) if key is not None else None
+    if clusters is None:
+        clusters = _find_clusters(min_score, max_clusters)
+        if key is not None:
+            _cluster_cache.set(key, clusters)
+    if not clusters:
+        return []
+
+    shown_ids = [submission_id for submission_ids, _ in clusters for submission_id in submission_ids]
+    submissions = {
+        submission.id: submission for submission in db.session.query(
+            TechnologySubmission.id, TechnologySubmission.title, TechnologySubmission.description,
+            TechnologySubmission.claims, TechnologySubmission.serial_number,
+            TechnologySubmission.institution, User.name.label('author_name')
+        ).join(User, TechnologySubmission.user_id == User.id)
+         .filter(TechnologySubmission.id.in_(shown_ids))
+    }
+
+    report = []
+    for submission_ids, max_score in clusters:
+        rows = [submissions[submission_id] for submission_id in submission_ids if submission_id in submissions]
+        terms = Counter(token for row in rows for token in set(tokenize(submission_text(row))))
+        institutions = Counter(row.institution or 'Unknown' for row in rows)
+        report.append({
+            'size': len(rows),
+            'max_score': round(max_score, 3),
+            'institutions': institutions.most_common(),
+            'top_terms': [term for term, _ in terms.most_common(8)],
+            'submissions': rows
+        })
+    return report
+
+def _find_clusters(min_score, max_clusters):
+    """[(submission_ids, best_score)] of the largest connected clusters"""
+    pairs = db.session.query(SubmissionNeighbor.submission_id, SubmissionNeighbor.neighbor_id,
+                             SubmissionNeighbor.score) \
+        .filter(SubmissionNeighbor.score >= min_score).all()
+    if not pairs:
+        return []
+
+    node_ids = sorted({submission_id for pair in pairs for submission_id in pair[:2]})
+    node_of = {submission_id: node for node, submission_id in enumerate(node_ids)}
+    graph = sparse.csr_matrix(
+        (np.ones(len(pairs)), ([node_of[p[0]] for p in pairs], [node_of[p[1]] for p in pairs])),
+        shape=(len(node_ids), len(node_ids)))
+    _, labels = connected_components(graph, directed=False)
+
+    best_score = {}
+    for submission_id, neighbor_id, score in pairs:
+        label = labels[node_of[submission_id]]
+        best_score[label] = max(best_score.get(label, 0), score)
+
+    members = {}
+    for node, label in enumerate(labels):
+        members.setdefault(label, []).append(node_ids[node])
+    clusters = sorted(members.items(), key=lambda item: (-len(item[1]), -best_score[item[0]]))
+    return [(submission_ids, best_score[label]) for label, submission_ids in clusters[:max_clusters]]
+
+def cross_institution_pairs(min_score, limit=50):
+    """Most similar pairs of submissions filed by different institutions"""
+    Neighbor = aliased(TechnologySubmission)
+    rows = db.session.query(
+        SubmissionNeighbor.score,
+        TechnologySubmission.id, TechnologySubmission.title, TechnologySubmission.institution,
+        Neighbor.id.label('neighbor_id'), Neighbor.title.label('neighbor_title'),
+        Neighbor.institution.label('neighbor_institution')
+    ).join(TechnologySubmission, SubmissionNeighbor.submission_id == TechnologySubmission.id) \
+     .join(Neighbor, SubmissionNeighbor.neighbor_id == Neighbor.id) \
+     .filter(SubmissionNeighbor.score >= min_score,
+             func.coalesce(TechnologySubmission.institution, '') != func.coalesce(Neighbor.institution, '')) \
+     .order_by(SubmissionNeighbor.score.desc()).limit(limit * 2).all()
+
+    # A pair may be stored in both directions
+    pairs, seen = [], set()
+    for row in rows:
+        key = frozenset((row.id, row.neighbor_id))
+        if key not in seen:
+            seen.add(key)
+            pairs.append(row)
+    return pairs[:limit]
@@ -0,0 +1,268 @@
+"""
+Email Outbox Sender
+
+Requests only insert Pending EmailLog rows. A background sender claims due
+rows in batches, delivers them over a single SMTP connection, and records
+the outcome with one bulk UPDATE per batch. Failed deliveries are retried
+with exponential backoff until EMAIL_OUTBOX_MAX_ATTEMPTS is reached.
+Transactional mail is claimed ahead of bulk (broadcast) mail, and sending
+is throttled to stay under the SMTP provider's rate limits: every worker
+runs a sender, so EMAIL_SEND_RATE_PER_MINUTE is enforced at claim time from
+the rows sent or in flight during the last minute, across all of them.
+"""
+
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import case, func, update, or_, and_, text
+from app import db, mail
+from app.models import EmailLog
+from app.utils.metrics import observe_external
+
+# Claims older than this are assumed to belong to a crashed sender
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+RATE_WINDOW = timedelta(minutes=1)
+OUTBOX_LOCK_KEY = 0x4D4D534F  # 'MMSO', serializes claims on PostgreSQL
+
+_sender = None
+_sender_lock = threading.Lock()
+
+def claim_batch(batch_size):
+    """Atomically claim up to batch_size due outbox rows for this sender
+
+    A row reclaimed from a crashed sender counts as a failed attempt, so a
+    message that crashes the sender is given up after
+    EMAIL_OUTBOX_MAX_ATTEMPTS instead of being retried forever.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        # One sender at a time decides, so two workers cannot both spend the same rate budget
+        db.session.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': OUTBOX_LOCK_KEY})
+
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    max_attempts = current_app.config.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+
+    abandoned = and_(EmailLog.status == 'Sending', EmailLog.claimed_at < now - CLAIM_TIMEOUT)
+    db.session.execute(
+        update(EmailLog)
+        .where(abandoned, EmailLog.attempts + 1 >= max_attempts)
+        .values(status='Failed', attempts=EmailLog.attempts + 1, claimed_by=None, claimed_at=None,
+                error_message='The sender stopped while delivering this message'),
+        execution_options={'synchronize_session': False}
+    )
+
+    rate = current_app.config.get('EMAIL_SEND_RATE_PER_MINUTE', 0)
+    if rate:
+        batch_size = min(batch_size, rate - sent_or_in_flight(now))
+        if batch_size <= 0:
+            db.session.commit()
+            return []
+
+    due = or_(and_(EmailLog.status == 'Pending', EmailLog.next_attempt_at <= now), abandoned)
+    ids = [row.id for row in db.session.query(EmailLog.id)
+           .filter(due)
+           .order_by(EmailLog.priority, EmailLog.next_attempt_at, EmailLog.id)
+           .limit(batch_size)
+           .with_for_update(skip_locked=True)]
+    if not ids:
+        db.session.commit()
+        return []
+
+    # Re-check the due condition so a concurrent sender cannot claim the same rows
+    db.session.execute(
+        update(EmailLog)
+        .where(EmailLog.id.in_(ids), due)
+        .values(status='Sending', claimed_by=token, claimed_at=now,
+                attempts=case((EmailLog.status == 'Sending', EmailLog.attempts + 1),
+                              else_=EmailLog.attempts)),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+
+    return EmailLog.query.filter_by(claimed_by=token, status='Sending') \
+        .order_by(EmailLog.id).all()
+
+def drain_outbox(max_batches=None):
+    """Send due outbox rows over one SMTP connection; returns rows processed"""
+    config = current_app.config
+    batch_size = config.get('EMAIL_OUTBOX_BATCH_SIZE', 50)
+    throttle = Throttle(config.get('EMAIL_SEND_RATE_PER_MINUTE', 0))
+
+    daily_limit = config.get('EMAIL_DAILY_LIMIT', 0)
+    remaining = daily_limit - sent_today() if daily_limit else None
+    if remaining is not None:
+        if remaining <= 0:
+            return 0
+        batch_size = min(batch_size, remaining)
+
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0
+
+    processed = 0
+    batches = 0
+    try:
+        with mail.connect() as connection:
+            while batch:
+                sent, failed = _send_batch(connection, batch, throttle)
+                _record_results(sent, failed)
+                processed += len(batch)
+                batch = []
+                batches += 1
+                if max_batches is not None and batches >= max_batches:
+                    break
+                if remaining is not None:
+                    remaining -= len(sent)
+                    if remaining <= 0:
+                        break
+                    batch_size = min(batch_size, remaining)
+                batch = claim_batch(batch_size)
+    except Exception as e:
+        # Connection-level failure: everything still claimed goes back for retry
+        current_app.logger.error(f"Email outbox SMTP session failed: {str(e)}")
+        if batch:
+            _record_results([], [(log, str(e)) for log in batch])
+            processed += len(batch)
+
+    return processed
+
+def sent_today():
+    """Number of emails delivered since midnight UTC"""
+    now = datetime.utcnow()
+    midnight = datetime(now.year, now.month, now.day)
+    return db.session.query(func.count(EmailLog.id)) \
+        .filter(EmailLog.status == 'Sent', EmailLog.sent_at >= midnight).scalar()
+
+def sent_or_in_flight(now):
+    """Rows sent in the last minute or claimed for sending now, by any worker"""
+    return db.session.query(func.count(EmailLog.id)).filter(or_(
+        and_(EmailLog.status == 'Sent', EmailLog.sent_at >= now - RATE_WINDOW),
+        and_(EmailLog.status == 'Sending', EmailLog.claimed_at >= now - CLAIM_TIMEOUT)
+    )).scalar()
+
+class Throttle:
+    """Spaces this sender's calls evenly to at most rate_per_minute (0 means unthrottled)
+
+    The limit across workers comes from claim_batch; this only keeps one
+    sender from sending its claimed batch in a burst.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute else 0.0
+        self._next_at = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self._next_at > now:
+            time.sleep(self._next_at - now)
+            now = self._next_at
+        self._next_at = now + self.interval
+
+def _send_batch(connection, batch, throttle):
+    """Send each claimed row; returns (sent, [(row, error), ...])"""
+    sent, failed = [], []
+    for log in batch:
+        msg = Message(
+            subject=log.subject,
+            recipients=[log.recipient_email],
+            html=log.html_body,
+            body=log.text_body,
+            sender=log.sender or current_app.config['MAIL_DEFAULT_SENDER']
+        )
+        throttle.wait()
+        try:
+            with observe_external('smtp'):
+                connection.send(msg)
+            sent.append(log)
+        except Exception as e:
+            current_app.logger.error(f"Email sending failed for {log.recipient_email}: {str(e)}")
+            failed.append((log, str(e)))
+    return sent, failed
+
+def _record_results(sent, failed):
+    """Bulk-update delivery outcomes for one batch"""
+    config = current_app.config
+    max_attempts = config.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    retry_base = config.get('EMAIL_OUTBOX_RETRY_BASE', 30)
+    now = datetime.utcnow()
+
+    rows = [{'id': log.id, 'status': 'Sent', 'sent_at': now, 'attempts': log.attempts + 1,
+             'error_message': None, 'claimed_by': None, 'claimed_at': None}
+            for log in sent]
+    for log, error in failed:
+        attempts = log.attempts + 1
+        rows.append({
+            'id': log.id,
+            'status': 'Failed' if attempts >= max_attempts else 'Pending',
+            'attempts': attempts,
+            'error_message': error[:2000],
+            'next_attempt_at': now + timedelta(seconds=retry_base * 2 ** (attempts - 1)),
+            'claimed_by': None,
+            'claimed_at': None
+        })
+
+    if rows:
+        db.session.execute(update(EmailLog), rows)
+        db.session.commit()
+
+class OutboxSender(threading.Thread):
+    """Daemon thread that drains the outbox whenever it is woken or polled"""
+
+    def __init__(self, app):
+        super().__init__(name='email-outbox-sender', daemon=True)
+        self.app = app
+        self.pid = os.getpid()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def run(self):
+        interval = self.app.config.get('EMAIL_OUTBOX_POLL_INTERVAL', 30)
+        try:
+            from app.utils.broadcast import resume_broadcasts
+            with self.app.app_context():
+                resume_broadcasts()
+        except Exception:
+            self.app.logger.exception('Resuming interrupted broadcasts failed')
+
+        while not self._stopping.is_set():
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    drain_outbox()
+            except Exception:
+                self.app.logger.exception('Email outbox sender iteration failed')
+            self._wake.wait(interval)
+
+def notify_sender(app=None):
+    """Wake this process's sender thread, starting it if needed"""
+    global _sender
+    app = app or current_app._get_current_object()
+    if not app.config.get('EMAIL_OUTBOX_BACKGROUND', True):
+        return
+
+    with _sender_lock:
+        # Threads do not survive a fork, so each worker process starts its own
+        if _sender is None or not _sender.is_alive() or _sender.pid != os.getpid():
+            _sender = OutboxSender(app)
+            _sender.start()
+    _sender.wake()
+
+def stop_sender():
+    """Ask this process's sender thread to stop after its current batch"""
+    with _sender_lock:
+        if _sender is not None and _sender.pid == os.getpid():
+            _sender.stop()
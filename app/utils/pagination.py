@@ -0,0 +1,118 @@
+"""
+Keyset (Cursor) Pagination Utility
+
+Pages are addressed by the sort key of the last row shown rather than by an
+OFFSET, so every page costs one index range scan no matter how deep it is.
+"""
+
+import json
+from datetime import datetime
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import tuple_, text
+from app import db
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token cannot be decoded"""
+
+class KeysetPage:
+    """One page of keyset-paginated results"""
+
+    def __init__(self, items, next_cursor, total=None, total_is_estimate=False, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.has_next = next_cursor is not None
+        self.prev_cursor = prev_cursor
+        self.has_prev = prev_cursor is not None
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='keyset-cursor')
+
+def encode_cursor(values):
+    """Encode sort-key values into an opaque, tamper-evident token"""
+    return _serializer().dumps([
+        {'dt': value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ])
+
+def decode_cursor(token):
+    """Decode a token produced by encode_cursor"""
+    try:
+        values = _serializer().loads(token)
+    except BadSignature:
+        raise InvalidCursor('Invalid pagination cursor')
+    return [
+        datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value
+        for value in values
+    ]
+
+def keyset_paginate(query, order_by, cursor=None, per_page=25, count=None, before=None):
+    """Return a descending KeysetPage of query ordered by the order_by columns
+
+    order_by must end with a unique column (normally the primary key), e.g.
+    (User.created_at, User.id), and should be backed by a composite index.
+    cursor (a page's next_cursor) selects the rows after it; before (a
+    page's prev_cursor) the rows preceding it. count may be None (no
+    total), 'exact' or 'estimate'.
+    """
+    total = None
+    if count == 'exact':
+        total = query.order_by(None).count()
+    elif count == 'estimate':
+        total = estimate_count(query)
+
+    def key_of(row):
+        return encode_cursor([getattr(row, column.key) for column in order_by])
+
+    if before:
+        # Walk backwards from the page's first row, then show the rows in the usual order
+        rows = query.filter(tuple_(*order_by) > tuple_(*_decode_key(before, order_by))) \
+            .order_by(*[column.asc() for column in order_by]).limit(per_page + 1).all()
+        more_before = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        return KeysetPage(rows, key_of(rows[-1]) if rows else None, total=total,
+                          total_is_estimate=(count == 'estimate'),
+                          prev_cursor=key_of(rows[0]) if rows and more_before else None)
+
+    if cursor:
+        query = query.filter(tuple_(*order_by) < tuple_(*_decode_key(cursor, order_by)))
+
+    rows = query.order_by(*[column.desc() for column in order_by]).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = key_of(rows[-1])
+
+    return KeysetPage(rows, next_cursor, total=total, total_is_estimate=(count == 'estimate'),
+                      prev_cursor=key_of(rows[0]) if cursor and rows else None)
+
+def _decode_key(token, order_by):
+    values = decode_cursor(token)
+    if len(values) != len(order_by):
+        raise InvalidCursor('Invalid pagination cursor')
+    return values
+
+def estimate_count(query):
+    """Approximate row count of query
+
+    Uses the planner's row estimate on PostgreSQL, which avoids a full
+    COUNT(*) scan; other databases fall back to an exact count.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return query.order_by(None).count()
+
+    statement = query.order_by(None).statement.compile(
+        dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    plan = db.session.execute(text(f'EXPLAIN (FORMAT JSON) {statement}')).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
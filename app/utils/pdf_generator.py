@@ -6,11 +6,13 @@ import os
 import tempfile
 from datetime import datetime
 from flask import render_template, current_app
-from weasyprint import HTML, CSS
-from weasyprint.text.fonts import FontConfiguration
+from app.utils.metrics import observe_external
 
 def generate_pdf_report(submission):
     """Generate PDF report for technology submission"""
+    # WeasyPrint takes a noticeable part of startup, so load it on first use
+    from weasyprint import HTML, CSS
+    from weasyprint.text.fonts import FontConfiguration
 
     # Get analysis results
     results = submission.get_results()
@@ -50,11 +52,12 @@ def generate_pdf_report(submission):
 
     try:
         # Generate PDF with WeasyPrint
-        HTML(string=html_content, base_url=current_app.config.get('WEASYPRINT_BASE_URL')).write_pdf(
-            pdf_path,
-            stylesheets=[CSS(string=css_content, font_config=font_config)],
-            font_config=font_config
-        )
+        with observe_external('weasyprint'):
+            HTML(string=html_content, base_url=current_app.config.get('WEASYPRINT_BASE_URL')).write_pdf(
+                pdf_path,
+                stylesheets=[CSS(string=css_content, font_config=font_config)],
+                font_config=font_config
+            )
 
         return pdf_path
 
@@ -0,0 +1,159 @@
+"""
+Query Debugging Utility
+
+Development and test aid. With QUERY_DEBUG on, every SQL statement of a
+request is recorded; statement shapes repeated N_PLUS_ONE_THRESHOLD or more
+times are logged as likely N+1 patterns, and endpoints listed in
+QUERY_BUDGETS are checked against their maximum query count. Responses
+carry X-Query-Count so tests can assert on it, and count_queries() /
+query_budget() wrap any block of code directly.
+"""
+
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_active = threading.local()
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:[^()]|\([^()]*\))*\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_LIBRARY_PREFIXES = tuple({sysconfig.get_paths()[key] for key in ('stdlib', 'purelib', 'platlib')})
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block or endpoint runs more SQL statements than allowed"""
+
+class QueryRecorder:
+    """SQL statements executed while the recorder is active"""
+
+    def __init__(self):
+        self.statements = []  # (statement, seconds, location)
+
+    def __len__(self):
+        return len(self.statements)
+
+    @property
+    def seconds(self):
+        return sum(seconds for _, seconds, _ in self.statements)
+
+    def suspected_n_plus_one(self, threshold=5):
+        """[(shape, count, first_location)] for shapes run at least threshold times"""
+        shapes = Counter()
+        first_location = {}
+        for statement, _, location in self.statements:
+            shape = normalize_statement(statement)
+            shapes[shape] += 1
+            first_location.setdefault(shape, location)
+        return [(shape, count, first_location[shape])
+                for shape, count in shapes.most_common() if count >= threshold]
+
+    def report(self, limit=20):
+        """Readable summary, most repeated shapes first"""
+        shapes = Counter(normalize_statement(statement) for statement, _, _ in self.statements)
+        lines = [f'{len(self)} queries in {self.seconds * 1000:.1f} ms']
+        lines += [f'{count:4d}x {shape[:300]}' for shape, count in shapes.most_common(limit)]
+        return '\n'.join(lines)
+
+def normalize_statement(statement):
+    """Statement with literals and IN lists collapsed, so repeats compare equal"""
+    shape = _IN_LIST_RE.sub('IN (...)', statement)
+    shape = _LITERAL_RE.sub('?', shape)
+    return _SPACE_RE.sub(' ', shape).strip()
+
+@contextmanager
+def count_queries():
+    """Record the statements run on this thread inside the with-block"""
+    recorder = QueryRecorder()
+    stack = _recorders()
+    stack.append(recorder)
+    try:
+        yield recorder
+    finally:
+        stack.remove(recorder)
+
+@contextmanager
+def query_budget(max_queries, label='block'):
+    """Fail with QueryBudgetExceeded if the with-block runs more than max_queries statements"""
+    with count_queries() as recorder:
+        yield recorder
+    if len(recorder) > max_queries:
+        raise QueryBudgetExceeded(f'{label} ran {len(recorder)} queries (budget {max_queries})\n'
+                                  f'{recorder.report()}')
+
+def init_app(app):
+    """Record each request's queries when QUERY_DEBUG is on"""
+
+    @app.before_request
+    def _start_recording():
+        recorder = QueryRecorder()
+        _recorders().append(recorder)
+        g.query_recorder = recorder
+
+    @app.after_request
+    def _check_queries(response):
+        recorder = g.get('query_recorder')
+        if recorder is None:
+            return response
+
+        endpoint = request.endpoint or 'unmatched'
+        suspects = recorder.suspected_n_plus_one(app.config.get('N_PLUS_ONE_THRESHOLD', 5))
+        for shape, count, location in suspects:
+            app.logger.warning(f'Possible N+1 in {endpoint}: {count}x {shape[:300]} (first from {location})')
+
+        response.headers['X-Query-Count'] = str(len(recorder))
+        response.headers['X-Query-N-Plus-One'] = str(len(suspects))
+
+        budget = app.config.get('QUERY_BUDGETS', {}).get(endpoint)
+        if budget is not None and len(recorder) > budget:
+            message = f'{endpoint} ran {len(recorder)} queries (budget {budget})'
+            if app.config.get('QUERY_BUDGET_ENFORCE'):
+                raise QueryBudgetExceeded(f'{message}\n{recorder.report()}')
+            app.logger.warning(message)
+        return response
+
+    @app.teardown_request
+    def _stop_recording(exc):
+        # Runs even when the view raised, so a failed request's recorder never lingers on this thread
+        recorder = g.pop('query_recorder', None)
+        if recorder is not None and recorder in _recorders():
+            _recorders().remove(recorder)
+
+def _recorders():
+    if not hasattr(_active, 'recorders'):
+        _active.recorders = []
+    return _active.recorders
+
+def _caller():
+    """First frame outside SQLAlchemy, Flask and this module, as 'path:line'"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(_LIBRARY_PREFIXES) and filename != __file__:
+            return f'{os.path.relpath(filename, _PROJECT_ROOT)}:{frame.f_lineno}'
+        frame = frame.f_back
+    return 'unknown'
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_active, 'recorders', None):
+        conn.info.setdefault('query_debug_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    recorders = getattr(_active, 'recorders', None)
+    started = conn.info.get('query_debug_started')
+    if not recorders or not started:
+        return
+    entry = (statement, time.perf_counter() - started.pop(), _caller())
+    for recorder in recorders:
+        recorder.statements.append(entry)
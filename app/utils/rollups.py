@@ -0,0 +1,159 @@
+"""
+Daily Usage Rollup Utility
+
+Keeps the DailyUsage table in step with submissions, analyses, downloads,
+credit debits and registrations as they are flushed, so usage trends can be
+read without scanning the raw tables.
+
+An analysis is a successful AnalysisRun, so a re-analysis counts again on
+the day it ran. backfill_daily_usage() (`flask rollups backfill`) counts the
+same way, and adds completed submissions analyzed before runs were recorded
+on their analyzed_at day, so a rebuild reproduces the incremental totals.
+"""
+
+from collections import defaultdict
+from datetime import datetime, date
+from sqlalchemy import event, func, insert, delete
+from sqlalchemy.orm import Session
+from app import db
+from app.models import User, TechnologySubmission, CreditHistory, DownloadHistory, DailyUsage, AnalysisRun
+
+COUNTERS = ('submissions', 'analyses', 'downloads', 'credits_spent', 'new_users')
+
+def new_increments():
+    """Empty {(day, institution): {counter: n}} accumulator"""
+    return defaultdict(lambda: defaultdict(int))
+
+def record_usage(connection, increments):
+    """Add accumulated increments to the rollup table
+
+    Call this directly from code paths that write rows with set-based
+    statements, which bypass the flush listener below.
+    """
+    for (day, institution), counts in increments.items():
+        counts = {name: n for name, n in counts.items() if n}
+        if counts:
+            _upsert(connection, day, institution, counts)
+
+def _upsert(connection, day, institution, counts):
+    table = DailyUsage.__table__
+    dialect = connection.dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        values = {name: counts.get(name, 0) for name in COUNTERS}
+        stmt = dialect_insert(table).values(day=day, institution=institution, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.institution],
+            set_={name: table.c[name] + stmt.excluded[name] for name in counts}
+        )
+        connection.execute(stmt)
+        return
+
+    # Generic fallback: update in place, insert the row if it does not exist yet
+    result = connection.execute(
+        table.update()
+        .where(table.c.day == day, table.c.institution == institution)
+        .values({name: table.c[name] + n for name, n in counts.items()})
+    )
+    if result.rowcount == 0:
+        values = {name: counts.get(name, 0) for name in COUNTERS}
+        connection.execute(table.insert().values(day=day, institution=institution, **values))
+
+def _day(value):
+    return (value or datetime.utcnow()).date()
+
+@event.listens_for(Session, 'after_flush')
+def _rollup_flushed_rows(session, flush_context):
+    increments = new_increments()
+    institutions = {}
+
+    def institution_of(user_id):
+        if user_id not in institutions:
+            user = session.get(User, user_id)
+            institutions[user_id] = (user.institution or '') if user else ''
+        return institutions[user_id]
+
+    for obj in session.new:
+        if isinstance(obj, TechnologySubmission):
+            key = (_day(obj.submitted_at), institution_of(obj.user_id))
+            increments[key]['submissions'] += 1
+        elif isinstance(obj, AnalysisRun):
+            if obj.succeeded:
+                submission = session.get(TechnologySubmission, obj.submission_id)
+                user_id = submission.user_id if submission else None
+                increments[(_day(obj.created_at), institution_of(user_id))]['analyses'] += 1
+        elif isinstance(obj, CreditHistory):
+            if obj.amount < 0:
+                key = (_day(obj.created_at), institution_of(obj.user_id))
+                increments[key]['credits_spent'] -= obj.amount
+        elif isinstance(obj, DownloadHistory):
+            increments[(_day(obj.downloaded_at), institution_of(obj.user_id))]['downloads'] += 1
+        elif isinstance(obj, User):
+            increments[(_day(obj.created_at), obj.institution or '')]['new_users'] += 1
+
+    if increments:
+        record_usage(session.connection(), increments)
+
+def backfill_daily_usage(since=None):
+    """Rebuild rollup rows from the raw tables, optionally from a start date on
+
+    Returns the number of DailyUsage rows written. Intended for initial
+    population and repair; run it while the application is quiet.
+    """
+    since_dt = datetime(since.year, since.month, since.day) if since else None
+    increments = new_increments()
+
+    sources = [
+        ('submissions', TechnologySubmission.submitted_at, func.count(TechnologySubmission.id),
+         TechnologySubmission, TechnologySubmission.user_id, []),
+        ('analyses', AnalysisRun.created_at, func.count(AnalysisRun.id),
+         AnalysisRun, TechnologySubmission.user_id, [AnalysisRun.succeeded.is_(True)]),
+        # Completed before analysis runs were recorded
+        ('analyses', TechnologySubmission.analyzed_at, func.count(TechnologySubmission.id),
+         TechnologySubmission, TechnologySubmission.user_id,
+         [TechnologySubmission.analysis_status == 'Completed',
+          TechnologySubmission.analyzed_at.isnot(None),
+          ~TechnologySubmission.analysis_runs.any()]),
+        ('downloads', DownloadHistory.downloaded_at, func.count(DownloadHistory.id),
+         DownloadHistory, DownloadHistory.user_id, []),
+        ('credits_spent', CreditHistory.created_at, func.sum(-CreditHistory.amount),
+         CreditHistory, CreditHistory.user_id, [CreditHistory.amount < 0]),
+    ]
+
+    for counter, timestamp, aggregate, model, user_id, criteria in sources:
+        query = db.session.query(func.date(timestamp), User.institution, aggregate).select_from(model)
+        if model is AnalysisRun:
+            query = query.join(TechnologySubmission, TechnologySubmission.id == AnalysisRun.submission_id)
+        query = query.join(User, User.id == user_id).filter(*criteria)
+        if since_dt:
+            query = query.filter(timestamp >= since_dt)
+        for day, institution, n in query.group_by(func.date(timestamp), User.institution):
+            increments[(_as_date(day), institution or '')][counter] += int(n or 0)
+
+    query = db.session.query(func.date(User.created_at), User.institution, func.count(User.id))
+    if since_dt:
+        query = query.filter(User.created_at >= since_dt)
+    for day, institution, n in query.group_by(func.date(User.created_at), User.institution):
+        increments[(_as_date(day), institution or '')]['new_users'] += n
+
+    stale = delete(DailyUsage)
+    if since:
+        stale = stale.where(DailyUsage.day >= since)
+    db.session.execute(stale)
+
+    rows = [dict(day=day, institution=institution, **{name: counts.get(name, 0) for name in COUNTERS})
+            for (day, institution), counts in increments.items() if day is not None]
+    if rows:
+        db.session.execute(insert(DailyUsage), rows)
+    db.session.commit()
+    return len(rows)
+
+def _as_date(value):
+    # func.date() yields a date on PostgreSQL and an ISO string on SQLite
+    if value is None or isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
@@ -0,0 +1,211 @@
+"""
+Full-Text Search Utility for Technology Submissions
+
+PostgreSQL uses a generated, weighted tsvector column with a GIN index;
+SQLite uses an external-content FTS5 table kept in sync by triggers. Both
+are created alongside the submissions table and can be (re)built with
+'flask search init'.
+"""
+
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import DDL, event, text, or_
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import TechnologySubmission
+
+# Highlight delimiters, swapped for <mark> tags after the text is escaped
+HL_START = '⟦'
+HL_STOP = '⟧'
+
+TS_CONFIG = 'english'
+
+POSTGRES_DDL = [
+    f"""ALTER TABLE technology_submission ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('{TS_CONFIG}', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('{TS_CONFIG}', coalesce(claims, '')), 'B') ||
+            setweight(to_tsvector('{TS_CONFIG}', coalesce(inventors, '')), 'B') ||
+            setweight(to_tsvector('{TS_CONFIG}', coalesce(description, '')), 'C')
+        ) STORED""",
+    """CREATE INDEX IF NOT EXISTS ix_technology_submission_search_vector
+        ON technology_submission USING GIN (search_vector)""",
+]
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS technology_submission_fts USING fts5(
+        title, description, claims, inventors,
+        content='technology_submission', content_rowid='id',
+        tokenize='porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS technology_submission_fts_ai
+        AFTER INSERT ON technology_submission BEGIN
+            INSERT INTO technology_submission_fts(rowid, title, description, claims, inventors)
+            VALUES (new.id, new.title, new.description, new.claims, new.inventors);
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS technology_submission_fts_ad
+        AFTER DELETE ON technology_submission BEGIN
+            INSERT INTO technology_submission_fts(technology_submission_fts, rowid, title, description, claims, inventors)
+            VALUES ('delete', old.id, old.title, old.description, old.claims, old.inventors);
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS technology_submission_fts_au
+        AFTER UPDATE OF title, description, claims, inventors ON technology_submission BEGIN
+            INSERT INTO technology_submission_fts(technology_submission_fts, rowid, title, description, claims, inventors)
+            VALUES ('delete', old.id, old.title, old.description, old.claims, old.inventors);
+            INSERT INTO technology_submission_fts(rowid, title, description, claims, inventors)
+            VALUES (new.id, new.title, new.description, new.claims, new.inventors);
+        END""",
+]
+
+for _statement in POSTGRES_DDL:
+    event.listen(TechnologySubmission.__table__, 'after_create',
+                 DDL(_statement).execute_if(dialect='postgresql'))
+for _statement in SQLITE_DDL:
+    event.listen(TechnologySubmission.__table__, 'after_create',
+                 DDL(_statement).execute_if(dialect='sqlite'))
+
+class SearchHit:
+    """A ranked search result with highlighted title and description snippet"""
+
+    def __init__(self, submission, rank, title_html, snippet_html):
+        self.submission = submission
+        self.rank = rank
+        self.title_html = title_html
+        self.snippet_html = snippet_html
+
+class SearchResults:
+    """One page of search hits"""
+
+    def __init__(self, query, hits, page, per_page, has_next):
+        self.query = query
+        self.items = hits
+        self.page = page
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = page > 1
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+def init_search_index():
+    """Create the search structures if missing and index existing rows"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        # The generated column populates itself for existing rows
+        for statement in POSTGRES_DDL:
+            db.session.execute(text(statement))
+    elif dialect == 'sqlite':
+        for statement in SQLITE_DDL:
+            db.session.execute(text(statement))
+        db.session.execute(text(
+            "INSERT INTO technology_submission_fts(technology_submission_fts) VALUES ('rebuild')"))
+    db.session.commit()
+
+def search_submissions(query, user_id=None, page=1, per_page=20):
+    """Full-text search over title, description, claims and inventors
+
+    Results are ranked by relevance; pass user_id to restrict the search to
+    one user's submissions.
+    """
+    query = (query or '').strip()
+    page = max(page, 1)
+    if not query:
+        return SearchResults(query, [], page, per_page, False)
+
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        rows = _search_postgres(query, user_id, page, per_page)
+    elif dialect == 'sqlite':
+        rows = _search_sqlite(query, user_id, page, per_page)
+    else:
+        rows = _search_fallback(query, user_id, page, per_page)
+
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    submissions = {s.id: s for s in TechnologySubmission.query
+                   .options(joinedload(TechnologySubmission.author))
+                   .filter(TechnologySubmission.id.in_([row[0] for row in rows]))} if rows else {}
+    hits = [
+        SearchHit(submissions[id], rank, _highlight(title), _highlight(snippet))
+        for id, rank, title, snippet in rows if id in submissions
+    ]
+    return SearchResults(query, hits, page, per_page, has_next)
+
+def _search_postgres(query, user_id, page, per_page):
+    user_filter = 'AND s.user_id = :user_id' if user_id is not None else ''
+    # Rank and limit first so ts_headline only runs on the rows being shown
+    statement = text(f"""
+        WITH q AS (SELECT websearch_to_tsquery('{TS_CONFIG}', :query) AS query),
+        hits AS (
+            SELECT s.id, s.title, s.description, ts_rank_cd(s.search_vector, q.query) AS rank
+            FROM technology_submission s, q
+            WHERE s.search_vector @@ q.query {user_filter}
+            ORDER BY rank DESC, s.id DESC
+            LIMIT :limit OFFSET :offset
+        )
+        SELECT hits.id, hits.rank,
+               ts_headline('{TS_CONFIG}', hits.title, q.query, :title_options),
+               ts_headline('{TS_CONFIG}', hits.description, q.query, :snippet_options)
+        FROM hits, q
+        ORDER BY hits.rank DESC, hits.id DESC
+    """)
+    return db.session.execute(statement, {
+        'query': query,
+        'user_id': user_id,
+        'limit': per_page + 1,
+        'offset': (page - 1) * per_page,
+        'title_options': f'StartSel={HL_START}, StopSel={HL_STOP}, HighlightAll=TRUE',
+        'snippet_options': f'StartSel={HL_START}, StopSel={HL_STOP}, MaxFragments=2, '
+                           f'MaxWords=30, MinWords=10, FragmentDelimiter=" … "',
+    }).all()
+
+def _search_sqlite(query, user_id, page, per_page):
+    match = _fts5_query(query)
+    if not match:
+        return []
+    user_filter = 'AND s.user_id = :user_id' if user_id is not None else ''
+    # bm25() weights mirror the PostgreSQL setweight() classes; lower is better
+    statement = text(f"""
+        SELECT s.id,
+               -bm25(technology_submission_fts, 10.0, 1.0, 4.0, 4.0) AS rank,
+               highlight(technology_submission_fts, 0, :start, :stop),
+               snippet(technology_submission_fts, 1, :start, :stop, ' … ', 24)
+        FROM technology_submission_fts
+        JOIN technology_submission s ON s.id = technology_submission_fts.rowid
+        WHERE technology_submission_fts MATCH :match {user_filter}
+        ORDER BY rank DESC, s.id DESC
+        LIMIT :limit OFFSET :offset
+    """)
+    return db.session.execute(statement, {
+        'match': match,
+        'user_id': user_id,
+        'start': HL_START,
+        'stop': HL_STOP,
+        'limit': per_page + 1,
+        'offset': (page - 1) * per_page,
+    }).all()
+
+def _search_fallback(query, user_id, page, per_page):
+    pattern = f'%{query}%'
+    columns = (TechnologySubmission.title, TechnologySubmission.description,
+               TechnologySubmission.claims, TechnologySubmission.inventors)
+    q = TechnologySubmission.query.filter(or_(*[column.ilike(pattern) for column in columns]))
+    if user_id is not None:
+        q = q.filter_by(user_id=user_id)
+    submissions = q.order_by(TechnologySubmission.id.desc()) \
+        .limit(per_page + 1).offset((page - 1) * per_page).all()
+    return [(s.id, 0.0, s.title, s.description[:200]) for s in submissions]
+
+def _fts5_query(query):
+    """Turn free text into a safe FTS5 expression (all terms, quoted)"""
+    terms = re.findall(r'\w+', query)
+    return ' '.join(f'"{term}"' for term in terms)
+
+def _highlight(value):
+    """Escape stored text and turn highlight delimiters into <mark> tags"""
+    if value is None:
+        return Markup('')
+    return Markup(str(escape(value)).replace(HL_START, '<mark>').replace(HL_STOP, '</mark>'))
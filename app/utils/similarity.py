@@ -0,0 +1,173 @@
+"""
+Prior Art Similarity Scoring Utility
+
+Scores each prior art entry against the text of its submission with TF-IDF
+cosine similarity and sorts the report by that score. Many submissions are
+scored in one batched sparse-matrix computation: every submission's query
+and prior art entries are rows of a single matrix, and document frequencies
+are counted per submission so a score never depends on what else was in
+the batch.
+"""
+
+import json
+import re
+import numpy as np
+from scipy import sparse
+from sqlalchemy import update
+from app import db
+from app.models import TechnologySubmission
+
+SCORING_METHOD = 'tfidf-cosine'
+SCORING_VERSION = 1
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can for from has have in into is it its of on or
+such that the their these this those to was were which while with within without
+your you our we they system method using based use used provides provide
+""".split())
+
+def tokenize(text):
+    """Lowercased word tokens without stopwords and single characters"""
+    return [token for token in TOKEN_RE.findall((text or '').lower())
+            if len(token) > 1 and token not in STOPWORDS]
+
+def submission_text(submission):
+    """Text a submission's prior art is compared against"""
+    return ' '.join(part for part in (submission.title, submission.description, submission.claims) if part)
+
+def entry_text(entry):
+    """Text of one prior art entry"""
+    return f"{entry.get('title') or ''} {entry.get('summary') or ''}"
+
+def score_batch(items):
+    """Score many (query_text, prior_art_entries) pairs at once
+
+    Returns one NumPy array of cosine similarities (0..1) per pair, in the
+    order of its entries.
+    """
+    vocabulary = {}
+    rows, cols, counts = [], [], []
+    groups, query_rows = [], []
+
+    def add_document(text, group):
+        row = len(groups)
+        groups.append(group)
+        term_counts = {}
+        for token in tokenize(text):
+            column = vocabulary.setdefault(token, len(vocabulary))
+            term_counts[column] = term_counts.get(column, 0) + 1
+        rows.extend([row] * len(term_counts))
+        cols.extend(term_counts.keys())
+        counts.extend(term_counts.values())
+        return row
+
+    entry_rows = []
+    for group, (query, entries) in enumerate(items):
+        query_row = add_document(query, group)
+        for entry in entries:
+            entry_rows.append(add_document(entry_text(entry), group))
+            query_rows.append(query_row)
+
+    if not entry_rows or not vocabulary:
+        return [np.zeros(len(entries)) for _, entries in items]
+
+    n_docs, n_groups = len(groups), len(items)
+    shape = (n_docs, len(vocabulary))
+    groups = np.asarray(groups)
+    rows, cols = np.asarray(rows), np.asarray(cols)
+    counts = np.asarray(counts, dtype=np.float64)
+
+    # Document frequency of each term within each submission's own documents
+    membership = sparse.csr_matrix(
+        (np.ones(n_docs), (groups, np.arange(n_docs))), shape=(n_groups, n_docs))
+    presence = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=shape)
+    document_frequency = (membership @ presence).tocsr()
+    documents_per_group = np.bincount(groups, minlength=n_groups)
+
+    # Sublinear TF times smoothed IDF, then L2-normalize every row
+    term_groups = groups[rows]
+    df = np.asarray(document_frequency[term_groups, cols]).ravel()
+    idf = np.log((1 + documents_per_group[term_groups]) / (1 + df)) + 1
+    weights = sparse.csr_matrix(((1 + np.log(counts)) * idf, (rows, cols)), shape=shape)
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    weights = sparse.diags(1 / norms) @ weights
+
+    # Row-wise dot product of each entry with its submission's query
+    similarities = np.asarray(
+        weights[entry_rows].multiply(weights[query_rows]).sum(axis=1)).ravel()
+
+    scores, offset = [], 0
+    for _, entries in items:
+        scores.append(similarities[offset:offset + len(entries)])
+        offset += len(entries)
+    return scores
+
+def apply_scores(results, scores):
+    """Store scores on the prior art entries and sort the report by them"""
+    report = results.get('prior_art_report') or []
+    for entry, score in zip(report, scores):
+        entry['similarity_score'] = round(float(score) * 100, 1)
+    # Stable sort keeps the model's order among equal scores
+    results['prior_art_report'] = sorted(report, key=lambda entry: -entry.get('similarity_score', 0))
+    results['scoring'] = {'method': SCORING_METHOD, 'version': SCORING_VERSION}
+    return results
+
+def rank_prior_art(submission, results):
+    """Score and sort one submission's analysis results in place"""
+    if not results or not results.get('prior_art_report'):
+        return results
+    scores = score_batch([(submission_text(submission), results['prior_art_report'])])[0]
+    return apply_scores(results, scores)
+
+def rank_many(pairs):
+    """Score and sort the results of many (submission, results) pairs"""
+    pairs = [(submission, results) for submission, results in pairs
+             if results and results.get('prior_art_report')]
+    all_scores = score_batch([(submission_text(submission), results['prior_art_report'])
+                              for submission, results in pairs])
+    for (_, results), scores in zip(pairs, all_scores):
+        apply_scores(results, scores)
+    return [results for _, results in pairs]
+
+def rescore_submissions(batch_size=500, rescore_all=False, progress=None):
+    """Backfill similarity scores of completed analyses; returns the number updated
+
+    Walks completed submissions by id in batches, scores each batch in one
+    computation and writes it back with a bulk UPDATE. Unless rescore_all is
+    set, results already scored with the current SCORING_VERSION are skipped.
+    """
+    updated, last_id = 0, 0
+    while True:
+        rows = db.session.query(
+            TechnologySubmission.id, TechnologySubmission.title, TechnologySubmission.description,
+            TechnologySubmission.claims, TechnologySubmission.analysis_results
+        ).filter(TechnologySubmission.analysis_status == 'Completed',
+                 TechnologySubmission.analysis_results.isnot(None),
+                 TechnologySubmission.id > last_id) \
+         .order_by(TechnologySubmission.id).limit(batch_size).all()
+        if not rows:
+            return updated
+        last_id = rows[-1].id
+
+        pairs = []
+        for row in rows:
+            results = json.loads(row.analysis_results)
+            if not results or not results.get('prior_art_report'):
+                continue
+            if not rescore_all and (results.get('scoring') or {}).get('version') == SCORING_VERSION:
+                continue
+            pairs.append((row, results))
+
+        if pairs:
+            rank_many(pairs)
+            db.session.execute(update(TechnologySubmission), [
+                {'id': row.id, 'analysis_results': json.dumps(results)} for row, results in pairs
+            ])
+            db.session.commit()
+            updated += len(pairs)
+
+        if progress:
+            progress(last_id, updated)
@@ -0,0 +1,93 @@
+"""
+Startup Utility
+
+Keeps cold starts fast. Heavy libraries (WeasyPrint, the document parsers,
+requests, NumPy/SciPy) are imported on first use rather than when the app
+is created. This module can preload them on a background thread once the
+first response has been sent, and measures the import cost of create_app()
+against a budget with python -X importtime.
+"""
+
+import importlib
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+HEAVY_MODULES = (
+    'weasyprint',
+    'PyPDF2',
+    'docx',
+    'magic',
+    'requests',
+    'numpy',
+    'scipy.sparse',
+    'app.utils.similarity',
+)
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)')
+
+def init_app(app):
+    """Preload HEAVY_MODULES after this process has sent its first response"""
+    started = threading.Event()
+
+    @app.after_request
+    def _schedule_warmup(response):
+        if not started.is_set():
+            started.set()
+            response.call_on_close(lambda: _start_preload(app))
+        return response
+
+def _start_preload(app):
+    threading.Thread(target=preload_heavy_modules, args=(app,), name='warmup', daemon=True).start()
+
+def preload_heavy_modules(app=None):
+    """Import HEAVY_MODULES; returns the seconds spent"""
+    started = time.perf_counter()
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:  # e.g. WeasyPrint without its system libraries
+            if app is not None:
+                app.logger.warning(f"Warm-up import of {name} failed: {str(e)}")
+    elapsed = time.perf_counter() - started
+    if app is not None:
+        app.logger.info(f"Warm-up imports finished in {elapsed:.2f}s")
+    return elapsed
+
+def measure_import_time(config_name=None):
+    """Import cost of creating the app, measured in a fresh interpreter
+
+    Returns {'total_ms', 'top': [(module, cumulative_ms)], 'heavy_loaded': [...]}.
+    """
+    code = (
+        'import sys\n'
+        'from app import create_app\n'
+        f'create_app({config_name!r})\n'
+        f'print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n'
+    )
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=project_root, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'create_app() failed:\n{result.stderr[-2000:]}')
+
+    top_level = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        # Only top-level imports, so nested modules are not counted twice
+        if match and not match.group(3):
+            top_level.append((match.group(4), int(match.group(2)) / 1000))
+    # Skip what the interpreter imports before running our code (site, encodings, ...)
+    names = [name for name, _ in top_level]
+    if 'app' in names:
+        top_level = top_level[names.index('app'):]
+
+    loaded = result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ''
+    return {
+        'total_ms': round(sum(ms for _, ms in top_level), 1),
+        'top': sorted(top_level, key=lambda item: -item[1])[:15],
+        'heavy_loaded': [name for name in loaded.split(',') if name]
+    }
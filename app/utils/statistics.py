@@ -3,56 +3,101 @@ Statistics and Analytics Utility
 """
 
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_
+from flask import current_app
+from sqlalchemy import func, case
 from app import db
-from app.models import User, TechnologySubmission, CreditHistory, AuditLog
+from app.models import User, TechnologySubmission, DailyUsage
+from app.utils.cache import StaleWhileRevalidateCache
+
+stats_cache = StaleWhileRevalidateCache()
 
 def get_dashboard_stats():
     """Get comprehensive dashboard statistics"""
+    app = current_app._get_current_object()
 
-    # User statistics
-    total_users = User.query.count()
-    active_users = User.query.filter_by(status='Active').count()
-    pending_users = User.query.filter_by(status='Pending').count()
-    vip_users = User.query.filter_by(role='VIP').count()
-    admin_users = User.query.filter_by(role='Admin').count()
+    def load():
+        with app.app_context():
+            return compute_dashboard_stats()
 
-    # Submission statistics
-    total_submissions = TechnologySubmission.query.count()
-    completed_analyses = TechnologySubmission.query.filter_by(analysis_status='Completed').count()
-    pending_analyses = TechnologySubmission.query.filter_by(analysis_status='Pending').count()
+    return stats_cache.get('dashboard', load,
+                           ttl=app.config.get('DASHBOARD_STATS_TTL', 60),
+                           stale_ttl=app.config.get('DASHBOARD_STATS_STALE_TTL', 300))
 
-    # Time-based statistics
-    today = datetime.utcnow().date()
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    month_ago = datetime.utcnow() - timedelta(days=30)
+def compute_dashboard_stats():
+    """Compute dashboard statistics with one aggregate query per table"""
 
-    submissions_today = TechnologySubmission.query.filter(
-        func.date(TechnologySubmission.submitted_at) == today
-    ).count()
+    # Time-based boundaries as half-open ranges so indexes on the timestamps stay usable
+    now = datetime.utcnow()
+    today_start = datetime(now.year, now.month, now.day)
+    tomorrow_start = today_start + timedelta(days=1)
+    week_ago = now - timedelta(days=7)
 
-    submissions_this_week = TechnologySubmission.query.filter(
-        TechnologySubmission.submitted_at >= week_ago
-    ).count()
+    # User statistics
+    users = db.session.query(
+        func.count(User.id).label('total'),
+        func.count(case((User.status == 'Active', 1))).label('active'),
+        func.count(case((User.status == 'Pending', 1))).label('pending'),
+        func.count(case((User.role == 'VIP', 1))).label('vip'),
+        func.count(case((User.role == 'Admin', 1))).label('admin'),
+        func.count(case((User.created_at >= week_ago, 1))).label('new_this_week')
+    ).one()
 
-    new_users_this_week = User.query.filter(
-        User.created_at >= week_ago
-    ).count()
+    # Submission statistics
+    submitted_at = TechnologySubmission.submitted_at
+    submissions = db.session.query(
+        func.count(TechnologySubmission.id).label('total'),
+        func.count(case((TechnologySubmission.analysis_status == 'Completed', 1))).label('completed'),
+        func.count(case((TechnologySubmission.analysis_status == 'Pending', 1))).label('pending'),
+        func.count(case(((submitted_at >= today_start) & (submitted_at < tomorrow_start), 1))).label('today'),
+        func.count(case((submitted_at >= week_ago, 1))).label('this_week')
+    ).one()
 
     return {
         'users': {
-            'total': total_users,
-            'active': active_users,
-            'pending': pending_users,
-            'vip': vip_users,
-            'admin': admin_users,
-            'new_this_week': new_users_this_week
+            'total': users.total,
+            'active': users.active,
+            'pending': users.pending,
+            'vip': users.vip,
+            'admin': users.admin,
+            'new_this_week': users.new_this_week
         },
         'submissions': {
-            'total': total_submissions,
-            'completed': completed_analyses,
-            'pending': pending_analyses,
-            'today': submissions_today,
-            'this_week': submissions_this_week
+            'total': submissions.total,
+            'completed': submissions.completed,
+            'pending': submissions.pending,
+            'today': submissions.today,
+            'this_week': submissions.this_week
         }
     }
+
+def get_usage_trends(days=30, institution=None):
+    """Daily usage series for the last N days, read from the rollup table"""
+    start = datetime.utcnow().date() - timedelta(days=days - 1)
+
+    query = db.session.query(
+        DailyUsage.day,
+        func.sum(DailyUsage.submissions),
+        func.sum(DailyUsage.analyses),
+        func.sum(DailyUsage.downloads),
+        func.sum(DailyUsage.credits_spent),
+        func.sum(DailyUsage.new_users)
+    ).filter(DailyUsage.day >= start)
+
+    if institution is not None:
+        query = query.filter(DailyUsage.institution == institution)
+
+    rows = {row[0]: row[1:] for row in query.group_by(DailyUsage.day)}
+
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        counts = rows.get(day, (0, 0, 0, 0, 0))
+        series.append({
+            'day': day.isoformat(),
+            'submissions': int(counts[0] or 0),
+            'analyses': int(counts[1] or 0),
+            'downloads': int(counts[2] or 0),
+            'credits_spent': int(counts[3] or 0),
+            'new_users': int(counts[4] or 0)
+        })
+    return series
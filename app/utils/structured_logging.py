@@ -0,0 +1,154 @@
+"""
+Structured Logging Utility
+
+Application log records are handed to a queue on the request thread and
+written by a background QueueListener, so a slow disk or stdout pipe never
+delays a response. Records are written as one JSON object per line and
+carry the request id, user id and, for the per-request line, the duration.
+
+LOG_DESTINATION selects stdout (for Render, which collects stdout) or a
+file under logs/ rotated by size (LOG_ROTATION=size), by time
+(LOG_ROTATION=time) or externally by logrotate (LOG_ROTATION=external).
+Several gunicorn workers must not rotate the same file themselves; use
+stdout or external rotation there.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import (QueueHandler, QueueListener, RotatingFileHandler,
+                              TimedRotatingFileHandler, WatchedFileHandler)
+from flask import g, request, has_request_context
+from flask.logging import default_handler
+
+# Attributes every LogRecord has; anything else was passed with extra= and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_pipeline = {}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': f'{record.module}:{record.lineno}',
+            'process': record.process,
+        }
+        entry.update({key: value for key, value in vars(record).items()
+                      if key not in _RECORD_ATTRIBUTES and value is not None})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class RequestContextFilter(logging.Filter):
+    """Add request_id and user_id to records logged while handling a request"""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            # Only an already loaded user; looking it up here could run a query
+            record.user_id = getattr(g.get('_login_user'), 'id', None)
+        return True
+
+class _RenderingQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener
+
+    The message and traceback are rendered to strings here, since the
+    listener must not touch request-thread objects, but the record keeps its
+    fields so the JSON formatter can still write them separately.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def configure_logging(app):
+    """Send app.logger through the queue to the configured destination"""
+    level = getattr(logging, app.config.get('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+
+    if 'queue_handler' not in _pipeline:
+        handler = _destination_handler(app.config)
+        handler.setFormatter(JsonFormatter() if app.config.get('LOG_FORMAT', 'json') == 'json'
+                             else logging.Formatter('%(asctime)s %(levelname)s: %(message)s '
+                                                    '[in %(pathname)s:%(lineno)d]'))
+        queue_handler = _RenderingQueueHandler(queue.SimpleQueue())
+        queue_handler.addFilter(RequestContextFilter())
+        _pipeline.update(handler=handler, queue_handler=queue_handler)
+        _start_listener()
+        atexit.register(_stop_listener)
+        if hasattr(os, 'register_at_fork'):
+            # The listener thread does not survive a fork (gunicorn preload)
+            os.register_at_fork(after_in_child=_restart_listener)
+
+    app.logger.removeHandler(default_handler)
+    if _pipeline['queue_handler'] not in app.logger.handlers:
+        app.logger.addHandler(_pipeline['queue_handler'])
+    app.logger.setLevel(level)
+
+    if app.config.get('LOG_REQUESTS', True):
+        app.before_request(_start_request)
+        app.after_request(_log_request)
+
+def _destination_handler(config):
+    if config.get('LOG_DESTINATION', 'file') == 'stdout':
+        return logging.StreamHandler(sys.stdout)
+
+    path = config.get('LOG_FILE') or os.path.join('logs', 'mmsu_prior_art.log')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    rotation = config.get('LOG_ROTATION', 'size')
+    if rotation == 'time':
+        return TimedRotatingFileHandler(path, when=config.get('LOG_ROTATE_WHEN', 'midnight'),
+                                        backupCount=config.get('LOG_BACKUP_COUNT', 10), utc=True)
+    if rotation == 'external':
+        return WatchedFileHandler(path)
+    return RotatingFileHandler(path, maxBytes=config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+                               backupCount=config.get('LOG_BACKUP_COUNT', 10))
+
+def _start_listener():
+    listener = QueueListener(_pipeline['queue_handler'].queue, _pipeline['handler'],
+                             respect_handler_level=True)
+    listener.start()
+    _pipeline['listener'] = listener
+
+def _stop_listener():
+    listener = _pipeline.pop('listener', None)
+    if listener is not None:
+        listener.stop()  # flushes what is still queued
+
+def _restart_listener():
+    # A fresh queue: the parent's may have been locked mid-put when it forked
+    _pipeline['queue_handler'].queue = queue.SimpleQueue()
+    _start_listener()
+
+def _start_request():
+    g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+    g.request_started = time.perf_counter()
+
+def _log_request(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    response.headers.setdefault('X-Request-ID', g.request_id)
+    logging.getLogger('app.requests').info(
+        f'{request.method} {request.path} {response.status_code}',
+        extra={'method': request.method, 'path': request.path, 'endpoint': request.endpoint,
+               'status': response.status_code, 'remote_addr': request.remote_addr,
+               'duration_ms': round((time.perf_counter() - started) * 1000, 1)})
+    return response
@@ -0,0 +1,12 @@
+"""
+Benchmarks for the MMSU Prior Art Search Tool hot paths
+
+    python -m benchmarks                       # all cases, small scale
+    python -m benchmarks --scale medium --only analysis_flow --latency-ms 800 --error-rate 0.1
+    python -m benchmarks --compare benchmarks/results/baseline.json
+
+Runs against the 'benchmark' configuration: a scratch SQLite database in
+benchmarks/results/ (or BENCHMARK_DATABASE_URL, which is dropped and
+recreated) and a local fake Perplexity server. Results are written as JSON
+to benchmarks/results/ for run-to-run comparison.
+"""
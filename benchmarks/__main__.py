@@ -0,0 +1,75 @@
+"""
+Benchmark runner: python -m benchmarks --help
+"""
+
+import os
+import time
+import traceback
+from datetime import datetime
+import click
+from benchmarks.cases import CASES, SCALES
+from benchmarks.harness import environment, write_results, load_results, compare
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+@click.command()
+@click.option('--only', multiple=True, type=click.Choice(list(CASES)), help='Run only these cases (repeatable).')
+@click.option('--scale', type=click.Choice(list(SCALES)), default='small', show_default=True,
+              help='Document sizes, seeded table sizes and flow iterations.')
+@click.option('--repeat', type=int, default=5, show_default=True, help='Measured calls per timing.')
+@click.option('--flow-iterations', type=int, default=None, help='Submissions in the analysis flow (default by scale).')
+@click.option('--latency-ms', type=float, default=50, show_default=True, help='Fake Perplexity response delay.')
+@click.option('--jitter-ms', type=float, default=0, show_default=True, help='Uniform +/- variation of the delay.')
+@click.option('--error-rate', type=float, default=0.0, show_default=True, help='Share of failed Perplexity calls.')
+@click.option('--error-status', type=int, default=500, show_default=True, help='HTTP status of injected failures.')
+@click.option('--keep-db', is_flag=True, help='Reuse the benchmark database instead of recreating it.')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='Result file (default results/<time>.json).')
+@click.option('--compare', 'baseline_path', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Earlier result file to compare medians against.')
+def main(only, scale, repeat, flow_iterations, latency_ms, jitter_ms, error_rate, error_status,
+         keep_db, output, baseline_path):
+    """Time the hot paths and write the results as JSON."""
+    from app import create_app, db
+
+    app = create_app('benchmark')
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    with app.app_context():
+        if not keep_db:
+            db.drop_all()
+        db.create_all()
+
+    options = {'scale': scale, 'repeat': repeat, 'flow_iterations': flow_iterations,
+               'latency_ms': latency_ms, 'jitter_ms': jitter_ms, 'error_rate': error_rate,
+               'error_status': error_status}
+    results = {'environment': environment(), 'options': options, 'cases': {}}
+
+    for name in only or CASES:
+        click.echo(f'{name} ...', nl=False)
+        started = time.perf_counter()
+        try:
+            results['cases'].update(CASES[name](app, options))
+            click.echo(f' {time.perf_counter() - started:.1f}s')
+        except Exception as e:
+            results['cases'][name] = {'error': f'{type(e).__name__}: {str(e)[:500]}'}
+            click.echo(f' failed: {type(e).__name__}: {str(e)[:200]}')
+            if app.debug:
+                traceback.print_exc()
+
+    output = output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    write_results(output, results)
+
+    click.echo()
+    for name, result in results['cases'].items():
+        if 'error' in result:
+            click.echo(f'{name:45} error: {result["error"][:80]}')
+        else:
+            click.echo(f'{name:45} median {result["median_ms"]:10.2f} ms   p95 {result["p95_ms"]:10.2f} ms')
+    click.echo(f'Wrote {output}')
+
+    if baseline_path:
+        click.echo(f'\nMedian change against {baseline_path}:')
+        for name, before, after, change in compare(load_results(baseline_path), results):
+            click.echo(f'{name:45} {before:10.2f} -> {after:10.2f} ms  {change:+6.1f}%')
+
+if __name__ == '__main__':
+    main()
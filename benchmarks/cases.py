@@ -0,0 +1,198 @@
+"""
+Benchmark cases
+
+Every case takes the benchmark app and its options and returns
+{result_name: {...timings...}}. A case that cannot run here (e.g. WeasyPrint
+without its system libraries) reports {'error': ...} instead of timings.
+"""
+
+import json
+import os
+import random
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import insert, func
+from app import db
+from app.models import User, TechnologySubmission, AnalysisRun
+from benchmarks.documents import write_pdf, write_docx, sentences
+from benchmarks.fake_perplexity import FakePerplexity, completion
+from benchmarks.harness import measure, summarize
+
+SCALES = {
+    # pdf pages, docx paragraphs, seeded users, seeded submissions, flow iterations
+    'small': {'pdf_pages': (1, 10), 'docx_paragraphs': (10, 100), 'users': 1000, 'submissions': 5000, 'flow': 5},
+    'medium': {'pdf_pages': (1, 10, 50), 'docx_paragraphs': (10, 100, 500), 'users': 10000,
+               'submissions': 50000, 'flow': 20},
+    'large': {'pdf_pages': (1, 10, 50, 200), 'docx_paragraphs': (10, 100, 500, 2000), 'users': 50000,
+              'submissions': 250000, 'flow': 50},
+}
+
+def extract_text(app, options):
+    """extract_text_from_file on generated PDFs and DOCX files"""
+    from app.utils.file_handler import extract_text_from_file
+
+    scale = SCALES[options['scale']]
+    workdir = app.config['UPLOAD_FOLDER']
+    results = {}
+    with app.app_context():
+        files = [(f'pdf.{pages}_pages', write_pdf(os.path.join(workdir, f'bench_{pages}p.pdf'), pages))
+                 for pages in scale['pdf_pages']]
+        files += [(f'docx.{count}_paragraphs', write_docx(os.path.join(workdir, f'bench_{count}.docx'), count))
+                  for count in scale['docx_paragraphs']]
+        for name, path in files:
+            characters = len(extract_text_from_file(path))
+            results[f'extract_text.{name}'] = {
+                **measure(lambda: extract_text_from_file(path), repeat=options['repeat']),
+                'bytes': os.path.getsize(path),
+                'characters': characters
+            }
+    return results
+
+def pdf_report(app, options):
+    """generate_pdf_report for a completed submission"""
+    from app.utils.pdf_generator import generate_pdf_report
+
+    with app.app_context():
+        user = _benchmark_user()
+        submission = TechnologySubmission(
+            title='Solar-powered soil moisture controlled irrigation valve',
+            description=' '.join(sentences(12)), claims=' '.join(sentences(6, seed=1)),
+            institution='Mariano Marcos State University', user_id=user.id,
+            analysis_status='Completed', analyzed_at=datetime.utcnow())
+        submission.generate_serial_number()
+        submission.set_results(_analysis_for(submission))
+        db.session.add(submission)
+        db.session.commit()
+
+        def render():
+            os.unlink(generate_pdf_report(submission))
+
+        return {'pdf_report.generate': measure(render, repeat=options['repeat'])}
+
+def dashboard_stats(app, options):
+    """compute_dashboard_stats (uncached) and get_dashboard_stats (cached) on seeded tables"""
+    from app.utils.statistics import compute_dashboard_stats, get_dashboard_stats, stats_cache
+
+    scale = SCALES[options['scale']]
+    with app.app_context():
+        seeded = _seed_tables(scale['users'], scale['submissions'])
+        app.config['DASHBOARD_STATS_TTL'] = 60
+        stats_cache.invalidate('dashboard')
+        return {
+            'dashboard_stats.compute': {**measure(compute_dashboard_stats, repeat=options['repeat']), **seeded},
+            'dashboard_stats.cached': {**measure(get_dashboard_stats, repeat=options['repeat'] * 20), **seeded}
+        }
+
+def analysis_flow(app, options):
+    """submit -> analyze -> results through the routes, against the fake Perplexity server"""
+    iterations = options['flow_iterations'] or SCALES[options['scale']]['flow']
+    fake = FakePerplexity(options['latency_ms'], options['jitter_ms'], options['error_rate'],
+                          options['error_status'], seed=0)
+    with fake:
+        app.config.update(PERPLEXITY_API_URL=fake.url, PERPLEXITY_API_KEY='benchmark')
+        with app.app_context():
+            user_id = _benchmark_user().id
+            first_run_id = db.session.query(func.coalesce(func.max(AnalysisRun.id), 0)).scalar()
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+
+        stages = {'submit': [], 'analyze': [], 'results': []}
+        titles = sentences(iterations, seed=7)
+        rng = random.Random(7)
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = client.post('/submit', data={
+                'title': next(titles)[:120],
+                'description': ' '.join(sentences(6, seed=rng.random())),
+                'claims': ' '.join(sentences(3, seed=rng.random()))
+            })
+            stages['submit'].append(_ms_since(started))
+            match = re.search(r'/analyze/(\d+)', response.headers.get('Location', ''))
+            if response.status_code != 302 or not match:
+                raise RuntimeError(f'Submit failed with status {response.status_code}')
+
+            started = time.perf_counter()
+            response = client.get(f'/analyze/{match.group(1)}')
+            stages['analyze'].append(_ms_since(started))
+            if response.status_code != 200:
+                raise RuntimeError(f'Analyze page returned status {response.status_code}')
+
+            started = time.perf_counter()
+            response = client.get(f'/results/{match.group(1)}')
+            stages['results'].append(_ms_since(started))
+            if response.status_code != 200:
+                raise RuntimeError(f'Results page returned status {response.status_code}')
+
+        with app.app_context():
+            sources = Counter(dict(db.session.query(AnalysisRun.source, func.count(AnalysisRun.id))
+                                   .filter(AnalysisRun.id > first_run_id)
+                                   .group_by(AnalysisRun.source).all()))
+
+    results = {f'analysis_flow.{stage}': summarize(samples) for stage, samples in stages.items()}
+    totals = [sum(stage_ms) for stage_ms in zip(*stages.values())]
+    results['analysis_flow.total'] = {
+        **summarize(totals),
+        'upstream': {'latency_ms': options['latency_ms'], 'jitter_ms': options['jitter_ms'],
+                     'error_rate': options['error_rate'], **fake.stats()},
+        'analysis_sources': dict(sources)
+    }
+    return results
+
+CASES = {
+    'extract_text': extract_text,
+    'pdf_report': pdf_report,
+    'dashboard_stats': dashboard_stats,
+    'analysis_flow': analysis_flow,
+}
+
+def _ms_since(started):
+    return (time.perf_counter() - started) * 1000
+
+def _benchmark_user():
+    user = User.query.filter_by(email='benchmark@mmsu.edu.ph').first()
+    if user is None:
+        user = User(email='benchmark@mmsu.edu.ph', name='Benchmark User', role='VIP', status='Active',
+                    institution='Mariano Marcos State University', disclaimer_accepted=True,
+                    disclaimer_accepted_at=datetime.utcnow())
+        db.session.add(user)
+        db.session.commit()
+    return user
+
+def _analysis_for(submission):
+    payload = {'messages': [{'role': 'user', 'content': f'Technology Title: {submission.title}'}]}
+    return json.loads(completion(payload)['choices'][0]['message']['content'])
+
+def _seed_tables(users, submissions, chunk_size=5000):
+    """Bulk-insert synthetic users and submissions unless the tables already hold that many"""
+    existing_users = db.session.query(func.count(User.id)).scalar()
+    existing_submissions = db.session.query(func.count(TechnologySubmission.id)).scalar()
+    rng = random.Random(42)
+    now = datetime.utcnow()
+
+    for offset in range(existing_users, users, chunk_size):
+        db.session.execute(insert(User), [
+            {'email': f'seed{number}@example.edu', 'name': f'Seed User {number}',
+             'role': rng.choice(('Regular', 'Regular', 'Regular', 'VIP')),
+             'status': rng.choice(('Active', 'Active', 'Pending', 'Inactive')),
+             'credits': 50, 'created_at': now - timedelta(days=rng.randint(0, 730))}
+            for number in range(offset, min(offset + chunk_size, users))
+        ])
+        db.session.commit()
+
+    user_ids = [user_id for user_id, in db.session.query(User.id)]
+    for offset in range(existing_submissions, submissions, chunk_size):
+        db.session.execute(insert(TechnologySubmission), [
+            {'title': f'Seeded technology {number}', 'description': 'Seeded for benchmarks.',
+             'user_id': rng.choice(user_ids), 'serial_number': f'MMSU-PA-BENCH-{number:08d}',
+             'analysis_status': rng.choice(('Completed', 'Completed', 'Completed', 'Pending', 'Failed')),
+             'submitted_at': now - timedelta(minutes=rng.randint(0, 60 * 24 * 730))}
+            for number in range(offset, min(offset + chunk_size, submissions))
+        ])
+        db.session.commit()
+
+    return {'users': max(users, existing_users), 'submissions': max(submissions, existing_submissions)}
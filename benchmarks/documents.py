@@ -0,0 +1,65 @@
+"""
+Generated upload fixtures
+
+PDF and DOCX files of a chosen size filled with patent-like prose, so text
+extraction can be timed without shipping binary fixtures.
+"""
+
+import random
+
+WORDS = ('system', 'method', 'apparatus', 'sensor', 'controller', 'moisture', 'rice', 'field',
+         'signal', 'threshold', 'valve', 'solar', 'module', 'data', 'network', 'wherein',
+         'comprising', 'configured', 'coupled', 'plurality', 'first', 'second', 'housing',
+         'temperature', 'feedback', 'irrigation', 'yield', 'sample', 'layer', 'substrate')
+
+def sentences(count, seed=0):
+    """Deterministic pseudo-technical sentences"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 18))]
+        yield ' '.join(words).capitalize() + '.'
+
+def write_pdf(path, pages, lines_per_page=45):
+    """Write a text PDF with the given number of pages (Helvetica, no dependencies)"""
+    objects = [None, None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_ids = []
+    text = sentences(pages * lines_per_page)
+    for _ in range(pages):
+        lines = [next(text)[:95].replace('\\', '').replace('(', '').replace(')', '')
+                 for _ in range(lines_per_page)]
+        stream = 'BT /F1 10 Tf 14 TL 50 790 Td ' + ' '.join(f'({line}) Tj T*' for line in lines) + ' ET'
+        stream = stream.encode('latin-1')
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % content_id)
+        page_ids.append(len(objects))
+    objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % page_id for page_id in page_ids), len(page_ids))
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    output += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+
+    with open(path, 'wb') as f:
+        f.write(output)
+    return path
+
+def write_docx(path, paragraphs):
+    """Write a DOCX with the given number of paragraphs"""
+    import docx
+
+    document = docx.Document()
+    document.add_heading('Technology Disclosure', level=1)
+    text = sentences(paragraphs * 4)
+    for _ in range(paragraphs):
+        document.add_paragraph(' '.join(next(text) for _ in range(4)))
+    document.save(path)
+    return path
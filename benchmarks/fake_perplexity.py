@@ -0,0 +1,171 @@
+"""
+Local Perplexity stand-in
+
+Answers chat completion requests the way api.perplexity.ai does, after a
+configurable delay, and fails a configurable share of them. Runs on a
+background thread inside the benchmark, or on its own:
+
+    python -m benchmarks.fake_perplexity --port 8765 --latency-ms 800 --error-rate 0.1
+    PERPLEXITY_API_URL=http://127.0.0.1:8765/chat/completions PERPLEXITY_API_KEY=x flask run
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import click
+
+TOPICS = ('sensor', 'irrigation', 'battery', 'composite', 'fermentation', 'drone', 'membrane',
+          'catalyst', 'polymer', 'antenna', 'enzyme', 'turbine')
+
+class FakePerplexity:
+    """Threaded HTTP server imitating the Perplexity chat completions API"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, error_status=500,
+                 host='127.0.0.1', port=0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.server = ThreadingHTTPServer((host, port), _handler_for(self))
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/chat/completions'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake-perplexity', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        return {'requests': self.requests, 'errors': self.errors}
+
+    def _plan(self):
+        """(delay_seconds, fail) for the next request"""
+        with self.lock:
+            self.requests += 1
+            delay = self.latency_ms + (self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0)
+            fail = self.random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return max(delay, 0) / 1000, fail
+
+def completion(payload):
+    """Chat completion response carrying a well-formed analysis for the request"""
+    messages = payload.get('messages') or [{}]
+    user_query = messages[-1].get('content', '')
+    match = re.search(r'Technology Title:\s*(.+)', user_query)
+    title = match.group(1).strip() if match else 'Submitted technology'
+    incremental = 'Revised Claims:' in user_query
+
+    analysis = {
+        'patentability_analysis': {
+            'novelty': f'The combination described in "{title}" is not disclosed by a single reference.',
+            'inventive_step': 'Several elements appear in the prior art, but not arranged for this purpose.',
+            'industrial_applicability': 'The technology can be manufactured and used in agriculture and industry.'
+        },
+        'recommendations': {
+            'improvement_suggestions': 'Narrow the independent claim to the control method and add field data.',
+            'patent_filing_advice': 'Consult the MMSU Patent Agent before any public disclosure.'
+        }
+    }
+    if not incremental:
+        analysis['prior_art_report'] = [
+            {
+                'title': f'{TOPICS[i % len(TOPICS)].title()} system related to {title}',
+                'summary': f'A {TOPICS[i % len(TOPICS)]} based apparatus with automated monitoring and control.',
+                'similarities': f'Both use a {TOPICS[i % len(TOPICS)]} with sensors and a controller.',
+                'differences': 'The reference targets a different field and lacks the claimed feedback loop.'
+            }
+            for i in range(10)
+        ]
+
+    content = json.dumps(analysis)
+    prompt_tokens = sum(len(message.get('content', '')) for message in messages) // 4
+    return {
+        'id': f'fake-{time.time_ns()}',
+        'model': payload.get('model', 'fake'),
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'choices': [{'index': 0, 'finish_reason': 'stop',
+                     'message': {'role': 'assistant', 'content': content}}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(content) // 4,
+                  'total_tokens': prompt_tokens + len(content) // 4}
+    }
+
+def _handler_for(fake):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            delay, fail = fake._plan()
+            time.sleep(delay)
+
+            if fail:
+                self._send(fake.error_status, {'error': {'message': 'Injected failure', 'code': fake.error_status}})
+                return
+            try:
+                payload = json.loads(body or b'{}')
+            except ValueError:
+                self._send(400, {'error': {'message': 'Invalid JSON body'}})
+                return
+            self._send(200, completion(payload))
+
+        def _send(self, status, document):
+            data = json.dumps(document).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            if status == 429:
+                self.send_header('Retry-After', '1')
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+@click.command()
+@click.option('--host', default='127.0.0.1')
+@click.option('--port', type=int, default=8765)
+@click.option('--latency-ms', type=float, default=0, help='Delay before every response.')
+@click.option('--jitter-ms', type=float, default=0, help='Uniform +/- variation of the delay.')
+@click.option('--error-rate', type=float, default=0.0, help='Share of requests that fail (0..1).')
+@click.option('--error-status', type=int, default=500, help='HTTP status of injected failures.')
+def main(host, port, latency_ms, jitter_ms, error_rate, error_status):
+    """Serve the fake Perplexity API until interrupted."""
+    fake = FakePerplexity(latency_ms, jitter_ms, error_rate, error_status, host=host, port=port)
+    click.echo(f'Fake Perplexity listening on {fake.url}')
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.server.server_close()
+        click.echo(f'Served {fake.requests} requests, {fake.errors} injected errors')
+
+if __name__ == '__main__':
+    main()
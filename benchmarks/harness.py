@@ -0,0 +1,74 @@
+"""
+Benchmark timing, result files and comparison
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+def measure(fn, repeat=5, warmup=1):
+    """Call fn() warmup + repeat times; timing statistics of the measured calls in ms"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+def summarize(samples):
+    """min/median/p90/p95/p99/mean/max of a list of milliseconds"""
+    ordered = sorted(samples)
+    return {
+        'runs': len(ordered),
+        'min_ms': round(ordered[0], 3),
+        'median_ms': round(statistics.median(ordered), 3),
+        'p90_ms': round(_nearest_rank(ordered, 90), 3),
+        'p95_ms': round(_nearest_rank(ordered, 95), 3),
+        'p99_ms': round(_nearest_rank(ordered, 99), 3),
+        'mean_ms': round(statistics.fmean(ordered), 3),
+        'max_ms': round(ordered[-1], 3)
+    }
+
+def _nearest_rank(ordered, pct):
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+def environment():
+    """Where and on what code the results were produced"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+def write_results(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+def compare(baseline, current, metric='median_ms'):
+    """[(name, baseline, current, change_pct)] for every case present in both runs"""
+    rows = []
+    for name, result in current['cases'].items():
+        before = baseline.get('cases', {}).get(name, {})
+        if metric in result and metric in before and before[metric]:
+            change = (result[metric] - before[metric]) / before[metric] * 100
+            rows.append((name, before[metric], result[metric], round(change, 1)))
+    return rows
@@ -0,0 +1,387 @@
+"""
+Load-testing harness
+
+Drives a running instance over HTTP with concurrent virtual users and
+reports throughput, latency percentiles and error rates per endpoint.
+Nothing outside this repository is needed:
+
+    # 1. a scratch instance pointed at the fake Perplexity server
+    DATABASE_URL=sqlite:////tmp/mmsu-load.db \\
+    PERPLEXITY_API_URL=http://127.0.0.1:8765/chat/completions PERPLEXITY_API_KEY=load \\
+        gunicorn -c gunicorn.conf.py wsgi:application
+    # (create an admin account with flask shell, see README; DATABASE_URL may be a local Postgres)
+
+    # 2. the load, with the fake server running in this process
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:10000 --fake-perplexity-port 8765 \\
+        --admin-email admin@mmsu.edu.ph --admin-password admin123 --users 20 --duration 120
+
+Virtual users follow weighted scenarios (--mix):
+
+- researcher: submits technologies (some with a PDF upload), polls the
+  analyze page until the results are ready, views them and downloads the
+  PDF report;
+- browser: dashboard, history and search pages;
+- admin: admin dashboard and analysis metrics refreshes, approving pending
+  registrations;
+- registrant: registers a new account (answering the math CAPTCHA).
+
+Researcher and browser accounts are registered, approved and logged in
+before the measured phase. Every account is created for real, so run
+against a scratch database.
+"""
+
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from urllib.parse import urlsplit
+import click
+from benchmarks.documents import write_pdf, sentences
+from benchmarks.fake_perplexity import FakePerplexity
+from benchmarks.harness import environment, summarize, write_results
+
+CSRF_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+CAPTCHA_RE = re.compile(r'What is (\d+) \+ (\d+)\?')
+ANALYZE_RE = re.compile(r'/analyze/(\d+)')
+PASSWORD = 'loadtest-password'
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+class LoadStats:
+    """Latency samples and failures per endpoint, shared by all virtual users"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.failures = {}
+        self.started = time.perf_counter()
+
+    def record(self, endpoint, ms, failure=None):
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append(ms)
+            if failure is not None:
+                self.failures.setdefault(endpoint, Counter())[failure] += 1
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        with self.lock:
+            endpoints = {}
+            for endpoint, samples in sorted(self.samples.items()):
+                failures = self.failures.get(endpoint, Counter())
+                endpoints[endpoint] = {
+                    **summarize(samples),
+                    'throughput_rps': round(len(samples) / elapsed, 3),
+                    'errors': sum(failures.values()),
+                    'error_rate': round(sum(failures.values()) / len(samples), 4),
+                    'failures': dict(failures)
+                }
+            total = sum(len(samples) for samples in self.samples.values())
+            errors = sum(sum(failures.values()) for failures in self.failures.values())
+        return {
+            'elapsed_s': round(elapsed, 1),
+            'requests': total,
+            'throughput_rps': round(total / elapsed, 3) if elapsed else 0,
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0,
+            'endpoints': endpoints
+        }
+
+class Session:
+    """One browser: a cookie jar, its CSRF token and timed requests"""
+
+    def __init__(self, base_url, stats, timeout):
+        import requests
+
+        self.http = requests.Session()
+        self.http.headers['User-Agent'] = 'mmsu-loadtest'
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.timeout = timeout
+        self.csrf_token = None
+
+    def request(self, method, path, endpoint=None, expect=(200, 302), **kwargs):
+        """Send one request without following redirects; None if it failed"""
+        endpoint = f"{method} {endpoint or path}"
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, allow_redirects=False,
+                                         timeout=self.timeout, **kwargs)
+        except Exception as e:
+            self.stats.record(endpoint, (time.perf_counter() - started) * 1000, type(e).__name__)
+            return None
+        elapsed = (time.perf_counter() - started) * 1000
+
+        if response.status_code not in expect:
+            self.stats.record(endpoint, elapsed, str(response.status_code))
+            return None
+        self.stats.record(endpoint, elapsed)
+        self._remember_csrf(response)
+        return response
+
+    def post_form(self, path, data, endpoint=None, **kwargs):
+        if self.csrf_token is None:
+            self.request('GET', '/auth/login')
+        return self.request('POST', path, endpoint, data={**data, 'csrf_token': self.csrf_token}, **kwargs)
+
+    def _remember_csrf(self, response):
+        if 'text/html' in response.headers.get('Content-Type', ''):
+            match = CSRF_RE.search(response.text)
+            if match:
+                self.csrf_token = match.group(1)
+
+    # Steps shared by the scenarios
+
+    def register(self, email):
+        page = self.request('GET', '/auth/register')
+        match = CAPTCHA_RE.search(page.text) if page is not None else None
+        if match is None:
+            return False
+        response = self.post_form('/auth/register', {
+            'name': 'Load Test User', 'email': email, 'institution': 'Mariano Marcos State University',
+            'password': PASSWORD, 'password2': PASSWORD,
+            'captcha_answer': str(int(match.group(1)) + int(match.group(2)))
+        })
+        return _redirected_to(response, '/auth/login')
+
+    def login(self, email, password=PASSWORD):
+        self.request('GET', '/auth/login')
+        response = self.post_form('/auth/login', {'email': email, 'password': password})
+        return _redirected_away_from(response, '/auth/login')
+
+    def accept_disclaimer(self):
+        self.request('GET', '/disclaimer')
+        self.post_form('/disclaimer', {'accept_disclaimer': 'y'})
+
+class LoadTest:
+    """Account setup and the virtual user loops"""
+
+    def __init__(self, options, stats):
+        self.options = options
+        self.stats = stats
+        self.run_id = uuid.uuid4().hex[:8]
+        self.deadline = None
+        self.upload_path = write_pdf(os.path.join(tempfile.gettempdir(), f'loadtest-{self.run_id}.pdf'),
+                                     options['upload_pages'])
+        self.submissions = Counter()
+
+    def session(self, stats=None):
+        return Session(self.options['base_url'], stats or self.stats, self.options['request_timeout'])
+
+    def admin_session(self, stats=None):
+        admin = self.session(stats)
+        if not admin.login(self.options['admin_email'], self.options['admin_password']):
+            raise click.ClickException('Admin login failed; check --admin-email/--admin-password')
+        return admin
+
+    def prepare_accounts(self, count, setup_stats):
+        """Register, approve and log in the accounts of the researcher and browser users"""
+        sessions = []
+        for number in range(count):
+            session = self.session(setup_stats)
+            email = f'load-{self.run_id}-{number}@loadtest.example'
+            if not session.register(email):
+                raise click.ClickException(f'Registering {email} failed; is the instance up and CSRF-enabled?')
+            sessions.append((email, session))
+
+        admin = self.admin_session(setup_stats)
+        admin.post_form('/admin/users/bulk_approve', {'status': 'Pending'})
+        if self.options['grant_credits']:
+            admin.post_form('/admin/users/bulk_credits', {
+                'status': 'Active', 'amount': self.options['grant_credits'], 'reason': 'Load test credits'})
+
+        for email, session in sessions:
+            if not session.login(email):
+                raise click.ClickException(f'{email} could not log in after approval')
+            session.accept_disclaimer()
+        return [session for _, session in sessions]
+
+    def run_user(self, scenario, session):
+        rng = random.Random()
+        step = getattr(self, f'_{scenario}')
+        while time.monotonic() < self.deadline:
+            step(session, rng)
+            self._think(rng)
+
+    def _researcher(self, session, rng):
+        data = {
+            'title': next(sentences(1, seed=rng.random()))[:120],
+            'description': ' '.join(sentences(5, seed=rng.random())),
+            'claims': ' '.join(sentences(3, seed=rng.random()))
+        }
+        session.request('GET', '/submit')
+        if rng.random() < self.options['upload_rate']:
+            with open(self.upload_path, 'rb') as upload:
+                response = session.post_form('/submit', data, endpoint='/submit (upload)',
+                                             files={'uploaded_file': ('disclosure.pdf', upload, 'application/pdf')})
+        else:
+            response = session.post_form('/submit', data)
+
+        match = ANALYZE_RE.search(response.headers.get('Location', '')) if response is not None else None
+        if match is None:
+            self.submissions['rejected'] += 1
+            return
+        submission_id = match.group(1)
+
+        # The analyze page runs (or waits for) the analysis and forwards to the results when done
+        polled_until = time.monotonic() + self.options['poll_timeout']
+        while True:
+            response = session.request('GET', f'/analyze/{submission_id}', '/analyze/<id>')
+            if response is None:
+                self.submissions['failed'] += 1
+                return
+            if _redirected_to(response, '/results/'):
+                break
+            if time.monotonic() > polled_until:
+                self.submissions['timed_out'] += 1
+                return
+            time.sleep(self.options['poll_interval'])
+
+        self.submissions['completed'] += 1
+        session.request('GET', f'/results/{submission_id}', '/results/<id>', expect=(200,))
+        if rng.random() < self.options['download_rate']:
+            session.request('GET', f'/download_pdf/{submission_id}', '/download_pdf/<id>', expect=(200,))
+
+    def _browser(self, session, rng):
+        session.request('GET', '/dashboard', expect=(200,))
+        self._think(rng)
+        session.request('GET', '/history', expect=(200,))
+        self._think(rng)
+        term = rng.choice(('sensor', 'irrigation', 'solar', 'rice', 'moisture'))
+        session.request('GET', f'/search?q={term}', '/search?q=<term>', expect=(200,))
+
+    def _admin(self, session, rng):
+        session.request('GET', '/admin/dashboard', expect=(200,))
+        self._think(rng)
+        session.request('GET', '/admin/analysis_metrics?format=json', '/admin/analysis_metrics', expect=(200,))
+        if rng.random() < 0.2:
+            session.post_form('/admin/users/bulk_approve', {'status': 'Pending'})
+
+    def _registrant(self, session, rng):
+        session.register(f'load-{self.run_id}-{uuid.uuid4().hex[:10]}@loadtest.example')
+        session.http.cookies.clear()
+        session.csrf_token = None
+
+    def _think(self, rng):
+        if self.options['think_ms']:
+            time.sleep(min(rng.expovariate(1000 / self.options['think_ms']), 10 * self.options['think_ms'] / 1000))
+
+def _redirected_to(response, prefix):
+    return response is not None and response.status_code == 302 and \
+        urlsplit(response.headers.get('Location', '')).path.startswith(prefix)
+
+def _redirected_away_from(response, prefix):
+    return response is not None and response.status_code == 302 and not _redirected_to(response, prefix)
+
+def _assign_scenarios(users, mix):
+    """Scenario of every virtual user, proportional to the mix weights (largest remainder)"""
+    total = sum(mix.values())
+    shares = {scenario: users * weight / total for scenario, weight in mix.items()}
+    counts = {scenario: int(share) for scenario, share in shares.items()}
+    by_remainder = sorted(mix, key=lambda scenario: shares[scenario] - counts[scenario], reverse=True)
+    for scenario in by_remainder[:users - sum(counts.values())]:
+        counts[scenario] += 1
+    return [scenario for scenario in mix for _ in range(counts[scenario])]
+
+def _parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        scenario, _, weight = part.partition('=')
+        if scenario not in ('researcher', 'browser', 'admin', 'registrant'):
+            raise click.BadParameter(f'Unknown scenario {scenario!r}')
+        mix[scenario] = float(weight or 1)
+    return {scenario: weight for scenario, weight in mix.items() if weight > 0}
+
+@click.command()
+@click.option('--base-url', default='http://127.0.0.1:5000', show_default=True, help='Instance under test.')
+@click.option('--admin-email', required=True, help='Existing admin account, used to approve load users.')
+@click.option('--admin-password', required=True)
+@click.option('--users', type=int, default=10, show_default=True, help='Concurrent virtual users.')
+@click.option('--duration', type=float, default=60, show_default=True, help='Measured seconds.')
+@click.option('--ramp-up', type=float, default=10, show_default=True, help='Seconds over which users start.')
+@click.option('--mix', default='researcher=6,browser=3,admin=1,registrant=1', show_default=True,
+              help='Scenario weights.')
+@click.option('--think-ms', type=float, default=1000, show_default=True, help='Mean pause between steps.')
+@click.option('--upload-rate', type=float, default=0.3, show_default=True, help='Share of submissions with a PDF.')
+@click.option('--upload-pages', type=int, default=5, show_default=True, help='Pages of the uploaded PDF.')
+@click.option('--download-rate', type=float, default=0.3, show_default=True, help='Share of results downloaded.')
+@click.option('--grant-credits', type=int, default=0, help='Credits granted to every active user before the run.')
+@click.option('--poll-interval', type=float, default=2, show_default=True, help='Seconds between analyze polls.')
+@click.option('--poll-timeout', type=float, default=180, show_default=True, help='Give up on an analysis after.')
+@click.option('--request-timeout', type=float, default=180, show_default=True)
+@click.option('--fake-perplexity-port', type=int, default=None,
+              help='Also serve the fake Perplexity API on this port for the instance to call.')
+@click.option('--latency-ms', type=float, default=800, show_default=True, help='Fake Perplexity delay.')
+@click.option('--jitter-ms', type=float, default=400, show_default=True)
+@click.option('--error-rate', type=float, default=0.0, show_default=True, help='Fake Perplexity failure share.')
+@click.option('--output', type=click.Path(dir_okay=False), default=None,
+              help='Result file (default results/load_<time>.json).')
+def main(**options):
+    """Run concurrent user sessions against an instance and report per-endpoint statistics."""
+    mix = _parse_mix(options['mix'])
+    scenarios = _assign_scenarios(options['users'], mix)
+    load = LoadTest(options, LoadStats())
+
+    fake = None
+    if options['fake_perplexity_port']:
+        fake = FakePerplexity(options['latency_ms'], options['jitter_ms'], options['error_rate'],
+                              port=options['fake_perplexity_port']).start()
+        click.echo(f'Fake Perplexity at {fake.url}')
+
+    try:
+        setup_stats = LoadStats()
+        account_users = sum(1 for scenario in scenarios if scenario in ('researcher', 'browser'))
+        click.echo(f'Preparing {account_users} accounts ...')
+        accounts = iter(load.prepare_accounts(account_users, setup_stats))
+        sessions = [next(accounts) if scenario in ('researcher', 'browser')
+                    else load.admin_session(setup_stats) if scenario == 'admin'
+                    else load.session(setup_stats)
+                    for scenario in scenarios]
+
+        click.echo(f"Running {Counter(scenarios)} for {options['duration']:.0f}s ...")
+        load.stats = LoadStats()
+        for session in sessions:
+            session.stats = load.stats
+        load.deadline = time.monotonic() + options['ramp_up'] + options['duration']
+
+        threads = []
+        for number, (scenario, session) in enumerate(zip(scenarios, sessions)):
+            thread = threading.Thread(target=load.run_user, args=(scenario, session),
+                                      name=f'{scenario}-{number}', daemon=True)
+            thread.start()
+            threads.append(thread)
+            time.sleep(options['ramp_up'] / max(len(scenarios), 1))
+        for thread in threads:
+            thread.join()
+    finally:
+        if fake is not None:
+            fake.stop()
+        os.unlink(load.upload_path)
+
+    report = load.stats.report()
+    results = {
+        'environment': environment(),
+        'options': {**options, 'admin_password': None, 'mix': mix},
+        'setup': setup_stats.report(),
+        'run': report,
+        'submissions': dict(load.submissions),
+        'upstream': fake.stats() if fake is not None else None
+    }
+    output = options['output'] or os.path.join(RESULTS_DIR, f"load_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    write_results(output, results)
+
+    click.echo(f"\n{'endpoint':42} {'count':>7} {'rps':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>8}")
+    for endpoint, result in report['endpoints'].items():
+        click.echo(f"{endpoint:42} {result['runs']:7d} {result['throughput_rps']:7.2f} "
+                   f"{result['median_ms']:9.1f} {result['p95_ms']:9.1f} {result['p99_ms']:9.1f} "
+                   f"{result['error_rate'] * 100:7.1f}%")
+    click.echo(f"\n{report['requests']} requests in {report['elapsed_s']}s: {report['throughput_rps']:.2f} req/s, "
+               f"{report['error_rate'] * 100:.1f}% errors; submissions {dict(load.submissions)}")
+    click.echo(f'Wrote {output}')
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,20 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Database engine profile (see app/utils/db_engine.py); SQLALCHEMY_ENGINE_OPTIONS overrides it
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 5)
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 10)  # seconds to wait for a connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)  # seconds
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ['true', 'on', '1']
+    DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT') or 10)
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 30000)  # '0' disables
+    DB_IDLE_IN_TRANSACTION_TIMEOUT_MS = int(os.environ.get('DB_IDLE_IN_TRANSACTION_TIMEOUT_MS') or 60000)
+    DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', 'false').lower() in ['true', 'on', '1']  # transaction pooling
+    SQLITE_WAL = os.environ.get('SQLITE_WAL', 'true').lower() in ['true', 'on', '1']
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+    SQLITE_CACHE_KB = int(os.environ.get('SQLITE_CACHE_KB') or 16384)
+
     # File Upload Configuration
     UPLOAD_FOLDER = os.path.join(basedir, 'app', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
@@ -29,9 +43,37 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD') or 'eduh lvca meir asmy'
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'artbellsonmamuri@gmail.com'
 
+    # Email Outbox
+    EMAIL_OUTBOX_BACKGROUND = os.environ.get('EMAIL_OUTBOX_BACKGROUND', 'true').lower() in ['true', 'on', '1']
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE') or 50)
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS') or 5)
+    EMAIL_OUTBOX_RETRY_BASE = int(os.environ.get('EMAIL_OUTBOX_RETRY_BASE') or 30)  # seconds, doubled per attempt
+    EMAIL_OUTBOX_POLL_INTERVAL = int(os.environ.get('EMAIL_OUTBOX_POLL_INTERVAL') or 30)
+    EMAIL_SEND_RATE_PER_MINUTE = int(os.environ.get('EMAIL_SEND_RATE_PER_MINUTE') or 30)  # all workers together, 0 disables
+    EMAIL_DAILY_LIMIT = int(os.environ.get('EMAIL_DAILY_LIMIT') or 2000)  # Gmail/Workspace cap, 0 disables
+    EMAIL_BROADCAST_CHUNK_SIZE = 500
+
     # Perplexity API Configuration
     PERPLEXITY_API_KEY = os.environ.get('PERPLEXITY_API_KEY')
-    PERPLEXITY_API_URL = 'https://api.perplexity.ai/chat/completions'
+    PERPLEXITY_API_URL = os.environ.get('PERPLEXITY_API_URL') or 'https://api.perplexity.ai/chat/completions'
+    PERPLEXITY_TIMEOUT = int(os.environ.get('PERPLEXITY_TIMEOUT') or 120)
+
+    # Revisions reuse the prior art report when only the claims changed
+    INCREMENTAL_REANALYSIS_ENABLED = os.environ.get('INCREMENTAL_REANALYSIS_ENABLED', 'true').lower() in ['true', 'on', '1']
+
+    # Global limit on in-flight Perplexity calls across all workers
+    PERPLEXITY_GOVERNOR_ENABLED = os.environ.get('PERPLEXITY_GOVERNOR_ENABLED', 'true').lower() in ['true', 'on', '1']
+    PERPLEXITY_MAX_CONCURRENCY = int(os.environ.get('PERPLEXITY_MAX_CONCURRENCY') or 4)
+    PERPLEXITY_PRIORITY_RESERVED = int(os.environ.get('PERPLEXITY_PRIORITY_RESERVED') or 1)  # slots kept for Admin/VIP
+    PERPLEXITY_PER_USER_CONCURRENCY = int(os.environ.get('PERPLEXITY_PER_USER_CONCURRENCY') or 1)
+    PERPLEXITY_QUEUE_TIMEOUT = int(os.environ.get('PERPLEXITY_QUEUE_TIMEOUT') or 300)
+    PERPLEXITY_LEASE_TTL = int(os.environ.get('PERPLEXITY_LEASE_TTL') or 180)  # extended while a call is in flight
+    PERPLEXITY_GOVERNOR_LOCK_FILE = os.environ.get('PERPLEXITY_GOVERNOR_LOCK_FILE')
+
+    # Perplexity price table (USD) used for per-analysis cost accounting
+    PERPLEXITY_PRICE_PER_REQUEST = float(os.environ.get('PERPLEXITY_PRICE_PER_REQUEST') or 0.005)
+    PERPLEXITY_PRICE_PER_1K_PROMPT_TOKENS = float(os.environ.get('PERPLEXITY_PRICE_PER_1K_PROMPT_TOKENS') or 0.001)
+    PERPLEXITY_PRICE_PER_1K_COMPLETION_TOKENS = float(os.environ.get('PERPLEXITY_PRICE_PER_1K_COMPLETION_TOKENS') or 0.001)
 
     # Application Settings
     POSTS_PER_PAGE = 25
@@ -42,6 +84,78 @@ class Config:
     ANALYSIS_COST = 1
     PDF_DOWNLOAD_COST = 1
 
+    # Batch Submissions
+    BATCH_SUBMISSION_MAX_ROWS = int(os.environ.get('BATCH_SUBMISSION_MAX_ROWS') or 500)
+    BATCH_ANALYSIS_CONCURRENCY = int(os.environ.get('BATCH_ANALYSIS_CONCURRENCY') or 2)
+
+    # Cross-submission similarity report
+    SIMILARITY_NEIGHBORS = int(os.environ.get('SIMILARITY_NEIGHBORS') or 10)  # stored per submission
+    SIMILARITY_BLOCK_SIZE = int(os.environ.get('SIMILARITY_BLOCK_SIZE') or 256)  # rows per matrix block
+    SIMILARITY_MIN_SCORE = float(os.environ.get('SIMILARITY_MIN_SCORE') or 0.05)
+    SIMILARITY_CLUSTER_THRESHOLD = float(os.environ.get('SIMILARITY_CLUSTER_THRESHOLD') or 0.35)
+    SIMILARITY_LOCK_FILE = os.environ.get('SIMILARITY_LOCK_FILE')  # one update at a time without PostgreSQL, default in the temp dir
+    SIMILARITY_TERM_COUNTS_FILE = os.environ.get('SIMILARITY_TERM_COUNTS_FILE')  # kept between incremental runs, default in the temp dir
+
+    # Caching
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 30)  # seconds, 0 disables
+    CACHE_STAMP_DIR = os.environ.get('CACHE_STAMP_DIR')  # invalidation stamps shared by workers, default in the temp dir
+    DASHBOARD_STATS_TTL = int(os.environ.get('DASHBOARD_STATS_TTL') or 60)
+    DASHBOARD_STATS_STALE_TTL = int(os.environ.get('DASHBOARD_STATS_STALE_TTL') or 300)
+
+    # Rendered fragments: results report bodies (keyed by results hash) and per-user dashboards
+    FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND') or 'lru'  # lru, filesystem or none
+    FRAGMENT_CACHE_DIR = os.environ.get('FRAGMENT_CACHE_DIR')  # filesystem backend, default in the temp dir
+    FRAGMENT_CACHE_MAXSIZE = int(os.environ.get('FRAGMENT_CACHE_MAXSIZE') or 512)
+    RESULTS_FRAGMENT_TTL = int(os.environ.get('RESULTS_FRAGMENT_TTL') or 86400)
+    DASHBOARD_FRAGMENT_TTL = int(os.environ.get('DASHBOARD_FRAGMENT_TTL') or 30)
+
+    # HTTP caching: ETags and 304s for results, PDFs and the API; compression; static fingerprints
+    HTTP_CACHE_VERSION = os.environ.get('HTTP_CACHE_VERSION') or os.environ.get('RENDER_GIT_COMMIT')  # build id
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE') or 1024)  # bytes
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL') or 6)
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY') or 5)
+    COMPRESS_MIMETYPES = ['text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+                          'application/javascript', 'application/json', 'image/svg+xml']
+    STATIC_FINGERPRINTS = os.environ.get('STATIC_FINGERPRINTS', 'true').lower() in ['true', 'on', '1']
+    STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE') or 31536000)  # fingerprinted URLs only
+
+    # Metrics: Prometheus endpoint at /metrics for admins or a bearer METRICS_TOKEN
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', 'false').lower() in ['true', 'on', '1']
+
+    # Startup: heavy libraries load on first use; optionally preload them after the first response
+    WARMUP_IMPORTS = os.environ.get('WARMUP_IMPORTS', 'true').lower() in ['true', 'on', '1']
+    IMPORT_TIME_BUDGET_MS = int(os.environ.get('IMPORT_TIME_BUDGET_MS') or 1500)  # flask startup importtime
+
+    # Logging (production): JSON lines via a background queue listener, to stdout or logs/
+    LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
+    LOG_FORMAT = os.environ.get('LOG_FORMAT') or 'json'  # json or text
+    LOG_DESTINATION = os.environ.get('LOG_DESTINATION') or 'file'  # file or stdout
+    LOG_FILE = os.environ.get('LOG_FILE') or os.path.join(basedir, 'logs', 'mmsu_prior_art.log')
+    LOG_ROTATION = os.environ.get('LOG_ROTATION') or 'size'  # size, time or external (logrotate)
+    LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES') or 10 * 1024 * 1024)
+    LOG_ROTATE_WHEN = os.environ.get('LOG_ROTATE_WHEN') or 'midnight'
+    LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT') or 10)
+    LOG_REQUESTS = os.environ.get('LOG_REQUESTS', 'true').lower() in ['true', 'on', '1']
+
+    # Query debugging: record SQL per request, warn on repeated statement shapes (likely N+1)
+    # and on endpoints exceeding their query budget; tests raise instead of warning
+    QUERY_DEBUG = os.environ.get('QUERY_DEBUG', 'false').lower() in ['true', 'on', '1']
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD') or 5)
+    QUERY_BUDGET_ENFORCE = False
+    QUERY_BUDGETS = {
+        'main.index': 6,
+        'main.dashboard': 8,
+        'main.search': 10,
+        'admin.dashboard': 12,
+        'admin.search': 8,
+        'admin.users': 8,
+        'admin.broadcast': 8,
+        'api.user_submissions': 6,
+    }
+
     # CAPTCHA Settings
     CAPTCHA_TIMEOUT = 600  # 10 minutes
 
@@ -51,6 +165,9 @@ class Config:
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
+    SERVER_TIMING = True
+    QUERY_DEBUG = True
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 10)
     SQLALCHEMY_DATABASE_URI = os.environ.get('DEV_DATABASE_URL') or         'sqlite:///' + os.path.join(basedir, 'app-dev.db')
 
 class TestingConfig(Config):
@@ -58,15 +175,39 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
     WTF_CSRF_ENABLED = False
+    USER_CACHE_TTL = 0
+    DASHBOARD_STATS_TTL = 0
+    DASHBOARD_STATS_STALE_TTL = 0
+    RESULTS_FRAGMENT_TTL = 0
+    DASHBOARD_FRAGMENT_TTL = 0
+    EMAIL_OUTBOX_BACKGROUND = False
+    EMAIL_SEND_RATE_PER_MINUTE = 0
+    EMAIL_DAILY_LIMIT = 0
+    WARMUP_IMPORTS = False
+    QUERY_DEBUG = True
+    QUERY_BUDGET_ENFORCE = True
+
+class BenchmarkConfig(TestingConfig):
+    """Benchmark configuration (python -m benchmarks)"""
+    SQLALCHEMY_DATABASE_URI = os.environ.get('BENCHMARK_DATABASE_URL') or \
+        'sqlite:///' + os.path.join(basedir, 'benchmarks', 'results', 'benchmark.db')
+    UPLOAD_FOLDER = os.path.join(basedir, 'benchmarks', 'results', 'uploads')
+    QUERY_DEBUG = False
+    QUERY_BUDGET_ENFORCE = False
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
+    # One connection per gunicorn thread; workers x (size + overflow) must fit max_connections
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or os.environ.get('GUNICORN_THREADS') or 8)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 2)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 600)  # under the proxy's idle cutoff
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or         'sqlite:///' + os.path.join(basedir, 'app.db')
 
 config = {
     'development': DevelopmentConfig,
     'testing': TestingConfig,
+    'benchmark': BenchmarkConfig,
     'production': ProductionConfig,
     'default': DevelopmentConfig
 }
@@ -0,0 +1,164 @@
+"""
+Gunicorn configuration for MMSU Prior Art Search Tool
+
+Select a worker profile with GUNICORN_PROFILE:
+
+- gthread (default): a few processes with a thread pool each, so a request
+  blocked on Perplexity, SMTP or WeasyPrint does not stall the worker;
+- gevent: cooperative greenlets for many concurrent slow requests
+  (requires `pip install gevent psycogreen`);
+- sync: one request per process, as before.
+
+Worker count is derived from the CPUs and the memory limit of the container
+unless WEB_CONCURRENCY is set. The app is preloaded in the master so workers
+share its memory copy-on-write; heavy libraries are imported by each worker
+after its first response. After forking, every worker drops the database
+connections it inherited. Prometheus samples of all workers are
+collected in PROMETHEUS_MULTIPROC_DIR.
+"""
+
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+PROFILE = os.environ.get('GUNICORN_PROFILE', 'gthread').lower()
+if PROFILE not in ('gthread', 'gevent', 'sync'):
+    raise RuntimeError(f"Unknown GUNICORN_PROFILE '{PROFILE}' (use gthread, gevent or sync)")
+
+if PROFILE == 'gevent':
+    # Patch before the application (and its locks, sockets and psycopg2) is preloaded
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        pass
+
+# Every worker writes its Prometheus samples here so /metrics can aggregate them
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'mmsu-prometheus'))
+
+# BLAS thread pools started in the master do not survive a fork
+os.environ.setdefault('OPENBLAS_NUM_THREADS', '1')
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+def _memory_limit_mb():
+    """Container memory limit (cgroup v2 or v1), else physical memory"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value) // (1024 * 1024)
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def _worker_count():
+    if os.environ.get('WEB_CONCURRENCY'):
+        return int(os.environ['WEB_CONCURRENCY'])
+    by_cpu = _cpu_count() * 2 + 1 if PROFILE == 'sync' else _cpu_count() + 1
+    memory = _memory_limit_mb()
+    # Leave room for the master; each worker grows past the shared preloaded pages
+    worker_mb = int(os.environ.get('GUNICORN_WORKER_MEMORY_MB') or 160)
+    by_memory = max(1, (memory - 100) // worker_mb) if memory else by_cpu
+    return max(1, min(by_cpu, by_memory))
+
+# Server socket
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+backlog = 2048
+
+# Workers
+workers = _worker_count()
+
+# The in-process fragment cache only drops a user's dashboard in the worker that
+# changed it; with several workers, share fragments through the filesystem instead
+if workers > 1:
+    os.environ.setdefault('FRAGMENT_CACHE_BACKEND', 'filesystem')
+
+if PROFILE == 'gthread':
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS') or 8)
+elif PROFILE == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS') or 200)
+else:
+    worker_class = 'sync'
+
+# The analyze page waits for Perplexity (PERPLEXITY_TIMEOUT, 120s by default)
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 150)
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT') or 30)
+keepalive = 5
+
+# Recycle workers to cap slow memory growth; jitter keeps them from restarting together
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS') or 1000)
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER') or max_requests // 10)
+
+# Load the app once in the master and share it copy-on-write
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ['true', 'on', '1']
+
+# Heartbeat files on tmpfs so a slow disk cannot make workers look dead
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Render terminates TLS at its proxy
+forwarded_allow_ips = '*'
+
+# Logging: the app writes one JSON line per request (LOG_REQUESTS), so gunicorn's
+# own access log is off unless asked for
+accesslog = '-' if os.environ.get('GUNICORN_ACCESS_LOG', 'false').lower() in ['true', 'on', '1'] else None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+def on_starting(server):
+    # Samples of a previous run would otherwise be added to this one
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+def when_ready(server):
+    cfg = server.cfg
+    server.log.info(f'Profile {PROFILE}: {cfg.workers} {cfg.worker_class_str} workers, '
+                    f'{cfg.threads} threads each, preload={cfg.preload_app}')
+    if not preload_app:
+        return
+
+    # Heavy libraries (WeasyPrint, NumPy/SciPy) are not imported here: their
+    # native thread pools and font caches do not survive a fork. Each worker
+    # imports them after its first response (app.utils.startup.init_app).
+
+    # Move everything loaded so far out of the GC's reach: collections in the
+    # workers would otherwise touch (and un-share) every preloaded page
+    gc.collect()
+    gc.freeze()
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+
+    # Connections opened in the master must never be used by two processes;
+    # close=False drops them from this worker's pool without closing the master's sockets
+    from app import db
+    application = server.app.wsgi()
+    with application.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+def worker_exit(server, worker):
+    # Let the email sender thread finish its current batch bookkeeping
+    from app.utils.outbox import stop_sender
+    stop_sender()
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,54 @@
+import pytest
+from app import create_app, db
+from app.models import User, TechnologySubmission
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def make_user(app):
+    """Create an active user who has accepted the disclaimer"""
+    counter = iter(range(1, 10000))
+
+    def make_user(role='Regular', credits=50, status='Active', **fields):
+        n = next(counter)
+        user = User(email=fields.pop('email', f'user{n}@mmsu.edu.ph'), name=fields.pop('name', f'User {n}'),
+                    role=role, credits=credits, status=status, disclaimer_accepted=True, **fields)
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make_user
+
+@pytest.fixture
+def make_submission(make_user):
+    """Create a submission, by a new user unless one is given"""
+
+    def make_submission(user=None, status='Pending', **fields):
+        submission = TechnologySubmission(
+            user_id=(user or make_user()).id, analysis_status=status,
+            title=fields.pop('title', 'Solar rice dryer'),
+            description=fields.pop('description', 'A solar-powered rice dryer for small farms. ' * 3),
+            **fields)
+        submission.generate_serial_number()
+        db.session.add(submission)
+        db.session.commit()
+        return submission
+    return make_submission
+
+def login(client, user):
+    """Log the test client in as user without going through the form"""
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
@@ -0,0 +1,34 @@
+import re
+from conftest import login
+from app import db
+from app.models import TechnologySubmission
+
+def test_submit_analyze_results(app, client, make_user):
+    user = make_user(credits=5)
+    login(client, user)
+
+    response = client.post('/submit', data={'title': 'Solar-powered irrigation valve',
+                                            'description': 'A solenoid valve that opens when a soil moisture sensor reads dry soil.',
+                                            'claims': 'A valve driven by a soil moisture sensor.'})
+    assert response.status_code == 302
+    submission_id = int(re.search(r'/analyze/(\d+)', response.headers['Location']).group(1))
+
+    response = client.get(f'/analyze/{submission_id}')
+    assert response.status_code == 200
+    assert b'View Results' in response.data
+    assert db.session.get(TechnologySubmission, submission_id).analysis_status == 'Completed'
+
+    assert client.get(f'/results/{submission_id}').status_code == 200
+
+def test_submit_and_history_pages_render(app, client, make_user):
+    user = make_user()
+    login(client, user)
+    assert client.get('/history').status_code == 200
+    assert client.get('/submit').status_code == 200
+
+    client.post('/submit', data={'title': 'Rice straw briquette press',
+                                 'description': 'A hand-operated press that turns rice straw into fuel briquettes.'})
+    response = client.get('/history')
+    assert response.status_code == 200
+    assert b'Rice straw briquette press' in response.data
+
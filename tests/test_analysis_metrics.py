@@ -0,0 +1,20 @@
+import requests
+from app.models import AnalysisRun
+from app.utils.analysis_queue import run_analysis
+
+def test_fallback_to_sample_data_is_recorded_as_failed(app, make_submission, monkeypatch):
+    app.config.update(PERPLEXITY_API_KEY='key', PERPLEXITY_API_URL='http://perplexity.invalid',
+                      PERPLEXITY_GOVERNOR_ENABLED=False)
+    submission = make_submission(status='Processing')
+
+    def unreachable(*args, **kwargs):
+        raise requests.ConnectionError('connection refused')
+    monkeypatch.setattr(requests, 'post', unreachable)
+
+    run_analysis(submission)
+
+    run = AnalysisRun.query.one()
+    assert run.source == 'fallback'
+    assert run.succeeded is False
+    assert 'connection refused' in run.error_message
+    assert run.cost == 0.0
@@ -0,0 +1,35 @@
+from sqlalchemy import update
+from app import db
+from app.models import TechnologySubmission, User
+from conftest import login
+
+def _disclosures(n):
+    return [{'title': f'Disclosure {i}', 'description': 'A solar-powered rice dryer for small farms. ' * 3}
+            for i in range(n)]
+
+def test_batch_is_rejected_when_the_stored_balance_is_short(app, client, make_user, monkeypatch):
+    monkeypatch.setattr('app.api.routes.queue_analyses', lambda ids: None)
+    user = make_user(credits=5)
+    login(client, user)
+    # Spent elsewhere (another worker) since this user was cached
+    db.session.execute(update(User).where(User.id == user.id).values(credits=2),
+                       execution_options={'synchronize_session': False})
+    db.session.commit()
+
+    response = client.post('/api/submissions/batch', json=_disclosures(3))
+
+    assert response.status_code == 402
+    assert TechnologySubmission.query.count() == 0
+    assert db.session.get(User, user.id).credits == 2
+
+def test_batch_debits_once(app, client, make_user, monkeypatch):
+    monkeypatch.setattr('app.api.routes.queue_analyses', lambda ids: None)
+    user = make_user(credits=5)
+    login(client, user)
+
+    response = client.post('/api/submissions/batch', json=_disclosures(3))
+
+    assert response.status_code == 202, response.get_json()
+    assert TechnologySubmission.query.count() == 3
+    db.session.expire_all()
+    assert db.session.get(User, user.id).credits == 2
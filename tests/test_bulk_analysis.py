@@ -0,0 +1,25 @@
+from app import db
+from app.models import TechnologySubmission
+from app.utils import bulk_analysis
+from app.utils.bulk_analysis import run_bulk_analysis
+
+def test_pending_submissions_are_claimed_and_analyzed(app, make_submission):
+    submission_id = make_submission(status='Pending').id
+    stats = run_bulk_analysis([submission_id], concurrency=1, rate=100)
+    assert stats['completed'] == 1
+    assert db.session.get(TechnologySubmission, submission_id).analysis_status == 'Completed'
+
+def test_submissions_being_analyzed_elsewhere_are_left_alone(app, make_submission):
+    submission_id = make_submission(status='Processing').id
+    stats = run_bulk_analysis([submission_id], concurrency=1, rate=100)
+    assert (stats['completed'], stats['busy']) == (0, 1)
+    assert db.session.get(TechnologySubmission, submission_id).analysis_status == 'Processing'
+
+def test_a_lost_claim_skips_the_call(app, make_submission, monkeypatch):
+    submission_id = make_submission(status='Pending').id
+    # The analyze page claimed it between our read and our claim
+    monkeypatch.setattr(bulk_analysis, 'claim_submission', lambda *args: False)
+    stats = run_bulk_analysis([submission_id], concurrency=1, rate=100)
+    assert stats['busy'] == 1
+    submission = db.session.get(TechnologySubmission, submission_id)
+    assert (submission.analysis_status, submission.analysis_results) == ('Pending', None)
@@ -0,0 +1,125 @@
+import pytest
+from jinja2 import ChoiceLoader, DictLoader
+from sqlalchemy import event
+from app import db
+from app.models import CreditHistory, EmailLog, User
+from app.utils.bulk_operations import BulkOperationError, approve_users, change_role, grant_credits
+from tests.conftest import login
+
+@pytest.fixture
+def email_templates(app):
+    app.jinja_env.loader = ChoiceLoader([DictLoader({
+        'email/user_approved.html': 'Dear {{ user.name }}',
+        'email/user_approved.txt': 'Dear {{ user.name }}',
+    }), app.jinja_env.loader])
+
+def test_change_role_skips_the_acting_admin(make_user):
+    actor = make_user(role='Admin')
+    other = make_user(role='Admin')
+    assert change_role([actor.id, other.id], 'Regular', actor) == 1
+    assert db.session.get(User, actor.id).role == 'Admin'
+    assert db.session.get(User, other.id).role == 'Regular'
+
+def test_change_role_keeps_an_active_admin(make_user):
+    admin = make_user(role='Admin')
+    system = make_user(role='Regular')  # e.g. a maintenance script acting for nobody in particular
+    with pytest.raises(BulkOperationError):
+        change_role([admin.id], 'VIP', system)
+    assert db.session.get(User, admin.id).role == 'Admin'
+
+def test_approve_users_loads_recipients_in_one_query(app, make_user, email_templates):
+    actor = make_user(role='Admin')
+    pending_ids = [make_user(status='Pending').id for _ in range(5)]
+    actor_id = actor.id
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        approved = approve_users(pending_ids, db.session.get(User, actor_id))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    assert len(approved) == 5
+    # The pending users, then one reload after the commit; no per-user refresh
+    assert len(statements) == 2
+    assert EmailLog.query.filter_by(template_name='user_approved').count() == 5
+
+def test_grant_credits_skips_unlimited_roles(make_user):
+    actor = make_user(role='Admin')
+    regular = make_user(credits=5)
+    vip = make_user(role='VIP', credits=5)
+
+    assert grant_credits([actor.id, regular.id, vip.id], 10, 'Workshop participants', actor) == 1
+
+    assert db.session.get(User, regular.id).credits == 15
+    assert db.session.get(User, vip.id).credits == 5
+    assert [entry.user_id for entry in CreditHistory.query.filter_by(transaction_type='grant')] == [regular.id]
+
+def test_user_list_posts_selected_ids_to_each_bulk_action(client, make_user):
+    login(client, make_user(role='Admin'))
+    response = client.get('/admin/users')
+    assert response.status_code == 200
+    for action in (b'/admin/users/bulk_approve', b'/admin/users/bulk_credits', b'/admin/users/bulk_role'):
+        assert action in response.data
+    assert b'name="user_ids"' in response.data
+
+def test_bulk_approve_route(client, make_user, email_templates):
+    login(client, make_user(role='Admin'))
+    selected, other = make_user(status='Pending'), make_user(status='Pending')
+
+    response = client.post('/admin/users/bulk_approve', data={'user_ids': [selected.id]})
+
+    assert response.status_code == 302
+    assert db.session.get(User, selected.id).status == 'Active'
+    assert db.session.get(User, other.id).status == 'Pending'
+    assert client.get(response.location).status_code == 200
+
+def test_bulk_grant_route(client, make_user):
+    login(client, make_user(role='Admin'))
+    regular, vip = make_user(credits=0), make_user(role='VIP', credits=0)
+
+    response = client.post('/admin/users/bulk_credits', data={
+        'user_ids': [regular.id, vip.id], 'amount': 20, 'reason': 'Semester allotment'})
+
+    assert response.status_code == 302
+    assert db.session.get(User, regular.id).credits == 20
+    assert db.session.get(User, vip.id).credits == 0
+    assert client.get(response.location).status_code == 200
+
+def test_bulk_role_route(client, make_user):
+    admin = make_user(role='Admin')
+    login(client, admin)
+    user = make_user()
+
+    response = client.post('/admin/users/bulk_role', data={'user_ids': [user.id, admin.id], 'role': 'VIP'})
+
+    assert response.status_code == 302
+    assert db.session.get(User, user.id).role == 'VIP'
+    assert db.session.get(User, admin.id).role == 'Admin'
+    assert client.get(response.location).status_code == 200
+
+def test_bulk_role_route_reports_a_refusal(client, make_user, monkeypatch):
+    login(client, make_user(role='Admin'))
+    user = make_user()
+
+    def refuse(*args, **kwargs):
+        raise BulkOperationError('This change would leave no active Admin.')
+    monkeypatch.setattr('app.admin.routes.change_role', refuse)
+
+    response = client.post('/admin/users/bulk_role', data={'user_ids': [user.id], 'role': 'Regular'},
+                           follow_redirects=True)
+
+    assert response.status_code == 200
+    assert b'would leave no active Admin' in response.data
+    assert db.session.get(User, user.id).role == 'Regular'
+
+def test_change_role_refuses_demoting_every_other_admin(make_user):
+    actor = make_user(role='Admin', status='Inactive')
+    admins = [make_user(role='Admin'), make_user(role='Admin')]
+    with pytest.raises(BulkOperationError, match='no active Admin'):
+        change_role([admin.id for admin in admins], 'Regular', actor)
+    assert all(db.session.get(User, admin.id).role == 'Admin' for admin in admins)
@@ -0,0 +1,52 @@
+import threading
+import time
+from app.utils.cache import StaleWhileRevalidateCache
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+def test_stale_hits_start_exactly_one_background_refresh(app):
+    cache = StaleWhileRevalidateCache()
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(len(calls))
+        if len(calls) > 1:
+            release.wait(2)
+        return len(calls)
+
+    assert cache.get('stats', loader, ttl=0.05, stale_ttl=10) == 1
+    time.sleep(0.1)
+    # Every stale read is answered with the old value while one refresh runs
+    assert [cache.get('stats', loader, ttl=0.05, stale_ttl=10) for _ in range(5)] == [1] * 5
+    release.set()
+    wait_for(lambda: cache.get('stats', loader, ttl=0.05, stale_ttl=10) == 2)
+
+    assert len(calls) == 2
+    assert cache.stats()['stale_hits'] >= 5
+
+def test_entries_past_the_stale_window_are_reloaded_synchronously(app):
+    cache = StaleWhileRevalidateCache()
+    values = iter(['old', 'new'])
+
+    assert cache.get('stats', lambda: next(values), ttl=0.02, stale_ttl=0.02) == 'old'
+    time.sleep(0.06)
+    assert cache.get('stats', lambda: next(values), ttl=0.02, stale_ttl=0.02) == 'new'
+    assert cache.stats()['misses'] == 2
+
+def test_failed_background_refresh_is_logged(app, caplog):
+    cache = StaleWhileRevalidateCache()
+    cache.get('stats', lambda: 'old', ttl=0.02, stale_ttl=10)
+    time.sleep(0.05)
+
+    def broken():
+        raise RuntimeError('database unavailable')
+
+    assert cache.get('stats', broken, ttl=0.02, stale_ttl=10) == 'old'
+    wait_for(lambda: not cache._refreshing)
+    assert 'database unavailable' in caplog.text
+    assert cache.get('stats', broken, ttl=0.02, stale_ttl=10) == 'old'
@@ -0,0 +1,37 @@
+from sqlalchemy import update
+from app import db
+from app.models import User
+from app.utils.cache import HostInvalidatedCache
+
+def test_debit_checks_the_stored_balance(make_user):
+    user = make_user(credits=1)
+    # Another worker spends the last credit; this copy still says 1
+    db.session.execute(update(User).where(User.id == user.id).values(credits=0),
+                       execution_options={'synchronize_session': False})
+
+    assert user.deduct_credits(1) is False
+    db.session.commit()
+    assert db.session.get(User, user.id).credits == 0
+
+def test_debit_reduces_the_balance(make_user):
+    user = make_user(credits=3)
+    assert user.deduct_credits(2) is True
+    db.session.commit()
+    assert user.credits == 1
+    assert user.deduct_credits(2) is False
+
+def test_unlimited_roles_are_not_debited(make_user):
+    user = make_user(role='VIP', credits=0)
+    assert user.deduct_credits(5) is True
+    assert user.credits == 0
+
+def test_invalidation_reaches_other_processes(tmp_path):
+    worker_a = HostInvalidatedCache(directory=str(tmp_path))
+    worker_b = HostInvalidatedCache(directory=str(tmp_path))
+    stamp = worker_a.stamp(7)
+    worker_a.set(7, {'credits': 10}, stamp)
+    assert worker_a.get(7, worker_a.stamp(7)) == {'credits': 10}
+
+    worker_b.invalidate(7)
+    assert worker_a.get(7, worker_a.stamp(7)) is None
+    assert worker_a.stats()['stale'] == 1
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+from sqlalchemy.pool import NullPool, QueuePool
+from config import Config
+from app.utils.db_engine import TimedQueuePool, engine_options
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def config(uri, **settings):
+    values = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+    values.update({'SQLALCHEMY_DATABASE_URI': uri, 'SQLALCHEMY_ENGINE_OPTIONS': None, **settings})
+    return values
+
+def test_postgres_gets_a_timed_pool_and_server_timeouts():
+    options = engine_options(config('postgresql://app@db/mmsu', DB_POOL_SIZE=8, DB_MAX_OVERFLOW=2,
+                                    DB_STATEMENT_TIMEOUT_MS=30000, DB_IDLE_IN_TRANSACTION_TIMEOUT_MS=0))
+
+    assert options['poolclass'] is TimedQueuePool
+    assert (options['pool_size'], options['max_overflow']) == (8, 2)
+    assert options['pool_pre_ping'] and options['pool_use_lifo']
+    assert options['connect_args']['options'] == '-c statement_timeout=30000'
+    assert options['connect_args']['keepalives'] == 1
+
+def test_pgbouncer_keeps_no_pool_or_startup_options():
+    options = engine_options(config('postgres://app@bouncer/mmsu', DB_PGBOUNCER=True))
+
+    assert options['poolclass'] is NullPool
+    assert 'options' not in options['connect_args']
+    assert 'pool_size' not in options
+
+def test_sqlite_file_gets_a_pool_and_memory_keeps_the_default():
+    assert engine_options(config('sqlite:////tmp/app.db'))['poolclass'] is TimedQueuePool
+    assert engine_options(config('sqlite://')) == {}
+    assert engine_options(config('sqlite:///:memory:')) == {}
+
+def test_explicit_engine_options_win():
+    options = engine_options(config('postgresql://app@db/mmsu',
+                                    SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 1, 'echo': True}))
+    assert options['pool_size'] == 1 and options['echo'] is True
+
+def test_metrics_disabled_uses_a_plain_pool():
+    options = engine_options(config('postgresql://app@db/mmsu', METRICS_ENABLED=False))
+    assert options['poolclass'] is QueuePool
+
+def test_engine_profile_does_not_import_metrics():
+    code = 'import sys, app.utils.db_engine; print("app.utils.metrics" in sys.modules)'
+    result = subprocess.run([sys.executable, '-c', code], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                            check=True)
+    assert result.stdout.strip() == 'False'
+
+def test_pool_metrics_follow_metrics_enabled(app):
+    from app import db
+    listened = [listener.__name__ for listener in db.engine.pool.dispatch.checkout]
+    assert ('checked_out' in listened) == bool(app.config['METRICS_ENABLED'])
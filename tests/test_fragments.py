@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+from app.utils.fragments import (FileSystemFragmentBackend, FragmentCache, dashboard_fragment_key,
+                                 results_fragment_key)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_gunicorn_shares_fragments_between_workers():
+    code = 'import os, runpy; runpy.run_path("gunicorn.conf.py"); print(os.environ.get("FRAGMENT_CACHE_BACKEND"))'
+    env = {key: value for key, value in os.environ.items() if key != 'FRAGMENT_CACHE_BACKEND'}
+
+    def backend(workers):
+        result = subprocess.run([sys.executable, '-c', code], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                                env={**env, 'WEB_CONCURRENCY': str(workers)}, check=True)
+        return result.stdout.strip()
+
+    assert backend(3) == 'filesystem'
+    assert backend(1) == 'None'
+
+def test_dashboard_invalidation_reaches_other_workers(app, tmp_path):
+    # Two workers' caches over the same directory
+    first, second = FragmentCache(), FragmentCache()
+    first.backend = FileSystemFragmentBackend(str(tmp_path))
+    second.backend = FileSystemFragmentBackend(str(tmp_path))
+    key = dashboard_fragment_key(7)
+
+    assert second.fragment(key, 30, lambda: 'Credits: 5') == 'Credits: 5'
+    first.invalidate(key)
+    assert second.fragment(key, 30, lambda: 'Credits: 4') == 'Credits: 4'
+
+def test_new_build_version_misses_the_cache(app, make_submission, tmp_path):
+    cache = FragmentCache()
+    cache.backend = FileSystemFragmentBackend(str(tmp_path))
+    submission = make_submission(status='Completed', analysis_results='{"prior_art": []}')
+
+    app.config['HTTP_CACHE_VERSION'] = 'release-1'
+    assert cache.fragment(results_fragment_key(submission), 30, lambda: 'old report') == 'old report'
+    assert cache.fragment(dashboard_fragment_key(submission.user_id), 30, lambda: 'old dashboard') == 'old dashboard'
+
+    app.config['HTTP_CACHE_VERSION'] = 'release-2'
+    assert cache.fragment(results_fragment_key(submission), 30, lambda: 'new report') == 'new report'
+    assert cache.fragment(dashboard_fragment_key(submission.user_id), 30, lambda: 'new dashboard') == 'new dashboard'
@@ -0,0 +1,32 @@
+import time
+from app import db
+from app.models import ApiCallLease
+from app.utils.analysis_queue import run_analysis
+from app.utils.governor import GovernorTimeout, PerplexityGovernor
+
+def test_held_lease_outlives_its_ttl(app, tmp_path):
+    app.config['PERPLEXITY_LEASE_TTL'] = 0.3
+    app.config['PERPLEXITY_GOVERNOR_LOCK_FILE'] = str(tmp_path / 'governor.lock')
+    governor = PerplexityGovernor()
+
+    with governor.slot(user_id=1) as lease:
+        time.sleep(1.0)
+        # A grant decision purges expired leases; ours must not be one of them
+        other = governor.acquire(user_id=2, priority=True)
+        governor.release(other)
+        assert ApiCallLease.query.filter_by(token=lease.token).count() == 1
+        db.session.rollback()
+
+    assert ApiCallLease.query.count() == 0
+
+def test_governor_timeout_fails_the_analysis(app, make_submission, monkeypatch):
+    app.config.update(PERPLEXITY_API_KEY='key', PERPLEXITY_API_URL='http://perplexity.invalid')
+    submission = make_submission(status='Processing')
+
+    def no_slot(self, user_id=None, priority=False):
+        raise GovernorTimeout('No Perplexity call slot within 300s')
+    monkeypatch.setattr(PerplexityGovernor, 'acquire', no_slot)
+
+    assert run_analysis(submission) is False
+    assert submission.analysis_status == 'Failed'
+    assert submission.analysis_results is None
@@ -0,0 +1,64 @@
+import gzip
+import pytest
+from app import db
+from app.models import CreditHistory, DownloadHistory, User
+from app.utils.http_cache import page_etag, results_etag
+from tests.conftest import login
+
+RESULTS = {
+    'prior_art_report': [{'title': f'Solar crop dryer {n}', 'summary': 'A solar dryer for grains. ' * 20,
+                          'similarities': 'Drying.', 'differences': 'Scale.'} for n in range(10)],
+    'patentability_analysis': {'novelty': 'Novel.', 'inventive_step': 'Inventive.',
+                               'industrial_applicability': 'Applicable.'},
+    'recommendations': {'improvement_suggestions': 'More detail.', 'patent_filing_advice': 'File.'}
+}
+
+@pytest.fixture
+def completed(client, make_user, make_submission):
+    user = make_user(credits=5)
+    submission = make_submission(user=user, status='Completed')
+    submission.set_results(RESULTS)
+    db.session.commit()
+    login(client, user)
+    return submission
+
+@pytest.mark.parametrize('header', ['"{etag}"', 'W/"{etag}"', '"{etag}-gzip"', '"{etag}-br"', '"other", "{etag}"'])
+def test_matching_etag_gets_304(client, completed, header):
+    etag = client.get(f'/results/{completed.id}').get_etag()[0]
+
+    response = client.get(f'/results/{completed.id}',
+                          headers={'If-None-Match': header.format(etag=etag)})
+
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_other_etag_gets_the_page(client, completed):
+    response = client.get(f'/results/{completed.id}', headers={'If-None-Match': '"stale"'})
+    assert response.status_code == 200
+    assert response.get_etag()[0] == page_etag(completed, db.session.get(User, completed.user_id))
+
+def test_compressed_page_varies_on_accept_encoding(client, completed):
+    plain = client.get(f'/results/{completed.id}', headers={'Accept-Encoding': 'identity'})
+    compressed = client.get(f'/results/{completed.id}', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Accept-Encoding' in plain.headers['Vary']
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.get_etag()[0] == plain.get_etag()[0] + '-gzip'
+
+def test_pdf_304_neither_charges_nor_records(client, completed):
+    etag = results_etag(completed, 'pdf')
+
+    response = client.get(f'/download_pdf/{completed.id}', headers={'If-None-Match': f'"{etag}"'})
+
+    assert response.status_code == 304
+    assert db.session.get(User, completed.user_id).credits == 5
+    assert CreditHistory.query.filter_by(transaction_type='download').count() == 0
+    assert DownloadHistory.query.count() == 0
+
+def test_new_build_version_changes_the_etag(app, completed):
+    app.config['HTTP_CACHE_VERSION'] = 'release-1'
+    before = results_etag(completed, 'pdf')
+    app.config['HTTP_CACHE_VERSION'] = 'release-2'
+    assert results_etag(completed, 'pdf') != before
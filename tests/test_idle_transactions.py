@@ -0,0 +1,73 @@
+import pytest
+import requests
+from app import db
+from app.models import TechnologySubmission
+from app.utils import bulk_analysis
+from app.utils.analysis_queue import claim_submission, run_analysis
+from app.utils.governor import PerplexityGovernor
+from benchmarks.fake_perplexity import completion
+
+@pytest.fixture
+def live_api(app, tmp_path):
+    app.config.update(PERPLEXITY_API_KEY='key', PERPLEXITY_API_URL='http://perplexity.invalid',
+                      PERPLEXITY_GOVERNOR_LOCK_FILE=str(tmp_path / 'governor.lock'))
+
+@pytest.fixture
+def transaction_open(monkeypatch):
+    """Whether the session had a transaction open at each outbound wait, in order"""
+    seen = []
+    acquire = PerplexityGovernor.acquire
+
+    def watched_acquire(self, *args, **kwargs):
+        seen.append(('governor', db.session().in_transaction()))
+        return acquire(self, *args, **kwargs)
+    monkeypatch.setattr(PerplexityGovernor, 'acquire', watched_acquire)
+    return seen
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return completion(self.payload)
+
+def test_no_transaction_is_held_while_the_analyze_page_waits(live_api, transaction_open, make_submission, monkeypatch):
+    def post(url, headers=None, json=None, timeout=None):
+        transaction_open.append(('upstream', db.session().in_transaction()))
+        return FakeResponse(json)
+    monkeypatch.setattr(requests, 'post', post)
+
+    submission_id = make_submission().id
+    assert claim_submission(submission_id)
+    submission = db.session.get(TechnologySubmission, submission_id)
+
+    assert run_analysis(submission)
+    assert transaction_open == [('governor', False), ('upstream', False)]
+    assert db.session.get(TechnologySubmission, submission_id).analysis_status == 'Completed'
+
+def test_no_transaction_is_held_across_bulk_runner_awaits(live_api, transaction_open, make_submission, monkeypatch):
+    async def call(self, client, headers, payload, metrics):
+        transaction_open.append(('upstream', db.session().in_transaction()))
+        return bulk_analysis.PerplexityAnalyzer.parse_response(completion(payload))
+    monkeypatch.setattr(bulk_analysis._Runner, '_call', call)
+
+    submission_id = make_submission().id
+    stats = bulk_analysis.run_bulk_analysis([submission_id], concurrency=1, rate=100)
+
+    assert stats['completed'] == 1
+    assert transaction_open == [('governor', False), ('upstream', False)]
+
+def test_pending_changes_are_never_committed_by_the_analyzer(live_api, transaction_open, make_submission,
+                                                             monkeypatch):
+    monkeypatch.setattr(requests, 'post', lambda *args, **kwargs: pytest.fail('called upstream'))
+    submission = make_submission(status='Processing')
+    submission.title = 'Changed but not committed'
+
+    assert run_analysis(submission) is False
+    db.session.expire_all()
+    submission = db.session.get(TechnologySubmission, submission.id)
+    assert (submission.title, submission.analysis_status) == ('Solar rice dryer', 'Failed')
+    assert transaction_open == []
@@ -0,0 +1,98 @@
+import pytest
+from app import db
+from app.models import SimilarityRun, SubmissionNeighbor
+from app.utils import neighbors
+from app.utils.neighbors import (IndexUpdateInProgress, _index_lease, cluster_submissions,
+                                 update_neighbor_index)
+
+@pytest.fixture(autouse=True)
+def similarity_files(app, tmp_path):
+    app.config.update(SIMILARITY_LOCK_FILE=str(tmp_path / 'similarity.lock'),
+                      SIMILARITY_TERM_COUNTS_FILE=str(tmp_path / 'terms.npz'),
+                      SIMILARITY_MIN_SCORE=0.05)
+
+def stored(submission):
+    return [row.neighbor_id for row in SubmissionNeighbor.query
+            .filter_by(submission_id=submission.id).order_by(SubmissionNeighbor.score.desc())]
+
+def make(make_submission, user, text):
+    return make_submission(user=user, title=text, description=text, claims=None)
+
+def test_new_submission_displaces_a_weaker_neighbor(make_user, make_submission):
+    user = make_user()
+    grater = make(make_submission, user, 'cassava grater blade motor hopper')
+    similar = make(make_submission, user, 'cassava grater hopper frame wheels')
+    husker = make(make_submission, user, 'coconut husker spike lever')
+    update_neighbor_index(k=1)
+    assert stored(grater) == [similar.id]
+    assert stored(husker) == []  # nothing scores above SIMILARITY_MIN_SCORE
+
+    closer = make(make_submission, user, 'cassava grater blade motor hopper drum')
+    run = update_neighbor_index(k=1)
+
+    assert run.new_submissions == 1 and not run.full_rebuild
+    assert stored(grater) == [closer.id]
+    assert stored(closer) == [grater.id]
+    assert stored(similar) == [grater.id]  # its only neighbor was not beaten
+
+def test_full_lists_only_take_candidates_above_their_last_score(make_user, make_submission):
+    user = make_user()
+    grater = make(make_submission, user, 'cassava grater blade motor hopper')
+    twin = make(make_submission, user, 'cassava grater blade motor hopper')
+    husker = make(make_submission, user, 'coconut husker spike lever')
+    update_neighbor_index(k=1)
+
+    # Weakly similar to the grater, whose list is full; similar enough for the husker's empty one
+    weak = make(make_submission, user, 'cassava starch coconut husker spike')
+    update_neighbor_index(k=1)
+
+    assert stored(grater) == [twin.id]
+    assert stored(twin) == [grater.id]
+    assert stored(husker) == [weak.id]
+
+def test_incremental_run_only_tokenizes_new_submissions(make_user, make_submission, monkeypatch):
+    user = make_user()
+    texts = ['cassava grater blade', 'cassava grater hopper', 'coconut husker spike', 'coconut husker lever']
+    for text in texts[:3]:
+        make(make_submission, user, text)
+    update_neighbor_index(k=2)
+    make(make_submission, user, texts[3])
+
+    tokenized = []
+    real_tokenize = neighbors.tokenize
+    monkeypatch.setattr(neighbors, 'tokenize', lambda text: tokenized.append(text) or real_tokenize(text))
+    update_neighbor_index(k=2)
+    incremental = {(row.submission_id, row.neighbor_id) for row in SubmissionNeighbor.query}
+
+    assert tokenized == [f'{texts[3]} {texts[3]}']
+    update_neighbor_index(full=True, k=2)
+    assert {(row.submission_id, row.neighbor_id) for row in SubmissionNeighbor.query} == incremental
+
+def test_only_one_update_runs_at_a_time(make_submission):
+    make_submission()
+    with _index_lease():
+        with pytest.raises(IndexUpdateInProgress):
+            update_neighbor_index()
+    assert SimilarityRun.query.count() == 0
+
+    update_neighbor_index()
+    assert SimilarityRun.query.count() == 1
+
+def test_clusters_are_reused_until_the_next_run(make_user, make_submission):
+    user = make_user()
+    for text in ('cassava grater blade motor', 'cassava grater blade hopper', 'coconut husker spike lever'):
+        make(make_submission, user, text)
+    update_neighbor_index(k=2)
+    clusters = cluster_submissions(0.2)
+    assert [cluster['size'] for cluster in clusters] == [2]
+
+    db.session.query(SubmissionNeighbor).delete()
+    db.session.commit()
+    assert [cluster['size'] for cluster in cluster_submissions(0.2)] == [2]
+
+    update_neighbor_index(full=True, k=2)
+    assert [cluster['size'] for cluster in cluster_submissions(0.2)] == [2]
+    db.session.query(SubmissionNeighbor).delete()
+    db.session.commit()
+    update_neighbor_index(k=2)
+    assert cluster_submissions(0.2) == []
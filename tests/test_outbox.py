@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import EmailLog, User
+from app.utils.email import send_email
+from app.utils.outbox import claim_batch
+
+def _pending_registration():
+    user = User(email='new@mmsu.edu.ph', name='New User', status='Pending')
+    user.set_password('password')
+    db.session.add(user)
+    return user
+
+def test_failed_render_keeps_the_callers_changes(app):
+    _pending_registration()
+    assert send_email('Welcome', ['new@mmsu.edu.ph'], 'no_such_template') is False
+    db.session.commit()
+    assert User.query.filter_by(email='new@mmsu.edu.ph').count() == 1
+
+def test_failed_insert_keeps_the_callers_changes(app):
+    _pending_registration()
+    # A NULL recipient violates the outbox row's NOT NULL constraint inside the savepoint
+    assert send_email('Welcome', [None], 'broadcast', name='New User', message='Hello') is False
+    db.session.commit()
+    assert User.query.filter_by(email='new@mmsu.edu.ph').count() == 1
+    assert EmailLog.query.count() == 0
+
+def test_send_email_commits_rows_with_the_callers_changes(app):
+    _pending_registration()
+    assert send_email('Welcome', ['new@mmsu.edu.ph'], 'broadcast', name='New User', message='Hello')
+    db.session.rollback()
+    assert User.query.count() == 1
+    assert EmailLog.query.filter_by(status='Pending').count() == 1
+
+def _abandoned(attempts):
+    log = EmailLog(recipient_email='a@mmsu.edu.ph', subject='s', status='Sending', attempts=attempts,
+                   claimed_by='crashed', claimed_at=datetime.utcnow() - timedelta(hours=1))
+    db.session.add(log)
+    db.session.commit()
+    return log.id
+
+def test_reclaimed_rows_count_as_an_attempt(app):
+    log_id = _abandoned(attempts=0)
+    claimed = claim_batch(10)
+    assert [log.id for log in claimed] == [log_id]
+    assert claimed[0].attempts == 1
+
+def test_rows_that_keep_crashing_the_sender_fail(app):
+    app.config['EMAIL_OUTBOX_MAX_ATTEMPTS'] = 3
+    log_id = _abandoned(attempts=2)
+    assert claim_batch(10) == []
+    log = db.session.get(EmailLog, log_id)
+    assert (log.status, log.attempts) == ('Failed', 3)
+
+def test_rate_limit_counts_every_workers_sends(app):
+    app.config['EMAIL_SEND_RATE_PER_MINUTE'] = 3
+    now = datetime.utcnow()
+    # Two sent within the last minute by other workers
+    db.session.add_all([EmailLog(recipient_email=f'sent{n}@mmsu.edu.ph', subject='s', status='Sent',
+                                 sent_at=now - timedelta(seconds=10)) for n in range(2)])
+    db.session.add_all([EmailLog(recipient_email=f'due{n}@mmsu.edu.ph', subject='s', status='Pending',
+                                 next_attempt_at=now - timedelta(seconds=1)) for n in range(5)])
+    db.session.commit()
+
+    assert len(claim_batch(50)) == 1
+    # The claimed row is in flight, so the minute's budget is spent
+    assert claim_batch(50) == []
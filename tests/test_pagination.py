@@ -0,0 +1,68 @@
+from datetime import datetime
+from app.models import User
+from app.utils.pagination import keyset_paginate
+from tests.conftest import login
+
+ORDER = (User.created_at, User.id)
+
+def test_cursor_round_trip_across_equal_timestamps(make_user):
+    same_time = datetime(2025, 6, 1, 8, 0)
+    ids = [make_user(created_at=same_time).id for _ in range(7)]
+
+    pages, cursor = [], None
+    while True:
+        page = keyset_paginate(User.query, ORDER, cursor=cursor, per_page=3)
+        pages.append([user.id for user in page])
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+
+    # Ties on created_at are broken by id: nothing repeated, nothing skipped
+    assert pages == [ids[6:3:-1], ids[3:0:-1], ids[:1]]
+
+    # Going back from the last page returns the page before it
+    back = keyset_paginate(User.query, ORDER, before=page.prev_cursor, per_page=3)
+    assert [user.id for user in back] == pages[1]
+    assert back.has_prev and back.has_next
+
+def test_first_and_last_page_boundaries(make_user):
+    ids = [make_user().id for _ in range(4)]
+
+    first = keyset_paginate(User.query, ORDER, per_page=2)
+    assert not first.has_prev and first.has_next
+
+    last = keyset_paginate(User.query, ORDER, cursor=first.next_cursor, per_page=2)
+    assert [user.id for user in last] == ids[1::-1]
+    assert last.has_prev and not last.has_next
+
+    newest = keyset_paginate(User.query, ORDER, before=last.prev_cursor, per_page=2)
+    assert [user.id for user in newest] == ids[:1:-1]
+    assert not newest.has_prev
+
+    # A page holding exactly per_page rows has nothing after it
+    assert not keyset_paginate(User.query, ORDER, per_page=4).has_next
+
+def test_tampered_cursor_redirects_to_the_first_page(client, make_user):
+    admin = make_user(role='Admin')
+    login(client, admin)
+    page = keyset_paginate(User.query, ORDER, per_page=1)
+
+    response = client.get(f'/admin/users?status=Active&cursor={page.next_cursor}x')
+
+    assert response.status_code == 302
+    assert response.location.endswith('/admin/users?status=Active&role=all')
+
+def test_user_list_links_to_neighbouring_pages(client, make_user):
+    admin = make_user(role='Admin')
+    for _ in range(30):
+        make_user()
+    login(client, admin)
+
+    first = client.get('/admin/users')
+    assert first.status_code == 200
+    assert b'cursor=' in first.data and b'before=' not in first.data
+
+    cursor = keyset_paginate(User.query, ORDER, per_page=25).next_cursor
+    second = client.get(f'/admin/users?cursor={cursor}')
+    assert second.status_code == 200
+    assert b'before=' in second.data and b'cursor=' not in second.data
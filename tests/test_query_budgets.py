@@ -0,0 +1,60 @@
+import pytest
+from conftest import login
+from app import db
+from app.models import AuditLog, TechnologySubmission, User
+from app.utils.query_debug import QueryBudgetExceeded, _recorders, count_queries, query_budget
+
+@pytest.fixture
+def populated(make_user):
+    """An admin and a handful of users with submissions and audit logs each"""
+    admin = make_user(role='Admin')
+    for n in range(6):
+        author = make_user()
+        make_user(status='Pending')
+        db.session.add(TechnologySubmission(user_id=author.id, title=f'Technology {n}',
+                                            description='A solar powered water pump',
+                                            serial_number=f'MMSU-TEST-{n}'))
+        db.session.add(AuditLog(user_id=author.id, action='submission_created'))
+    db.session.commit()
+    return admin
+
+def test_budget_keys_are_endpoints(app):
+    assert set(app.config['QUERY_BUDGETS']) <= set(app.view_functions)
+
+@pytest.mark.parametrize('url', [
+    '/dashboard',
+    '/search?q=solar',
+    '/admin/dashboard',
+    '/admin/submissions/search?q=solar',
+    '/api/user/submissions',
+])
+def test_endpoints_stay_within_their_query_budget(app, client, populated, url):
+    login(client, populated)
+    # QUERY_BUDGET_ENFORCE turns an exceeded budget into a 500
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.headers['X-Query-N-Plus-One'] == '0'
+    endpoint = app.url_map.bind('localhost').match(url.split('?')[0])[0]
+    assert int(response.headers['X-Query-Count']) <= app.config['QUERY_BUDGETS'][endpoint]
+
+def test_query_budget_catches_n_plus_one(populated):
+    with pytest.raises(QueryBudgetExceeded):
+        with query_budget(3, label='authors'):
+            for submission in TechnologySubmission.query.all():
+                submission.author.name
+
+    with count_queries() as recorder:
+        for user in User.query.all():
+            db.session.refresh(user)
+    assert recorder.suspected_n_plus_one(threshold=5)
+
+def test_recorder_is_removed_when_a_view_raises(app, client):
+    @app.route('/boom')
+    def boom():
+        raise RuntimeError('boom')
+
+    # Testing propagates the error, so no after_request hook runs
+    with pytest.raises(RuntimeError):
+        client.get('/boom')
+    assert _recorders() == []
@@ -0,0 +1,95 @@
+from app import db
+from app.models import CreditHistory, TechnologySubmission, User
+from app.utils.ai_analysis import plan_reanalysis
+from tests.conftest import login
+
+PREVIOUS_RESULTS = {
+    'prior_art_report': [{'title': 'Solar crop dryer', 'summary': 'A dryer.'}],
+    'patentability_analysis': {'novelty': 'old novelty'},
+    'recommendations': {'patent_filing_advice': 'old advice'}
+}
+NEW_RESULTS = {
+    'prior_art_report': [{'title': 'Something else', 'summary': 'Not used.'}],
+    'patentability_analysis': {'novelty': 'new novelty'},
+    'recommendations': {'patent_filing_advice': 'new advice'}
+}
+
+def make_revision(make_submission, **changes):
+    previous = make_submission(status='Completed', claims='1. A dryer.', inventors='J. Cruz')
+    previous.set_results(PREVIOUS_RESULTS)
+    db.session.commit()
+    fields = {field: getattr(previous, field)
+              for field in ('title', 'description', 'claims', 'inventors', 'file_content')}
+    fields.update(changes)
+    return make_submission(user=previous.author, revision_of_id=previous.id, **fields)
+
+def test_search_field_change_needs_a_full_analysis(make_submission):
+    plan = plan_reanalysis(make_revision(make_submission, title='Solar cassava dryer'))
+    assert plan.mode == 'full'
+    assert plan.merge(NEW_RESULTS) == NEW_RESULTS
+
+def test_claims_change_keeps_the_prior_art(make_submission):
+    revision = make_revision(make_submission, claims='1. A dryer with a fan.')
+    plan = plan_reanalysis(revision)
+    assert plan.mode == 'incremental'
+    assert plan.changed_fields == ['claims']
+
+    merged = plan.merge(NEW_RESULTS)
+    assert merged['prior_art_report'] == PREVIOUS_RESULTS['prior_art_report']
+    assert merged['patentability_analysis'] == NEW_RESULTS['patentability_analysis']
+    assert merged['recommendations'] == NEW_RESULTS['recommendations']
+    assert merged['revision'] == {
+        'previous_submission_id': revision.revision_of.id,
+        'previous_serial_number': revision.revision_of.serial_number,
+        'mode': 'incremental',
+        'changed_fields': ['claims']
+    }
+
+def test_unchanged_revision_reuses_everything(make_submission):
+    # Whitespace and fields outside the analysis do not count as changes
+    revision = make_revision(make_submission, claims='1.  A dryer. ', inventors='J. Cruz, M. Santos')
+    plan = plan_reanalysis(revision)
+    assert plan.mode == 'reused'
+
+    merged = plan.merge(None)
+    assert {key: merged[key] for key in PREVIOUS_RESULTS} == PREVIOUS_RESULTS
+    assert merged['revision']['mode'] == 'reused'
+    assert merged['revision']['changed_fields'] == []
+
+def test_previous_without_results_needs_a_full_analysis(make_submission):
+    previous = make_submission(status='Failed')
+    revision = make_submission(user=previous.author, revision_of_id=previous.id,
+                               title=previous.title, description=previous.description)
+    assert plan_reanalysis(revision).mode == 'full'
+
+def test_reused_revision_is_not_charged(app, client, make_user, make_submission):
+    app.config['ANALYSIS_COST'] = 1
+    user = make_user(credits=0)
+    previous = make_submission(user=user, status='Completed')
+    previous.set_results(PREVIOUS_RESULTS)
+    db.session.commit()
+    login(client, user)
+
+    response = client.post(f'/resubmit/{previous.id}', data={
+        'title': previous.title, 'description': previous.description})
+
+    assert response.status_code == 302
+    revision = TechnologySubmission.query.filter_by(revision_of_id=previous.id).one()
+    assert db.session.get(User, user.id).credits == 0
+    assert CreditHistory.query.filter_by(submission_id=revision.id).count() == 0
+
+def test_changed_revision_is_charged(app, client, make_user, make_submission):
+    app.config['ANALYSIS_COST'] = 1
+    user = make_user(credits=3)
+    previous = make_submission(user=user, status='Completed')
+    previous.set_results(PREVIOUS_RESULTS)
+    db.session.commit()
+    login(client, user)
+
+    response = client.post(f'/resubmit/{previous.id}', data={
+        'title': previous.title, 'description': previous.description, 'claims': '1. A dryer.'})
+
+    assert response.status_code == 302
+    revision = TechnologySubmission.query.filter_by(revision_of_id=previous.id).one()
+    assert db.session.get(User, user.id).credits == 2
+    assert CreditHistory.query.filter_by(submission_id=revision.id).one().amount == -1
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import CreditHistory, DailyUsage, DownloadHistory
+from app.utils.analysis_queue import run_analysis
+from app.utils.rollups import COUNTERS, backfill_daily_usage
+
+def usage():
+    return {(row.day, row.institution): {name: getattr(row, name) for name in COUNTERS}
+            for row in DailyUsage.query.all()}
+
+def analyze(submission):
+    submission.analysis_status = 'Processing'
+    db.session.commit()
+    assert run_analysis(submission)
+
+def test_reanalysis_counts_as_another_analysis(app, make_submission):
+    submission = make_submission(institution='MMSU')
+    analyze(submission)
+    analyze(submission)
+
+    today = datetime.utcnow().date()
+    assert [(row.submissions, row.analyses) for row in DailyUsage.query.all()] == [(1, 2)]
+    assert DailyUsage.query.one().day == today
+
+def test_backfill_reproduces_the_incremental_counts(app, make_user, make_submission):
+    mmsu = make_user(institution='MMSU')
+    other = make_user(institution=None)
+    first = make_submission(mmsu)
+    analyze(first)
+    analyze(first)  # re-analysis
+    analyze(make_submission(other))
+    make_submission(mmsu, status='Pending')
+    db.session.add(CreditHistory(user_id=mmsu.id, submission_id=first.id, transaction_type='download',
+                                 amount=-1, balance_after=49))
+    db.session.add(DownloadHistory(user_id=mmsu.id, submission_id=first.id))
+    db.session.commit()
+
+    incremental = usage()
+    assert backfill_daily_usage() == len(incremental)
+    assert usage() == incremental
+
+def test_backfill_counts_completions_from_before_runs_were_recorded(app, make_user, make_submission):
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    make_submission(make_user(institution='MMSU'), status='Completed', analyzed_at=yesterday)
+
+    backfill_daily_usage()
+
+    row = DailyUsage.query.filter_by(day=yesterday.date(), institution='MMSU').one()
+    assert row.analyses == 1
@@ -0,0 +1,43 @@
+from app import db
+from app.utils.search import HL_START, HL_STOP, _fts5_query, _highlight, search_submissions
+
+def found(query):
+    return [hit.submission.id for hit in search_submissions(query)]
+
+def test_index_follows_inserts_updates_and_deletes(make_submission):
+    submission = make_submission(title='Cassava grater')
+    assert found('grater') == [submission.id]
+
+    submission.title = 'Coconut husker'
+    db.session.commit()
+    assert found('grater') == []
+    assert found('husker') == [submission.id]
+
+    db.session.delete(submission)
+    db.session.commit()
+    assert found('husker') == []
+
+def test_user_input_is_quoted_for_fts5():
+    assert _fts5_query('solar "dryer') == '"solar" "dryer"'
+    assert _fts5_query('rice OR NOT dryer*') == '"rice" "OR" "NOT" "dryer"'
+    assert _fts5_query('title:rice (NEAR') == '"title" "rice" "NEAR"'
+    assert _fts5_query('"" ^ -') == ''
+
+def test_operators_and_quotes_in_a_search_do_not_error(make_submission):
+    submission = make_submission(title='Solar rice dryer')
+    assert found('rice" OR "x') == []
+    assert found('description:solar') == []
+    assert found('rice AND dryer') == []
+    assert found('"rice dryer"') == [submission.id]
+    assert found('"') == []
+
+def test_highlight_escapes_stored_text():
+    html = _highlight(f'<script>alert(1)</script> {HL_START}rice{HL_STOP} & "dryer"')
+    assert str(html) == '&lt;script&gt;alert(1)&lt;/script&gt; <mark>rice</mark> &amp; &#34;dryer&#34;'
+    assert str(_highlight(None)) == ''
+
+def test_search_results_render_escaped_titles(make_submission):
+    make_submission(title='<b>Rice</b> dryer')
+    hit, = search_submissions('rice')
+    assert '<b>' not in str(hit.title_html)
+    assert '<mark>Rice</mark>' in str(hit.title_html)
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+import pytest
+from app.utils.similarity import (SCORING_METHOD, SCORING_VERSION, rank_many, rank_prior_art,
+                                  score_batch, tokenize)
+
+def submission(title, description='', claims=None):
+    return SimpleNamespace(title=title, description=description, claims=claims)
+
+def entry(title, summary=''):
+    return {'title': title, 'summary': summary}
+
+def titles(results):
+    return [item['title'] for item in results['prior_art_report']]
+
+def test_report_is_sorted_by_similarity():
+    results = {'prior_art_report': [
+        entry('Coconut husker', 'A lever that splits coconut husks.'),
+        entry('Solar grain dryer', 'A solar dryer for rice and corn grains.'),
+        entry('Rice dryer', 'A solar rice dryer with a fan for small farms.'),
+    ]}
+    rank_prior_art(submission('Solar rice dryer', 'A solar-powered rice dryer with a fan for small farms.'), results)
+
+    assert titles(results) == ['Rice dryer', 'Solar grain dryer', 'Coconut husker']
+    scores = [item['similarity_score'] for item in results['prior_art_report']]
+    assert scores == sorted(scores, reverse=True)
+    assert scores[-1] == 0.0
+    assert results['scoring'] == {'method': SCORING_METHOD, 'version': SCORING_VERSION}
+
+def test_identical_text_scores_100():
+    text = 'Solar rice dryer with a fan'
+    results = {'prior_art_report': [entry('Solar rice dryer', 'with a fan'), entry('Coconut husker')]}
+    rank_prior_art(submission(text), results)
+    assert results['prior_art_report'][0]['similarity_score'] == pytest.approx(100.0)
+
+def test_equal_scores_keep_the_model_order():
+    results = {'prior_art_report': [entry('First'), entry('Second'), entry('Third')]}
+    rank_prior_art(submission('Solar rice dryer'), results)
+    assert titles(results) == ['First', 'Second', 'Third']
+    assert {item['similarity_score'] for item in results['prior_art_report']} == {0.0}
+
+@pytest.mark.parametrize('results', [None, {}, {'prior_art_report': []}])
+def test_results_without_prior_art_are_left_alone(results):
+    assert rank_prior_art(submission('Solar rice dryer'), results) == results
+
+def test_empty_texts_score_zero():
+    assert score_batch([('', [entry('Solar rice dryer')])])[0].tolist() == [0.0]
+    assert score_batch([('Solar rice dryer', [entry(''), entry('The and of')])])[0].tolist() == [0.0, 0.0]
+    assert score_batch([('the of and', [])])[0].tolist() == []
+
+def test_scores_do_not_depend_on_the_rest_of_the_batch():
+    query, entries = 'Solar rice dryer', [entry('Rice dryer'), entry('Solar panel')]
+    alone = score_batch([(query, entries)])[0]
+    batched = score_batch([
+        ('Coconut husker', [entry('Rice husker'), entry('Coconut grater')]),
+        (query, entries),
+    ])[1]
+    assert batched.tolist() == pytest.approx(alone.tolist())
+
+def test_rank_many_skips_results_without_prior_art():
+    scored = {'prior_art_report': [entry('Rice dryer')]}
+    ranked = rank_many([(submission('Rice dryer'), None), (submission('Rice dryer'), scored)])
+    assert ranked == [scored]
+    assert scored['prior_art_report'][0]['similarity_score'] == pytest.approx(100.0)
+
+def test_tokenize_drops_stopwords_and_single_characters():
+    assert tokenize('A Solar-powered system for X-ray 3D use') == ['solar', 'powered', 'ray', '3d']
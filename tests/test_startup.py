@@ -0,0 +1,7 @@
+from app.utils.startup import measure_import_time
+
+def test_create_app_stays_within_import_budget(app):
+    report = measure_import_time('testing')
+
+    assert report['heavy_loaded'] == []
+    assert report['total_ms'] <= app.config['IMPORT_TIME_BUDGET_MS'], report['top']
@@ -0,0 +1,78 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import pytest
+from flask import current_app
+from flask.logging import default_handler
+from app.utils import structured_logging
+
+@pytest.fixture
+def pipeline(app, tmp_path, monkeypatch):
+    """Configure the logging queue for the test app only, writing to a temporary file"""
+    monkeypatch.setattr(structured_logging, '_pipeline', {})
+    monkeypatch.setattr(atexit, 'register', lambda function: None)
+    if hasattr(os, 'register_at_fork'):
+        monkeypatch.setattr(os, 'register_at_fork', lambda **hooks: None)
+    app.config.update(LOG_DESTINATION='file', LOG_FILE=str(tmp_path / 'app.log'), LOG_FORMAT='json')
+    level = app.logger.level
+
+    def read_lines():
+        structured_logging._stop_listener()  # flushes the queue
+        with open(app.config['LOG_FILE']) as f:
+            return [json.loads(line) for line in f]
+
+    yield read_lines
+    structured_logging._stop_listener()
+    # app.logger is the process-wide 'app' logger; leave it as other tests expect it
+    app.logger.removeHandler(structured_logging._pipeline['queue_handler'])
+    app.logger.addHandler(default_handler)
+    app.logger.setLevel(level)
+    structured_logging._pipeline['handler'].close()
+
+def test_request_records_are_json_lines_with_request_fields(app, client, pipeline):
+    def low_quota():
+        current_app.logger.warning('Quota low', extra={'remaining': 3})
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            current_app.logger.exception('Scoring failed')
+        return 'ok'
+    app.add_url_rule('/low_quota', 'low_quota', low_quota)
+    structured_logging.configure_logging(app)
+
+    response = client.get('/low_quota', headers={'X-Request-ID': 'req-123'})
+    assert response.headers['X-Request-ID'] == 'req-123'
+
+    warning, error, request_line = pipeline()
+    assert (warning['level'], warning['message'], warning['remaining']) == ('WARNING', 'Quota low', 3)
+    assert warning['request_id'] == 'req-123'
+    assert 'user_id' not in warning
+    assert error['message'] == 'Scoring failed'
+    assert 'ZeroDivisionError' in error['exception']
+    assert request_line['logger'] == 'app.requests'
+    assert (request_line['method'], request_line['path'], request_line['status']) == ('GET', '/low_quota', 200)
+    assert request_line['endpoint'] == 'low_quota'
+    assert request_line['request_id'] == 'req-123'
+    assert request_line['duration_ms'] >= 0
+
+def test_log_calls_do_not_wait_for_the_destination(app, pipeline, monkeypatch):
+    release = threading.Event()
+    written = []
+
+    class SlowHandler(logging.Handler):
+        def emit(self, record):
+            release.wait(5)
+            written.append(self.format(record))
+
+    monkeypatch.setattr(structured_logging, '_destination_handler', lambda config: SlowHandler())
+    structured_logging.configure_logging(app)
+
+    app.logger.info('first')
+    app.logger.info('second')
+    assert written == []  # both calls returned while the listener is still blocked on the first
+
+    release.set()
+    structured_logging._stop_listener()
+    assert [json.loads(line)['message'] for line in written] == ['first', 'second']